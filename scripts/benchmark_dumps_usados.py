@@ -0,0 +1,169 @@
+"""
+Replay offline dos dumps de página (page_dump_*, captcha_*, amazon_error_page_*) pelo mesmo parser do
+orquestrador: mede o throughput e, com saídas de referência em <corpus>/golden, aponta regressões de seletores.
+
+O corpus versionado em scripts/corpus_dumps_usados é sintético: quatro páginas escritas à mão, com ASINs
+fictícios (B0TESTE00x), que reproduzem só a marcação que os seletores usam. A regressão do CI garante que o
+parser continua lendo essa marcação, mas não cobre as variações do HTML real da Amazon; para isso, rode o
+benchmark sobre os dumps de uma execução (debug_logs_usados) e versione no corpus os que mudarem de forma.
+"""
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import statistics
+
+import orchestrator_usados as orq
+
+logger = logging.getLogger("BENCHMARK_DUMPS_USADOS")
+
+PADRAO_DUMP = re.compile(r'^(page_dump_|captcha_|amazon_error_page_).*\.html(\.gz|\.zst)?$')
+CLASSES_ESPERADAS_POR_PREFIXO = {"page_dump_": ("resultados", "vazia"), "captcha_": ("captcha",), "amazon_error_page_": ("erro",)}
+CAMPOS_COMPARADOS = ("nome", "link", "preco", "indicador_usado")
+
+
+def listar_corpus(corpus_dir):
+    arquivos = [nome for nome in sorted(os.listdir(corpus_dir)) if PADRAO_DUMP.match(nome)]
+    return [os.path.join(corpus_dir, nome) for nome in arquivos]
+
+def classes_esperadas(nome_arquivo):
+    for prefixo, classes in CLASSES_ESPERADAS_POR_PREFIXO.items():
+        if nome_arquivo.startswith(prefixo):
+            return classes
+    return None
+
+def classificar(soup):
+    return orq.classificar_pagina_html(soup)["classe"]
+
+def golden_path(golden_dir, nome_arquivo):
+    return os.path.join(golden_dir, re.sub(r'\.html(\.gz|\.zst)?$', '.json', nome_arquivo))
+
+def comparar_com_golden(resultado, golden):
+    """Lista de diferenças legíveis entre a extração atual e a saída de referência."""
+    diferencas = []
+    if resultado["classe"] != golden["classe"]:
+        diferencas.append(f"classe {golden['classe']} -> {resultado['classe']}")
+    if resultado["total_blocos"] != golden["total_blocos"]:
+        diferencas.append(f"total_blocos {golden['total_blocos']} -> {resultado['total_blocos']}")
+    if "paginacao" in golden and resultado["paginacao"] != golden["paginacao"]:
+        diferencas.append(f"paginacao {golden['paginacao']} -> {resultado['paginacao']}")
+    atuais = {item["asin"]: item for item in resultado["itens"]}
+    esperados = {item["asin"]: item for item in golden["itens"]}
+    for asin in sorted(esperados.keys() - atuais.keys()):
+        diferencas.append(f"ASIN {asin} não foi mais extraído")
+    for asin in sorted(atuais.keys() - esperados.keys()):
+        diferencas.append(f"ASIN {asin} extraído a mais")
+    for asin in sorted(atuais.keys() & esperados.keys()):
+        for campo in CAMPOS_COMPARADOS:
+            if atuais[asin].get(campo) != esperados[asin].get(campo):
+                diferencas.append(f"ASIN {asin} campo '{campo}': {esperados[asin].get(campo)!r} -> {atuais[asin].get(campo)!r}")
+    return diferencas
+
+def processar_arquivo(path, repeticoes):
+    # Como no fetch HTTP: um único parse por página, compartilhado pela classificação e pela extração.
+    tempos = {"leitura": [], "parse": [], "classificacao": [], "extracao": []}
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        html = orq.ler_dump_html(path)
+        tempos["leitura"].append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        soup = orq.interpretar_html(html)
+        tempos["parse"].append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        classe = classificar(soup)
+        tempos["classificacao"].append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        extracao = orq.extract_used_items_from_html(soup)
+        tempos["extracao"].append(time.perf_counter() - inicio)
+    resultado = {"classe": classe, "total_blocos": extracao["total_blocos"], "paginacao": extracao["paginacao"], "itens": extracao["itens"]}
+    return resultado, {etapa: statistics.median(valores) for etapa, valores in tempos.items()}, len(html)
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay offline dos dumps de página: throughput do parser e regressões de seletores.")
+    parser.add_argument("--corpus", default=orq.DEBUG_LOGS_DIR_BASE, help="Diretório com page_dump_*/captcha_*/amazon_error_page_* (.html, .html.gz, .html.zst)")
+    parser.add_argument("--golden", default=None, help="Diretório das saídas de referência (padrão: <corpus>/golden)")
+    parser.add_argument("--atualizar-golden", action="store_true", help="Grava a extração atual como referência")
+    parser.add_argument("--exigir-golden", action="store_true", help="Falha se algum dump não tiver saída de referência (uso no CI)")
+    parser.add_argument("--repeticoes", type=int, default=1, help="Repetições por arquivo (usa a mediana dos tempos)")
+    parser.add_argument("--saida-json", default=None, help="Grava o relatório completo neste arquivo JSON")
+    args = parser.parse_args()
+    # O orquestrador não configura logging no import; no benchmark só interessam erros.
+    logging.basicConfig(level=logging.ERROR, format="%(levelname)s - %(message)s")
+
+    golden_dir = args.golden or os.path.join(args.corpus, "golden")
+    arquivos = listar_corpus(args.corpus)
+    if not arquivos:
+        logger.error(f"Nenhum dump encontrado em '{args.corpus}'.")
+        return 2
+    if args.atualizar_golden:
+        os.makedirs(golden_dir, exist_ok=True)
+
+    tempos_por_etapa = {"leitura": [], "parse": [], "classificacao": [], "extracao": []}
+    total_itens = total_bytes = 0
+    erros_classificacao, regressoes, sem_golden = [], {}, 0
+    relatorio_arquivos = []
+
+    for path in arquivos:
+        nome_arquivo = os.path.basename(path)
+        resultado, tempos, tamanho = processar_arquivo(path, max(1, args.repeticoes))
+        for etapa, valor in tempos.items():
+            tempos_por_etapa[etapa].append(valor)
+        total_itens += len(resultado["itens"])
+        total_bytes += tamanho
+
+        esperadas = classes_esperadas(nome_arquivo)
+        if esperadas and resultado["classe"] not in esperadas:
+            erros_classificacao.append(f"{nome_arquivo}: esperado {'/'.join(esperadas)}, classificado como '{resultado['classe']}'")
+
+        ref_path = golden_path(golden_dir, nome_arquivo)
+        if args.atualizar_golden:
+            with open(ref_path, 'w', encoding='utf-8') as f:
+                json.dump(resultado, f, ensure_ascii=False, indent=2)
+        elif os.path.exists(ref_path):
+            with open(ref_path, 'r', encoding='utf-8') as f:
+                diferencas = comparar_com_golden(resultado, json.load(f))
+            if diferencas:
+                regressoes[nome_arquivo] = diferencas
+        else:
+            sem_golden += 1
+
+        relatorio_arquivos.append({"arquivo": nome_arquivo, "bytes": tamanho, "classe": resultado["classe"],
+                                   "total_blocos": resultado["total_blocos"], "itens": len(resultado["itens"]), "tempos_s": tempos})
+
+    tempo_total = sum(sum(valores) for valores in tempos_por_etapa.values())
+    print(f"Arquivos: {len(arquivos)} | HTML: {total_bytes / 1024 / 1024:.1f} MB | Itens usados extraídos: {total_itens}")
+    print(f"Throughput: {total_itens / tempo_total if tempo_total else 0:.1f} itens/s | {len(arquivos) / tempo_total if tempo_total else 0:.2f} páginas/s")
+    for etapa, valores in tempos_por_etapa.items():
+        print(f"  {etapa:<14} total {sum(valores):7.3f}s | média {statistics.mean(valores) * 1000:8.1f}ms | p95 {percentil(valores, 95) * 1000:8.1f}ms")
+
+    for erro in erros_classificacao:
+        print(f"CLASSIFICAÇÃO: {erro}")
+    for nome_arquivo, diferencas in regressoes.items():
+        print(f"REGRESSÃO em {nome_arquivo}:")
+        for diferenca in diferencas[:20]:
+            print(f"  - {diferenca}")
+        if len(diferencas) > 20:
+            print(f"  ... e mais {len(diferencas) - 20} diferenças")
+    if args.atualizar_golden:
+        print(f"Saídas de referência gravadas em '{golden_dir}'.")
+    elif sem_golden:
+        print(f"{'ERRO: ' if args.exigir_golden else ''}{sem_golden} arquivos sem saída de referência em '{golden_dir}' (use --atualizar-golden).")
+
+    if args.saida_json:
+        with open(args.saida_json, 'w', encoding='utf-8') as f:
+            json.dump({"arquivos": relatorio_arquivos, "erros_classificacao": erros_classificacao, "regressoes": regressoes}, f, ensure_ascii=False, indent=2)
+
+    return 1 if erros_classificacao or regressoes or (args.exigir_golden and sem_golden) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,10 +3,27 @@ import re
 import logging
 import asyncio
 import json
+import gzip
+import hashlib
+import math
+import heapq
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import threading
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
 import random
+import signal
 import time
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+from array import array
 from datetime import datetime
 from fake_useragent import UserAgent
 from bs4 import BeautifulSoup
@@ -14,26 +31,31 @@ from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import (
-    NoSuchElementException, TimeoutException,
-    StaleElementReferenceException, InvalidSelectorException, WebDriverException
-)
+from selenium.common.exceptions import TimeoutException, WebDriverException, SessionNotCreatedException
 from webdriver_manager.chrome import ChromeDriverManager
 from telegram import Bot
 from telegram.constants import ParseMode
-from telegram.error import TelegramError
+from telegram.error import TelegramError, RetryAfter, NetworkError, BadRequest, TimedOut
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # --- Configuração de Logging ---
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - [%(name)s:%(funcName)s:%(lineno)d] - %(message)s",
-    handlers=[logging.StreamHandler()]
-)
-for lib_logger_name in ["webdriver_manager", "httpx", "telegram.bot", "telegram.ext", "bs4", "urllib3.connectionpool", "selenium.webdriver.remote.remote_connection"]:
-    logging.getLogger(lib_logger_name).setLevel(logging.WARNING)
+def configurar_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - [%(name)s:%(funcName)s:%(lineno)d] - %(message)s",
+        handlers=[logging.StreamHandler()]
+    )
+    for lib_logger_name in ["webdriver_manager", "httpx", "telegram.bot", "telegram.ext", "bs4", "urllib3.connectionpool", "selenium.webdriver.remote.remote_connection"]:
+        logging.getLogger(lib_logger_name).setLevel(logging.WARNING)
+
+# Só como script: importado (benchmark, testes), o módulo não mexe no logging de quem importa.
+if __name__ == "__main__":
+    configurar_logging()
 
 logger = logging.getLogger("SCRAPER_USADOS_GERAL")
 
@@ -65,7 +87,78 @@ try:
 except ValueError:
     logger.warning(f"Valor inválido para MIN_DESCONTO_PERCENTUAL_USADOS ('{MIN_DESCONTO_USADOS_STR}'). Usando 40%.")
     MIN_DESCONTO_USADOS = 40
-logger.info(f"Desconto mínimo para notificação de usados: {MIN_DESCONTO_USADOS}% (Observação: este filtro não está sendo aplicado explicitamente no código atual antes da notificação)")
+
+USAR_SERIE_PRECOS = os.getenv("USAR_SERIE_PRECOS_USADOS", "true").strip().lower() == "true"
+JANELA_DESCONTO_DIAS_STR = os.getenv("JANELA_DESCONTO_DIAS_USADOS", "30").strip()
+try:
+    JANELA_DESCONTO_DIAS_USADOS = int(JANELA_DESCONTO_DIAS_STR)
+    if JANELA_DESCONTO_DIAS_USADOS < 1:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para JANELA_DESCONTO_DIAS_USADOS ('{JANELA_DESCONTO_DIAS_STR}'). Usando 30.")
+    JANELA_DESCONTO_DIAS_USADOS = 30
+MIN_OBS_SERIE_DESCONTO_STR = os.getenv("MIN_OBS_SERIE_DESCONTO_USADOS", "3").strip()
+try:
+    MIN_OBS_SERIE_DESCONTO_USADOS = int(MIN_OBS_SERIE_DESCONTO_STR)
+    if MIN_OBS_SERIE_DESCONTO_USADOS < 1:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para MIN_OBS_SERIE_DESCONTO_USADOS ('{MIN_OBS_SERIE_DESCONTO_STR}'). Usando 3.")
+    MIN_OBS_SERIE_DESCONTO_USADOS = 3
+JANELA_SERIE_DIAS_STR = os.getenv("JANELA_SERIE_DIAS_USADOS", "90").strip()
+try:
+    JANELA_SERIE_DIAS_USADOS = int(JANELA_SERIE_DIAS_STR)
+    if JANELA_SERIE_DIAS_USADOS < 1:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para JANELA_SERIE_DIAS_USADOS ('{JANELA_SERIE_DIAS_STR}'). Usando 90.")
+    JANELA_SERIE_DIAS_USADOS = 90
+MAX_OBS_POR_ASIN_SERIE_STR = os.getenv("MAX_OBS_POR_ASIN_SERIE_USADOS", "64").strip()
+try:
+    MAX_OBS_POR_ASIN_SERIE_USADOS = int(MAX_OBS_POR_ASIN_SERIE_STR)
+    if MAX_OBS_POR_ASIN_SERIE_USADOS < 1:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para MAX_OBS_POR_ASIN_SERIE_USADOS ('{MAX_OBS_POR_ASIN_SERIE_STR}'). Usando 64.")
+    MAX_OBS_POR_ASIN_SERIE_USADOS = 64
+if USAR_SERIE_PRECOS:
+    logger.info(
+        f"Desconto mínimo para notificação de usados: {MIN_DESCONTO_USADOS}% sobre a mediana de {JANELA_DESCONTO_DIAS_USADOS} dias "
+        f"(aplicado quando o ASIN tem pelo menos {MIN_OBS_SERIE_DESCONTO_USADOS} observações na série de preços)"
+    )
+else:
+    logger.info(f"Desconto mínimo para notificação de usados: {MIN_DESCONTO_USADOS}% (Observação: sem série de preços este filtro não é aplicado)")
+
+ENRIQUECIMENTO_OFERTAS_USADOS = os.getenv("ENRIQUECIMENTO_OFERTAS_USADOS", "true").strip().lower() == "true"
+CONCORRENCIA_ENRIQUECIMENTO_STR = os.getenv("CONCORRENCIA_ENRIQUECIMENTO_USADOS", "4").strip()
+try:
+    CONCORRENCIA_ENRIQUECIMENTO_USADOS = max(1, int(CONCORRENCIA_ENRIQUECIMENTO_STR))
+except ValueError:
+    logger.warning(f"Valor inválido para CONCORRENCIA_ENRIQUECIMENTO_USADOS ('{CONCORRENCIA_ENRIQUECIMENTO_STR}'). Usando 4.")
+    CONCORRENCIA_ENRIQUECIMENTO_USADOS = 4
+TTL_OFERTAS_HORAS_STR = os.getenv("TTL_OFERTAS_HORAS_USADOS", "12").strip()
+try:
+    TTL_OFERTAS_HORAS_USADOS = float(TTL_OFERTAS_HORAS_STR)
+    if TTL_OFERTAS_HORAS_USADOS < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para TTL_OFERTAS_HORAS_USADOS ('{TTL_OFERTAS_HORAS_STR}'). Usando 12.")
+    TTL_OFERTAS_HORAS_USADOS = 12.0
+MIN_DESCONTO_SOBRE_NOVO_STR = os.getenv("MIN_DESCONTO_SOBRE_NOVO_USADOS", "0").strip()
+try:
+    MIN_DESCONTO_SOBRE_NOVO_USADOS = int(MIN_DESCONTO_SOBRE_NOVO_STR)
+    if not (0 <= MIN_DESCONTO_SOBRE_NOVO_USADOS <= 100):
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para MIN_DESCONTO_SOBRE_NOVO_USADOS ('{MIN_DESCONTO_SOBRE_NOVO_STR}'). Usando 0 (desativado).")
+    MIN_DESCONTO_SOBRE_NOVO_USADOS = 0
+if ENRIQUECIMENTO_OFERTAS_USADOS:
+    logger.info(
+        f"Enriquecimento pela página de ofertas: até {CONCORRENCIA_ENRIQUECIMENTO_USADOS} requisições simultâneas, cache por ASIN de {TTL_OFERTAS_HORAS_USADOS:.0f}h"
+        + (f", desconto mínimo de {MIN_DESCONTO_SOBRE_NOVO_USADOS}% sobre o preço do novo" if MIN_DESCONTO_SOBRE_NOVO_USADOS else ", sem filtro de desconto sobre o novo")
+    )
+else:
+    logger.info("Enriquecimento pela página de ofertas: desativado")
 
 USAR_HISTORICO_STR = os.getenv("USAR_HISTORICO_USADOS", "true").strip().lower()
 USAR_HISTORICO = USAR_HISTORICO_STR == "true"
@@ -78,40 +171,924 @@ TELEGRAM_CHAT_IDS_LIST = [chat_id.strip() for chat_id in TELEGRAM_CHAT_IDS_STR.s
 MAX_PAGINAS_POR_FLUXO = int(os.getenv("MAX_PAGINAS_USADOS_POR_FLUXO", "13")) # Limite por categoria/ordenação
 logger.info(f"Máximo de páginas por fluxo de categoria/ordenação: {MAX_PAGINAS_POR_FLUXO}")
 
+MODO_FETCH_USADOS = os.getenv("MODO_FETCH_USADOS", "selenium").strip().lower()
+if MODO_FETCH_USADOS not in ("selenium", "http"):
+    logger.warning(f"Valor inválido para MODO_FETCH_USADOS ('{MODO_FETCH_USADOS}'). Usando 'selenium'.")
+    MODO_FETCH_USADOS = "selenium"
+logger.info(f"Modo de carregamento das páginas de busca: {MODO_FETCH_USADOS}" + (" (HTTP com fallback para Selenium)" if MODO_FETCH_USADOS == "http" else ""))
+
+NUM_DRIVERS_USADOS_STR = os.getenv("NUM_DRIVERS_USADOS", "1").strip()
+try:
+    NUM_DRIVERS_USADOS = max(1, int(NUM_DRIVERS_USADOS_STR))
+except ValueError:
+    logger.warning(f"Valor inválido para NUM_DRIVERS_USADOS ('{NUM_DRIVERS_USADOS_STR}'). Usando 1.")
+    NUM_DRIVERS_USADOS = 1
+logger.info(f"Número de drivers Chrome em paralelo: {NUM_DRIVERS_USADOS}")
+
+MAX_ERROS_WEBDRIVER_USADOS_STR = os.getenv("MAX_ERROS_WEBDRIVER_USADOS", "3").strip()
+try:
+    MAX_ERROS_WEBDRIVER_USADOS = max(1, int(MAX_ERROS_WEBDRIVER_USADOS_STR))
+except ValueError:
+    logger.warning(f"Valor inválido para MAX_ERROS_WEBDRIVER_USADOS ('{MAX_ERROS_WEBDRIVER_USADOS_STR}'). Usando 3.")
+    MAX_ERROS_WEBDRIVER_USADOS = 3
+logger.info(f"Erros de WebDriver consecutivos antes de reiniciar o driver do worker: {MAX_ERROS_WEBDRIVER_USADOS}")
+
+MAX_PAGINAS_SEM_ASIN_NOVO_STR = os.getenv("MAX_PAGINAS_SEM_ASIN_NOVO_USADOS", "2").strip()
+try:
+    MAX_PAGINAS_SEM_ASIN_NOVO = max(0, int(MAX_PAGINAS_SEM_ASIN_NOVO_STR))
+except ValueError:
+    logger.warning(f"Valor inválido para MAX_PAGINAS_SEM_ASIN_NOVO_USADOS ('{MAX_PAGINAS_SEM_ASIN_NOVO_STR}'). Usando 2.")
+    MAX_PAGINAS_SEM_ASIN_NOVO = 2
+logger.info(f"Páginas consecutivas sem ASIN inédito nesta execução antes de encerrar o fluxo: {MAX_PAGINAS_SEM_ASIN_NOVO if MAX_PAGINAS_SEM_ASIN_NOVO else 'desativado'}")
+
+TELEGRAM_MSGS_POR_SEGUNDO_CHAT_STR = os.getenv("TELEGRAM_MSGS_POR_SEGUNDO_CHAT_USADOS", "1").strip()
+TELEGRAM_MSGS_POR_SEGUNDO_GLOBAL_STR = os.getenv("TELEGRAM_MSGS_POR_SEGUNDO_GLOBAL_USADOS", "25").strip()
+try:
+    TELEGRAM_MSGS_POR_SEGUNDO_CHAT = float(TELEGRAM_MSGS_POR_SEGUNDO_CHAT_STR)
+    TELEGRAM_MSGS_POR_SEGUNDO_GLOBAL = float(TELEGRAM_MSGS_POR_SEGUNDO_GLOBAL_STR)
+    if not (0 < TELEGRAM_MSGS_POR_SEGUNDO_CHAT <= TELEGRAM_MSGS_POR_SEGUNDO_GLOBAL):
+        raise ValueError
+except ValueError:
+    logger.warning(
+        f"Taxas de envio do Telegram inválidas (por chat '{TELEGRAM_MSGS_POR_SEGUNDO_CHAT_STR}', global '{TELEGRAM_MSGS_POR_SEGUNDO_GLOBAL_STR}'). "
+        "Usando 1 msg/s por chat e 25 msgs/s no total."
+    )
+    TELEGRAM_MSGS_POR_SEGUNDO_CHAT, TELEGRAM_MSGS_POR_SEGUNDO_GLOBAL = 1.0, 25.0
+TELEGRAM_RAJADA_CHAT_STR = os.getenv("TELEGRAM_RAJADA_CHAT_USADOS", "3").strip()
+try:
+    TELEGRAM_RAJADA_CHAT = int(TELEGRAM_RAJADA_CHAT_STR)
+    if TELEGRAM_RAJADA_CHAT < 1:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para TELEGRAM_RAJADA_CHAT_USADOS ('{TELEGRAM_RAJADA_CHAT_STR}'). Usando 3.")
+    TELEGRAM_RAJADA_CHAT = 3
+TELEGRAM_MAX_TENTATIVAS_STR = os.getenv("TELEGRAM_MAX_TENTATIVAS_USADOS", "6").strip()
+try:
+    TELEGRAM_MAX_TENTATIVAS = int(TELEGRAM_MAX_TENTATIVAS_STR)
+    if TELEGRAM_MAX_TENTATIVAS < 1:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para TELEGRAM_MAX_TENTATIVAS_USADOS ('{TELEGRAM_MAX_TENTATIVAS_STR}'). Usando 6.")
+    TELEGRAM_MAX_TENTATIVAS = 6
+TELEGRAM_TIMEOUT_ENCERRAMENTO_STR = os.getenv("TELEGRAM_TIMEOUT_ENCERRAMENTO_USADOS", "120").strip()
+try:
+    TELEGRAM_TIMEOUT_ENCERRAMENTO = float(TELEGRAM_TIMEOUT_ENCERRAMENTO_STR)
+    if TELEGRAM_TIMEOUT_ENCERRAMENTO <= 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para TELEGRAM_TIMEOUT_ENCERRAMENTO_USADOS ('{TELEGRAM_TIMEOUT_ENCERRAMENTO_STR}'). Usando 120.")
+    TELEGRAM_TIMEOUT_ENCERRAMENTO = 120.0
+TELEGRAM_LIMITE_CARACTERES = 4096
+
+MODO_NOTIFICACAO_USADOS = os.getenv("MODO_NOTIFICACAO_USADOS", "individual").strip().lower()
+if MODO_NOTIFICACAO_USADOS not in ("individual", "resumo"):
+    logger.warning(f"Valor inválido para MODO_NOTIFICACAO_USADOS ('{MODO_NOTIFICACAO_USADOS}'). Usando 'individual'.")
+    MODO_NOTIFICACAO_USADOS = "individual"
+AGRUPAMENTO_RESUMO_USADOS = os.getenv("AGRUPAMENTO_RESUMO_USADOS", "categoria").strip().lower()
+if AGRUPAMENTO_RESUMO_USADOS not in ("categoria", "janela"):
+    logger.warning(f"Valor inválido para AGRUPAMENTO_RESUMO_USADOS ('{AGRUPAMENTO_RESUMO_USADOS}'). Usando 'categoria'.")
+    AGRUPAMENTO_RESUMO_USADOS = "categoria"
+JANELA_RESUMO_MINUTOS_STR = os.getenv("JANELA_RESUMO_MINUTOS_USADOS", "15").strip()
+try:
+    JANELA_RESUMO_MINUTOS_USADOS = float(JANELA_RESUMO_MINUTOS_STR)
+    if JANELA_RESUMO_MINUTOS_USADOS <= 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para JANELA_RESUMO_MINUTOS_USADOS ('{JANELA_RESUMO_MINUTOS_STR}'). Usando 15.")
+    JANELA_RESUMO_MINUTOS_USADOS = 15.0
+LIMIAR_IMEDIATO_DESCONTO_STR = os.getenv("LIMIAR_IMEDIATO_DESCONTO_USADOS", "60").strip()
+try:
+    LIMIAR_IMEDIATO_DESCONTO_USADOS = float(LIMIAR_IMEDIATO_DESCONTO_STR)
+    if not (0 <= LIMIAR_IMEDIATO_DESCONTO_USADOS <= 100):
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para LIMIAR_IMEDIATO_DESCONTO_USADOS ('{LIMIAR_IMEDIATO_DESCONTO_STR}'). Usando 60.")
+    LIMIAR_IMEDIATO_DESCONTO_USADOS = 60.0
+if MODO_NOTIFICACAO_USADOS == "resumo":
+    logger.info(
+        f"Notificações em resumo: agrupadas por {AGRUPAMENTO_RESUMO_USADOS}, enviadas a cada {JANELA_RESUMO_MINUTOS_USADOS:.0f} min e no fim, "
+        f"ordenadas por desconto; descontos a partir de {LIMIAR_IMEDIATO_DESCONTO_USADOS:.0f}% saem na hora"
+    )
+else:
+    logger.info("Notificações: uma mensagem por produto qualificado")
+
+RITMO_ATRASO_INICIAL_STR = os.getenv("RITMO_ATRASO_INICIAL_USADOS", "6").strip()
+RITMO_ATRASO_MIN_STR = os.getenv("RITMO_ATRASO_MIN_USADOS", "1").strip()
+RITMO_ATRASO_MAX_STR = os.getenv("RITMO_ATRASO_MAX_USADOS", "90").strip()
+try:
+    RITMO_ATRASO_INICIAL = float(RITMO_ATRASO_INICIAL_STR)
+    RITMO_ATRASO_MIN = float(RITMO_ATRASO_MIN_STR)
+    RITMO_ATRASO_MAX = float(RITMO_ATRASO_MAX_STR)
+    if not (0 < RITMO_ATRASO_MIN <= RITMO_ATRASO_INICIAL <= RITMO_ATRASO_MAX):
+        raise ValueError
+except ValueError:
+    logger.warning(
+        f"Atrasos do ritmo inválidos (inicial '{RITMO_ATRASO_INICIAL_STR}', mínimo '{RITMO_ATRASO_MIN_STR}', máximo '{RITMO_ATRASO_MAX_STR}'; "
+        "é preciso 0 < mínimo <= inicial <= máximo). Usando 6s, 1s e 90s."
+    )
+    RITMO_ATRASO_INICIAL, RITMO_ATRASO_MIN, RITMO_ATRASO_MAX = 6.0, 1.0, 90.0
+RITMO_PASSO_ADITIVO_STR = os.getenv("RITMO_PASSO_ADITIVO_USADOS", "0.5").strip()
+try:
+    RITMO_PASSO_ADITIVO = float(RITMO_PASSO_ADITIVO_STR)
+    if RITMO_PASSO_ADITIVO < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para RITMO_PASSO_ADITIVO_USADOS ('{RITMO_PASSO_ADITIVO_STR}'). Usando 0.5.")
+    RITMO_PASSO_ADITIVO = 0.5
+RITMO_FATOR_MULTIPLICATIVO_STR = os.getenv("RITMO_FATOR_MULTIPLICATIVO_USADOS", "2").strip()
+try:
+    RITMO_FATOR_MULTIPLICATIVO = float(RITMO_FATOR_MULTIPLICATIVO_STR)
+    if RITMO_FATOR_MULTIPLICATIVO < 1:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para RITMO_FATOR_MULTIPLICATIVO_USADOS ('{RITMO_FATOR_MULTIPLICATIVO_STR}'). Usando 2.")
+    RITMO_FATOR_MULTIPLICATIVO = 2.0
+logger.info(
+    f"Ritmo adaptativo (AIMD): atraso inicial {RITMO_ATRASO_INICIAL}s, entre {RITMO_ATRASO_MIN}s e {RITMO_ATRASO_MAX}s, "
+    f"-{RITMO_PASSO_ADITIVO}s por página limpa, x{RITMO_FATOR_MULTIPLICATIVO} em bloqueio"
+)
+
+PERSISTENCIA_SESSAO_USADOS = os.getenv("PERSISTENCIA_SESSAO_USADOS", "cookies").strip().lower()
+if PERSISTENCIA_SESSAO_USADOS not in ("off", "cookies", "perfil"):
+    logger.warning(f"Valor inválido para PERSISTENCIA_SESSAO_USADOS ('{PERSISTENCIA_SESSAO_USADOS}'). Usando 'cookies'.")
+    PERSISTENCIA_SESSAO_USADOS = "cookies"
+TTL_COOKIES_HORAS_STR = os.getenv("TTL_COOKIES_HORAS_USADOS", "12").strip()
+try:
+    TTL_COOKIES_HORAS_USADOS = float(TTL_COOKIES_HORAS_STR)
+    if TTL_COOKIES_HORAS_USADOS < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para TTL_COOKIES_HORAS_USADOS ('{TTL_COOKIES_HORAS_STR}'). Usando 12.")
+    TTL_COOKIES_HORAS_USADOS = 12.0
+TTL_CHROMEDRIVER_HORAS_STR = os.getenv("TTL_CHROMEDRIVER_HORAS_USADOS", "168").strip()
+try:
+    TTL_CHROMEDRIVER_HORAS_USADOS = float(TTL_CHROMEDRIVER_HORAS_STR)
+    if TTL_CHROMEDRIVER_HORAS_USADOS < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para TTL_CHROMEDRIVER_HORAS_USADOS ('{TTL_CHROMEDRIVER_HORAS_STR}'). Usando 168.")
+    TTL_CHROMEDRIVER_HORAS_USADOS = 168.0
+logger.info(
+    f"Persistência da sessão do Chrome entre execuções: {PERSISTENCIA_SESSAO_USADOS}"
+    + (f" (cookies válidos por {TTL_COOKIES_HORAS_USADOS:.0f}h)" if PERSISTENCIA_SESSAO_USADOS == "cookies" else "")
+    + f". Caminho do chromedriver revalidado a cada {TTL_CHROMEDRIVER_HORAS_USADOS:.0f}h"
+)
+
+CATEGORIAS_BLOQUEIO_RECURSOS = {
+    "imagens": [],  # bloqueadas pela preferência de conteúdo do Chrome, que cobre qualquer extensão/host
+    "fontes": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "midia": ["*.mp4", "*.webm", "*.m3u8", "*.ts", "*.mp3", "*.vtt"],
+    "terceiros": [
+        "*doubleclick.net*", "*googlesyndication.com*", "*google-analytics.com*", "*googletagmanager.com*",
+        "*amazon-adsystem.com*", "*adsystem.amazon*", "*fls-na.amazon.*", "*unagi.amazon.*", "*unagi-na.amazon.*",
+        "*aax-us-east.amazon-adsystem.com*", "*facebook.net*", "*scorecardresearch.com*",
+    ],
+}
+BLOQUEIO_RECURSOS_USADOS_STR = os.getenv("BLOQUEIO_RECURSOS_USADOS", "imagens,fontes,midia,terceiros").strip().lower()
+BLOQUEIO_RECURSOS_USADOS = [] if BLOQUEIO_RECURSOS_USADOS_STR in ("", "off") else [c.strip() for c in BLOQUEIO_RECURSOS_USADOS_STR.split(',') if c.strip()]
+for categoria_invalida in [c for c in BLOQUEIO_RECURSOS_USADOS if c not in CATEGORIAS_BLOQUEIO_RECURSOS]:
+    logger.warning(f"Categoria de bloqueio desconhecida em BLOQUEIO_RECURSOS_USADOS: '{categoria_invalida}'. Ignorada.")
+    BLOQUEIO_RECURSOS_USADOS.remove(categoria_invalida)
+URLS_BLOQUEADAS_USADOS = [padrao for categoria in BLOQUEIO_RECURSOS_USADOS for padrao in CATEGORIAS_BLOQUEIO_RECURSOS[categoria]]
+URLS_BLOQUEADAS_USADOS += [padrao.strip() for padrao in os.getenv("URLS_BLOQUEADAS_EXTRA_USADOS", "").split(',') if padrao.strip()]
+logger.info(f"Bloqueio de recursos no Chrome: {', '.join(BLOQUEIO_RECURSOS_USADOS) or 'desativado'} ({len(URLS_BLOQUEADAS_USADOS)} padrões de URL)")
+
+QUARENTENA_PROXY_MINUTOS_STR = os.getenv("QUARENTENA_PROXY_MINUTOS_USADOS", "15").strip()
+try:
+    QUARENTENA_PROXY_MINUTOS_USADOS = float(QUARENTENA_PROXY_MINUTOS_STR)
+    if QUARENTENA_PROXY_MINUTOS_USADOS < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para QUARENTENA_PROXY_MINUTOS_USADOS ('{QUARENTENA_PROXY_MINUTOS_STR}'). Usando 15.")
+    QUARENTENA_PROXY_MINUTOS_USADOS = 15.0
+INTERVALO_REVERIFICACAO_PROXY_MINUTOS_STR = os.getenv("INTERVALO_REVERIFICACAO_PROXY_MINUTOS_USADOS", "5").strip()
+try:
+    INTERVALO_REVERIFICACAO_PROXY_MINUTOS_USADOS = float(INTERVALO_REVERIFICACAO_PROXY_MINUTOS_STR)
+    if INTERVALO_REVERIFICACAO_PROXY_MINUTOS_USADOS < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para INTERVALO_REVERIFICACAO_PROXY_MINUTOS_USADOS ('{INTERVALO_REVERIFICACAO_PROXY_MINUTOS_STR}'). Usando 5.")
+    INTERVALO_REVERIFICACAO_PROXY_MINUTOS_USADOS = 5.0
+logger.info(
+    f"Pool de proxies: quarentena de {QUARENTENA_PROXY_MINUTOS_USADOS:.0f} min após CAPTCHA/falhas, "
+    f"reverificação de proxies inativos a cada {INTERVALO_REVERIFICACAO_PROXY_MINUTOS_USADOS:.0f} min"
+)
+
+POLITICA_CURSOR_USADOS = os.getenv("POLITICA_CURSOR_USADOS", "retomar").strip().lower()
+if POLITICA_CURSOR_USADOS not in ("retomar", "rotacionar", "inicio"):
+    logger.warning(f"Valor inválido para POLITICA_CURSOR_USADOS ('{POLITICA_CURSOR_USADOS}'). Usando 'retomar'.")
+    POLITICA_CURSOR_USADOS = "retomar"
+PASSO_ROTACAO_CURSOR_STR = os.getenv("PASSO_ROTACAO_CURSOR_USADOS", "6").strip()
+try:
+    PASSO_ROTACAO_CURSOR_USADOS = int(PASSO_ROTACAO_CURSOR_STR)
+    if PASSO_ROTACAO_CURSOR_USADOS < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para PASSO_ROTACAO_CURSOR_USADOS ('{PASSO_ROTACAO_CURSOR_STR}'). Usando 6.")
+    PASSO_ROTACAO_CURSOR_USADOS = 6
+logger.info(f"Política de retomada do crawl: {POLITICA_CURSOR_USADOS}")
+
+MODO_EXECUCAO_USADOS = os.getenv("MODO_EXECUCAO_USADOS", "crawl").strip().lower()
+if MODO_EXECUCAO_USADOS not in ("crawl", "shard", "merge", "daemon"):
+    logger.warning(f"Valor inválido para MODO_EXECUCAO_USADOS ('{MODO_EXECUCAO_USADOS}'). Usando 'crawl'.")
+    MODO_EXECUCAO_USADOS = "crawl"
+# Sem valores explícitos, usa o índice/total de nós do parallelism do CircleCI.
+TOTAL_SHARDS_USADOS_STR = os.getenv("TOTAL_SHARDS_USADOS", os.getenv("CIRCLE_NODE_TOTAL", "1")).strip()
+INDICE_SHARD_USADOS_STR = os.getenv("INDICE_SHARD_USADOS", os.getenv("CIRCLE_NODE_INDEX", "0")).strip()
+try:
+    TOTAL_SHARDS_USADOS = max(1, int(TOTAL_SHARDS_USADOS_STR))
+    INDICE_SHARD_USADOS = int(INDICE_SHARD_USADOS_STR)
+    if not (0 <= INDICE_SHARD_USADOS < TOTAL_SHARDS_USADOS):
+        raise ValueError
+except ValueError:
+    logger.warning(f"Shard inválido (índice '{INDICE_SHARD_USADOS_STR}' de '{TOTAL_SHARDS_USADOS_STR}'). Usando shard único (0 de 1).")
+    TOTAL_SHARDS_USADOS, INDICE_SHARD_USADOS = 1, 0
+logger.info(
+    f"Modo de execução: {MODO_EXECUCAO_USADOS}"
+    + (f" (shard {INDICE_SHARD_USADOS + 1} de {TOTAL_SHARDS_USADOS}, notificações adiadas para o merge)" if MODO_EXECUCAO_USADOS == "shard" else "")
+)
+
+INTERVALO_QUENTE_MINUTOS_STR = os.getenv("INTERVALO_QUENTE_MINUTOS_USADOS", "5").strip()
+try:
+    INTERVALO_QUENTE_MINUTOS_USADOS = float(INTERVALO_QUENTE_MINUTOS_STR)
+    if INTERVALO_QUENTE_MINUTOS_USADOS <= 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para INTERVALO_QUENTE_MINUTOS_USADOS ('{INTERVALO_QUENTE_MINUTOS_STR}'). Usando 5.")
+    INTERVALO_QUENTE_MINUTOS_USADOS = 5.0
+PAGINAS_QUENTES_STR = os.getenv("PAGINAS_QUENTES_USADOS", "2").strip()
+try:
+    PAGINAS_QUENTES_USADOS = max(1, int(PAGINAS_QUENTES_STR))
+except ValueError:
+    logger.warning(f"Valor inválido para PAGINAS_QUENTES_USADOS ('{PAGINAS_QUENTES_STR}'). Usando 2.")
+    PAGINAS_QUENTES_USADOS = 2
+NUM_FLUXOS_QUENTES_STR = os.getenv("NUM_FLUXOS_QUENTES_USADOS", "12").strip()
+try:
+    NUM_FLUXOS_QUENTES_USADOS = max(1, int(NUM_FLUXOS_QUENTES_STR))
+except ValueError:
+    logger.warning(f"Valor inválido para NUM_FLUXOS_QUENTES_USADOS ('{NUM_FLUXOS_QUENTES_STR}'). Usando 12.")
+    NUM_FLUXOS_QUENTES_USADOS = 12
+INTERVALO_PROFUNDO_MINUTOS_STR = os.getenv("INTERVALO_PROFUNDO_MINUTOS_USADOS", "15").strip()
+try:
+    INTERVALO_PROFUNDO_MINUTOS_USADOS = float(INTERVALO_PROFUNDO_MINUTOS_STR)
+    if INTERVALO_PROFUNDO_MINUTOS_USADOS <= 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para INTERVALO_PROFUNDO_MINUTOS_USADOS ('{INTERVALO_PROFUNDO_MINUTOS_STR}'). Usando 15.")
+    INTERVALO_PROFUNDO_MINUTOS_USADOS = 15.0
+FLUXOS_POR_CICLO_PROFUNDO_STR = os.getenv("FLUXOS_POR_CICLO_PROFUNDO_USADOS", "4").strip()
+try:
+    FLUXOS_POR_CICLO_PROFUNDO_USADOS = max(1, int(FLUXOS_POR_CICLO_PROFUNDO_STR))
+except ValueError:
+    logger.warning(f"Valor inválido para FLUXOS_POR_CICLO_PROFUNDO_USADOS ('{FLUXOS_POR_CICLO_PROFUNDO_STR}'). Usando 4.")
+    FLUXOS_POR_CICLO_PROFUNDO_USADOS = 4
+# Tempo para drenar a fila do Telegram ao receber SIGTERM; deve caber no prazo de parada do supervisor (10s no Docker e no systemd por padrão).
+TELEGRAM_TIMEOUT_ENCERRAMENTO_DAEMON_STR = os.getenv("TELEGRAM_TIMEOUT_ENCERRAMENTO_DAEMON_USADOS", "8").strip()
+try:
+    TELEGRAM_TIMEOUT_ENCERRAMENTO_DAEMON = float(TELEGRAM_TIMEOUT_ENCERRAMENTO_DAEMON_STR)
+    if TELEGRAM_TIMEOUT_ENCERRAMENTO_DAEMON < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para TELEGRAM_TIMEOUT_ENCERRAMENTO_DAEMON_USADOS ('{TELEGRAM_TIMEOUT_ENCERRAMENTO_DAEMON_STR}'). Usando 8.")
+    TELEGRAM_TIMEOUT_ENCERRAMENTO_DAEMON = 8.0
+if MODO_EXECUCAO_USADOS == "daemon":
+    logger.info(
+        f"Daemon: páginas 1-{PAGINAS_QUENTES_USADOS} dos {NUM_FLUXOS_QUENTES_USADOS} fluxos quentes a cada {INTERVALO_QUENTE_MINUTOS_USADOS:.0f} min; "
+        f"{FLUXOS_POR_CICLO_PROFUNDO_USADOS} fluxos completos do cursor a cada {INTERVALO_PROFUNDO_MINUTOS_USADOS:.0f} min"
+    )
+
+ESCALONADOR_USADOS = os.getenv("ESCALONADOR_USADOS", "rendimento").strip().lower()
+if ESCALONADOR_USADOS not in ("rendimento", "fixo"):
+    logger.warning(f"Valor inválido para ESCALONADOR_USADOS ('{ESCALONADOR_USADOS}'). Usando 'rendimento'.")
+    ESCALONADOR_USADOS = "rendimento"
+ESCALONADOR_EXPLORACAO_STR = os.getenv("ESCALONADOR_EXPLORACAO_USADOS", "0.5").strip()
+try:
+    ESCALONADOR_EXPLORACAO_USADOS = float(ESCALONADOR_EXPLORACAO_STR)
+    if ESCALONADOR_EXPLORACAO_USADOS < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para ESCALONADOR_EXPLORACAO_USADOS ('{ESCALONADOR_EXPLORACAO_STR}'). Usando 0.5.")
+    ESCALONADOR_EXPLORACAO_USADOS = 0.5
+ESCALONADOR_PAGINAS_MIN_STR = os.getenv("ESCALONADOR_PAGINAS_MIN_USADOS", "2").strip()
+try:
+    ESCALONADOR_PAGINAS_MIN_USADOS = int(ESCALONADOR_PAGINAS_MIN_STR)
+    if ESCALONADOR_PAGINAS_MIN_USADOS < 1:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para ESCALONADOR_PAGINAS_MIN_USADOS ('{ESCALONADOR_PAGINAS_MIN_STR}'). Usando 2.")
+    ESCALONADOR_PAGINAS_MIN_USADOS = 2
+ESCALONADOR_PESO_ASIN_NOVO_STR = os.getenv("ESCALONADOR_PESO_ASIN_NOVO_USADOS", "0.05").strip()
+try:
+    ESCALONADOR_PESO_ASIN_NOVO_USADOS = float(ESCALONADOR_PESO_ASIN_NOVO_STR)
+    if ESCALONADOR_PESO_ASIN_NOVO_USADOS < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para ESCALONADOR_PESO_ASIN_NOVO_USADOS ('{ESCALONADOR_PESO_ASIN_NOVO_STR}'). Usando 0.05.")
+    ESCALONADOR_PESO_ASIN_NOVO_USADOS = 0.05
+ESCALONADOR_DECAIMENTO_STR = os.getenv("ESCALONADOR_DECAIMENTO_USADOS", "0.9").strip()
+try:
+    ESCALONADOR_DECAIMENTO_USADOS = float(ESCALONADOR_DECAIMENTO_STR)
+    if not (0 < ESCALONADOR_DECAIMENTO_USADOS <= 1):
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para ESCALONADOR_DECAIMENTO_USADOS ('{ESCALONADOR_DECAIMENTO_STR}'; deve estar em (0, 1]). Usando 0.9.")
+    ESCALONADOR_DECAIMENTO_USADOS = 0.9
+if ESCALONADOR_USADOS == "rendimento":
+    logger.info(
+        f"Escalonador de fluxos: UCB1 sobre o rendimento por página (qualificados + {ESCALONADOR_PESO_ASIN_NOVO_USADOS} x ASINs inéditos), "
+        f"exploração {ESCALONADOR_EXPLORACAO_USADOS}, mínimo de {ESCALONADOR_PAGINAS_MIN_USADOS} páginas por fluxo, decaimento {ESCALONADOR_DECAIMENTO_USADOS} por execução"
+    )
+else:
+    logger.info("Escalonador de fluxos: fixo (ordem do cursor, mesmo limite de páginas para todos)")
+
+PRAZO_MINUTOS_STR = os.getenv("PRAZO_MINUTOS_USADOS", "0").strip()
+try:
+    PRAZO_MINUTOS_USADOS = float(PRAZO_MINUTOS_STR)
+    if PRAZO_MINUTOS_USADOS < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para PRAZO_MINUTOS_USADOS ('{PRAZO_MINUTOS_STR}'). Usando 0 (sem prazo).")
+    PRAZO_MINUTOS_USADOS = 0.0
+MARGEM_ENCERRAMENTO_SEGUNDOS_STR = os.getenv("MARGEM_ENCERRAMENTO_SEGUNDOS_USADOS", "180").strip()
+try:
+    MARGEM_ENCERRAMENTO_SEGUNDOS_USADOS = float(MARGEM_ENCERRAMENTO_SEGUNDOS_STR)
+    if MARGEM_ENCERRAMENTO_SEGUNDOS_USADOS < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para MARGEM_ENCERRAMENTO_SEGUNDOS_USADOS ('{MARGEM_ENCERRAMENTO_SEGUNDOS_STR}'). Usando 180.")
+    MARGEM_ENCERRAMENTO_SEGUNDOS_USADOS = 180.0
+logger.info(
+    f"Prazo global da execução: {PRAZO_MINUTOS_USADOS:.0f} min (novas páginas param {MARGEM_ENCERRAMENTO_SEGUNDOS_USADOS:.0f}s antes, para gravar histórico e filas)"
+    if PRAZO_MINUTOS_USADOS > 0 else "Prazo global da execução: sem prazo"
+)
+
+# Timeout do driver.get; com prazo global, cada carregamento é limitado ao tempo que resta antes da margem de encerramento.
+TIMEOUT_CARREGAMENTO_PAGINA_USADOS = 120
+TIMEOUT_PRONTIDAO_STR = os.getenv("TIMEOUT_PRONTIDAO_USADOS", "30").strip()
+try:
+    TIMEOUT_PRONTIDAO_USADOS = float(TIMEOUT_PRONTIDAO_STR)
+    if TIMEOUT_PRONTIDAO_USADOS <= 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para TIMEOUT_PRONTIDAO_USADOS ('{TIMEOUT_PRONTIDAO_STR}'). Usando 30.")
+    TIMEOUT_PRONTIDAO_USADOS = 30.0
+logger.info(f"Prontidão da página de busca: poll em JS por blocos com preço estáveis (timeout {TIMEOUT_PRONTIDAO_USADOS:.0f}s)")
+
+TTL_CATEGORIAS_HORAS_STR = os.getenv("TTL_CATEGORIAS_HORAS_USADOS", "24").strip()
+try:
+    TTL_CATEGORIAS_HORAS_USADOS = float(TTL_CATEGORIAS_HORAS_STR)
+    if TTL_CATEGORIAS_HORAS_USADOS < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para TTL_CATEGORIAS_HORAS_USADOS ('{TTL_CATEGORIAS_HORAS_STR}'). Usando 24.")
+    TTL_CATEGORIAS_HORAS_USADOS = 24.0
+logger.info(f"TTL do cache de categorias: {TTL_CATEGORIAS_HORAS_USADOS}h")
+
+MODO_DUMP_USADOS = os.getenv("MODO_DUMP_USADOS", "amostra").strip().lower()
+if MODO_DUMP_USADOS not in ("off", "amostra", "anomalia", "todos"):
+    logger.warning(f"Valor inválido para MODO_DUMP_USADOS ('{MODO_DUMP_USADOS}'). Usando 'amostra'.")
+    MODO_DUMP_USADOS = "amostra"
+TAXA_AMOSTRA_DUMP_STR = os.getenv("TAXA_AMOSTRA_DUMP_USADOS", "0.05").strip()
+try:
+    TAXA_AMOSTRA_DUMP_USADOS = min(1.0, max(0.0, float(TAXA_AMOSTRA_DUMP_STR)))
+except ValueError:
+    logger.warning(f"Valor inválido para TAXA_AMOSTRA_DUMP_USADOS ('{TAXA_AMOSTRA_DUMP_STR}'). Usando 0.05.")
+    TAXA_AMOSTRA_DUMP_USADOS = 0.05
+COMPRESSAO_DUMP_USADOS = os.getenv("COMPRESSAO_DUMP_USADOS", "gzip").strip().lower()
+if COMPRESSAO_DUMP_USADOS == "zstd" and zstandard is None:
+    logger.warning("COMPRESSAO_DUMP_USADOS=zstd, mas o pacote 'zstandard' não está instalado. Usando gzip.")
+    COMPRESSAO_DUMP_USADOS = "gzip"
+elif COMPRESSAO_DUMP_USADOS not in ("gzip", "zstd", "nenhuma"):
+    logger.warning(f"Valor inválido para COMPRESSAO_DUMP_USADOS ('{COMPRESSAO_DUMP_USADOS}'). Usando gzip.")
+    COMPRESSAO_DUMP_USADOS = "gzip"
+MAX_MB_DUMPS_STR = os.getenv("MAX_MB_DUMPS_USADOS", "100").strip()
+try:
+    MAX_MB_DUMPS_USADOS = float(MAX_MB_DUMPS_STR)
+    if MAX_MB_DUMPS_USADOS <= 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para MAX_MB_DUMPS_USADOS ('{MAX_MB_DUMPS_STR}'). Usando 100.")
+    MAX_MB_DUMPS_USADOS = 100.0
+logger.info(
+    f"Dumps de debug: modo {MODO_DUMP_USADOS}" + (f" (taxa {TAXA_AMOSTRA_DUMP_USADOS:.0%})" if MODO_DUMP_USADOS == "amostra" else "")
+    + f", compressão {COMPRESSAO_DUMP_USADOS}, limite {MAX_MB_DUMPS_USADOS:.0f} MB"
+)
+
 HISTORY_DIR_BASE = "history_files_usados"
 DEBUG_LOGS_DIR_BASE = "debug_logs_usados"
 HISTORY_FILENAME_USADOS_GERAL = "price_history_USADOS_GERAL.json"
+HISTORY_DB_FILENAME_USADOS_GERAL = "price_history_USADOS_GERAL.sqlite3"
+SERIE_PRECOS_FILENAME_USADOS = "price_series_USADOS.bin"
+SERIE_ASINS_FILENAME_USADOS = "price_series_USADOS_asins.txt"
+FILA_TELEGRAM_FILENAME_USADOS = "fila_telegram_usados.jsonl"
+CURSOR_FILENAME_USADOS = "cursor_crawl_usados.json"
+CATEGORIAS_CACHE_FILENAME_USADOS = "categorias_cache_usados.json"
+SHARDS_DIR_BASE = os.path.join(HISTORY_DIR_BASE, "shards")
+DELTA_SHARD_FILENAME_USADOS = "delta_shard_{indice}.json"
+CURSOR_SHARD_FILENAME_USADOS = "cursor_crawl_usados_shard_{indice}.json"
+RENDIMENTO_FLUXOS_FILENAME_USADOS = "rendimento_fluxos_usados.json"
+RENDIMENTO_FLUXOS_SHARD_FILENAME_USADOS = "rendimento_fluxos_usados_shard_{indice}.json"
+OFERTAS_CACHE_FILENAME_USADOS = "ofertas_cache_usados.json"
+OFERTAS_CACHE_SHARD_FILENAME_USADOS = "ofertas_cache_usados_shard_{indice}.json"
+METRICAS_DIR_BASE = "metricas_usados"
+METRICAS_JSON_FILENAME_USADOS = "metricas_usados.json"
+METRICAS_PROM_FILENAME_USADOS = "metricas_usados.prom"
+CACHE_DRIVER_DIR_BASE = "cache_driver_usados"
+CHROMEDRIVER_META_FILENAME_USADOS = "chromedriver.json"
+COOKIE_JAR_FILENAME_USADOS = "cookies_amazon_usados.json"
+
+BACKEND_HISTORICO_USADOS = os.getenv("BACKEND_HISTORICO_USADOS", "sqlite").strip().lower()
+if BACKEND_HISTORICO_USADOS not in ("json", "sqlite"):
+    logger.warning(f"Valor inválido para BACKEND_HISTORICO_USADOS ('{BACKEND_HISTORICO_USADOS}'). Usando 'sqlite'.")
+    BACKEND_HISTORICO_USADOS = "sqlite"
+logger.info(f"Backend do histórico de usados: {BACKEND_HISTORICO_USADOS}")
+
+TTL_HISTORICO_DIAS_STR = os.getenv("TTL_HISTORICO_DIAS_USADOS", "90").strip()
+try:
+    TTL_HISTORICO_DIAS_USADOS = float(TTL_HISTORICO_DIAS_STR)
+    if TTL_HISTORICO_DIAS_USADOS < 0:
+        raise ValueError
+except ValueError:
+    logger.warning(f"Valor inválido para TTL_HISTORICO_DIAS_USADOS ('{TTL_HISTORICO_DIAS_STR}'). Usando 90.")
+    TTL_HISTORICO_DIAS_USADOS = 90.0
+MAX_ASINS_HISTORICO_USADOS_STR = os.getenv("MAX_ASINS_HISTORICO_USADOS", "100000").strip()
+try:
+    MAX_ASINS_HISTORICO_USADOS = max(0, int(MAX_ASINS_HISTORICO_USADOS_STR))
+except ValueError:
+    logger.warning(f"Valor inválido para MAX_ASINS_HISTORICO_USADOS ('{MAX_ASINS_HISTORICO_USADOS_STR}'). Usando 100000.")
+    MAX_ASINS_HISTORICO_USADOS = 100000
+logger.info(
+    f"Retenção do histórico: ASINs não vistos há mais de {TTL_HISTORICO_DIAS_USADOS:.0f} dias são removidos"
+    if TTL_HISTORICO_DIAS_USADOS > 0 else "Retenção do histórico: sem TTL"
+)
+logger.info(
+    f"Limite do histórico: {MAX_ASINS_HISTORICO_USADOS} ASINs (remove os vistos há mais tempo)"
+    if MAX_ASINS_HISTORICO_USADOS else "Limite do histórico: desativado"
+)
+
+class GravadorDumps:
+    """
+    Grava dumps de debug (HTML comprimido e PNG) numa thread dedicada, fora do event loop.
+    Modos: off, anomalia (só CAPTCHA/erro), amostra (anomalias + fração das páginas normais) e todos.
+    O diretório funciona como buffer circular: acima de `max_bytes` os arquivos mais antigos são apagados.
+    Pode ser chamado de várias threads (fetch HTTP e anomalias rodam via asyncio.to_thread): a lista de
+    futuros é protegida por lock, e codificação e compressão acontecem na thread de gravação.
+    """
+
+    EXTENSOES = {"gzip": ".gz", "zstd": ".zst", "nenhuma": ""}
+
+    def __init__(self, dir_base, modo, compressao, max_bytes, taxa_amostra):
+        self.dir_base = dir_base
+        self.modo = modo
+        self.compressao = compressao
+        self.max_bytes = max_bytes
+        self.taxa_amostra = taxa_amostra
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dumps")
+        self.futuros = []
+        self.lock = threading.Lock()
+        arquivos = [os.path.join(dir_base, nome) for nome in os.listdir(dir_base)]
+        arquivos = sorted((path for path in arquivos if os.path.isfile(path)), key=os.path.getmtime)
+        self.arquivos = deque((path, os.path.getsize(path)) for path in arquivos)
+        self.total_bytes = sum(tamanho for _, tamanho in self.arquivos)
+
+    def deve_gravar(self, anomalia=False):
+        if self.modo == "off":
+            return False
+        if anomalia or self.modo == "todos":
+            return True
+        return self.modo == "amostra" and random.random() < self.taxa_amostra
+
+    def _comprimir(self, dados):
+        if self.compressao == "gzip":
+            return gzip.compress(dados, compresslevel=6)
+        if self.compressao == "zstd":
+            return zstandard.ZstdCompressor(level=10).compress(dados)
+        return dados
+
+    def _gravar(self, path, dados, comprimir):
+        try:
+            if isinstance(dados, str):
+                dados = dados.encode('utf-8')
+            if comprimir:
+                dados = self._comprimir(dados)
+                path += self.EXTENSOES[self.compressao]
+            with open(path, 'wb') as f:
+                f.write(dados)
+            self.arquivos.append((path, len(dados)))
+            self.total_bytes += len(dados)
+            while self.total_bytes > self.max_bytes and len(self.arquivos) > 1:
+                antigo_path, antigo_tamanho = self.arquivos.popleft()
+                self.total_bytes -= antigo_tamanho
+                if os.path.exists(antigo_path):
+                    os.remove(antigo_path)
+            logger.info(f"Dump de debug salvo em: {path} ({len(dados)} bytes)")
+        except Exception as e:
+            logger.error(f"Erro ao salvar dump de debug '{path}': {e}")
+
+    def gravar_html(self, nome_base, html, anomalia=False):
+        if not self.deve_gravar(anomalia):
+            return
+        path = os.path.join(self.dir_base, f"{nome_base}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.html")
+        self._submeter(path, html, True)
+
+    def gravar_png(self, nome_base, png_bytes):
+        path = os.path.join(self.dir_base, f"{nome_base}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.png")
+        self._submeter(path, png_bytes, False)
+
+    def _submeter(self, path, dados, comprimir):
+        with self.lock:
+            self.futuros = [futuro for futuro in self.futuros if not futuro.done()]
+            self.futuros.append(self.executor.submit(self._gravar, path, dados, comprimir))
+
+    def gravar_anomalia(self, nome_base, driver, current_run_logger):
+        """Screenshot + HTML do driver para CAPTCHA/página de erro (a captura é síncrona, a gravação não)."""
+        if not self.deve_gravar(anomalia=True):
+            return
+        try:
+            self.gravar_png(nome_base, driver.get_screenshot_as_png())
+            self.gravar_html(nome_base, driver.page_source, anomalia=True)
+        except Exception as e:
+            current_run_logger.error(f"Erro ao capturar debug '{nome_base}': {e}")
+
+    def aguardar_pendentes(self):
+        with self.lock:
+            futuros, self.futuros = self.futuros, []
+        wait_futures(futuros)
+
+def ler_dump_html(path):
+    """Lê um dump de página (.html, .html.gz ou .html.zst)."""
+    with open(path, 'rb') as f:
+        dados = f.read()
+    if path.endswith(".gz"):
+        dados = gzip.decompress(dados)
+    elif path.endswith(".zst"):
+        dados = zstandard.ZstdDecompressor().decompress(dados, max_output_size=64 * 1024 * 1024)
+    return dados.decode('utf-8', errors='replace')
+
+class MetricasExecucao:
+    """
+    Cronômetros por fase (driver.get, esperas, parse, save do histórico, envios ao Telegram...) e
+    contadores da execução, agregados no total e por fluxo. Ao final, exporta um resumo JSON e um
+    textfile no formato do Prometheus (node_exporter textfile collector). No daemon, cada ciclo é uma
+    "execução": as métricas são exportadas e zeradas a cada ciclo, então nada cresce sem limite.
+    Workers em asyncio.to_thread (fetch HTTP, enriquecimento de ofertas) também registram aqui, por isso o lock.
+    """
 
-os.makedirs(HISTORY_DIR_BASE, exist_ok=True)
-logger.info(f"Diretório de histórico '{HISTORY_DIR_BASE}' verificado/criado.")
-os.makedirs(DEBUG_LOGS_DIR_BASE, exist_ok=True)
-logger.info(f"Diretório de logs de debug '{DEBUG_LOGS_DIR_BASE}' verificado/criado.")
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reiniciar()
 
+    def reiniciar(self):
+        with self.lock:
+            self.inicio = time.time()
+            self.fases = {}
+            self.contadores = {}
+            self.por_fluxo = {}
+            self.duracoes_pagina = []
+            self.medidas = {}
+
+    @staticmethod
+    def _acumular_fase(fases, fase, duracao):
+        agregado = fases.setdefault(fase, {"total_s": 0.0, "chamadas": 0, "max_s": 0.0})
+        agregado["total_s"] += duracao
+        agregado["chamadas"] += 1
+        agregado["max_s"] = max(agregado["max_s"], duracao)
+
+    def _fluxo(self, nome_fluxo):
+        return self.por_fluxo.setdefault(nome_fluxo, {"fases": {}, "contadores": {}, "duracoes_pagina": []})
+
+    @contextmanager
+    def cronometrar(self, fase, fluxo=None):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_fase(fase, time.perf_counter() - inicio, fluxo)
+
+    def registrar_fase(self, fase, duracao, fluxo=None):
+        with self.lock:
+            self._acumular_fase(self.fases, fase, duracao)
+            if fluxo:
+                self._acumular_fase(self._fluxo(fluxo)["fases"], fase, duracao)
+
+    def incrementar(self, contador, quantidade=1, fluxo=None):
+        with self.lock:
+            self.contadores[contador] = self.contadores.get(contador, 0) + quantidade
+            if fluxo:
+                contadores_fluxo = self._fluxo(fluxo)["contadores"]
+                contadores_fluxo[contador] = contadores_fluxo.get(contador, 0) + quantidade
+
+    def definir(self, medida, valor):
+        """Valor pontual (gauge), como o tamanho do histórico antes e depois da compactação."""
+        with self.lock:
+            self.medidas[medida] = valor
+
+    def registrar_pagina(self, duracao, fluxo=None):
+        with self.lock:
+            self.duracoes_pagina.append(duracao)
+            if fluxo:
+                self._fluxo(fluxo)["duracoes_pagina"].append(duracao)
+
+    @staticmethod
+    def _resumo_duracoes(duracoes):
+        if not duracoes:
+            return {"n": 0}
+        ordenadas = sorted(duracoes)
+        return {
+            "n": len(ordenadas), "total_s": sum(ordenadas), "media_s": sum(ordenadas) / len(ordenadas),
+            "p50_s": ordenadas[len(ordenadas) // 2], "p95_s": ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))],
+            "max_s": ordenadas[-1]
+        }
+
+    @staticmethod
+    def _copiar_fases(fases):
+        return {fase: dict(agregado) for fase, agregado in fases.items()}
+
+    def resumo(self):
+        """Cópia consistente das métricas, tirada sob o lock para não mudar durante a exportação."""
+        with self.lock:
+            return {
+                "inicio": datetime.fromtimestamp(self.inicio).isoformat(),
+                "duracao_s": time.time() - self.inicio,
+                "fases": self._copiar_fases(self.fases),
+                "contadores": dict(self.contadores),
+                "medidas": dict(self.medidas),
+                "paginas": self._resumo_duracoes(self.duracoes_pagina),
+                "por_fluxo": {
+                    nome_fluxo: {"fases": self._copiar_fases(dados["fases"]), "contadores": dict(dados["contadores"]),
+                                 "paginas": self._resumo_duracoes(dados["duracoes_pagina"])}
+                    for nome_fluxo, dados in self.por_fluxo.items()
+                }
+            }
+
+    def _texto_prometheus(self, resumo):
+        linhas = [
+            "# HELP usados_execucao_duracao_segundos Duração total da execução do scraper de usados.",
+            "# TYPE usados_execucao_duracao_segundos gauge",
+            f"usados_execucao_duracao_segundos {resumo['duracao_s']:.3f}",
+            "# HELP usados_execucao_fim_timestamp_segundos Momento em que a execução terminou.",
+            "# TYPE usados_execucao_fim_timestamp_segundos gauge",
+            f"usados_execucao_fim_timestamp_segundos {time.time():.0f}",
+            "# HELP usados_fase_segundos_total Tempo acumulado por fase da execução.",
+            "# TYPE usados_fase_segundos_total counter",
+        ]
+        linhas += [f'usados_fase_segundos_total{{fase="{fase}"}} {dados["total_s"]:.3f}' for fase, dados in sorted(resumo["fases"].items())]
+        linhas += ["# HELP usados_fase_chamadas_total Número de vezes que cada fase foi executada.", "# TYPE usados_fase_chamadas_total counter"]
+        linhas += [f'usados_fase_chamadas_total{{fase="{fase}"}} {dados["chamadas"]}' for fase, dados in sorted(resumo["fases"].items())]
+        linhas += ["# HELP usados_eventos_total Contadores da execução (páginas, itens, notificações, retentativas, CAPTCHAs...).", "# TYPE usados_eventos_total counter"]
+        linhas += [f'usados_eventos_total{{evento="{contador}"}} {valor}' for contador, valor in sorted(resumo["contadores"].items())]
+        if resumo["medidas"]:
+            linhas += ["# HELP usados_medida Valores pontuais da execução (tamanho do histórico, ASINs...).", "# TYPE usados_medida gauge"]
+            linhas += [f'usados_medida{{medida="{medida}"}} {valor}' for medida, valor in sorted(resumo["medidas"].items())]
+        paginas = resumo["paginas"]
+        if paginas["n"]:
+            linhas += [
+                "# HELP usados_pagina_duracao_segundos Duração do processamento de uma página de busca.",
+                "# TYPE usados_pagina_duracao_segundos summary",
+                f'usados_pagina_duracao_segundos{{quantile="0.5"}} {paginas["p50_s"]:.3f}',
+                f'usados_pagina_duracao_segundos{{quantile="0.95"}} {paginas["p95_s"]:.3f}',
+                f"usados_pagina_duracao_segundos_sum {paginas['total_s']:.3f}",
+                f"usados_pagina_duracao_segundos_count {paginas['n']}",
+            ]
+        return "\n".join(linhas) + "\n"
+
+    def exportar(self, dir_base, logger_param):
+        resumo = self.resumo()
+        for nome_arquivo, conteudo in (
+            (METRICAS_JSON_FILENAME_USADOS, json.dumps(resumo, ensure_ascii=False, indent=2)),
+            (METRICAS_PROM_FILENAME_USADOS, self._texto_prometheus(resumo)),
+        ):
+            path = os.path.join(dir_base, nome_arquivo)
+            try:
+                with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                    f.write(conteudo)
+                os.replace(f"{path}.tmp", path)
+            except Exception as e:
+                logger_param.error(f"Erro ao exportar métricas para '{path}': {e}")
+        fases_mais_lentas = sorted(resumo["fases"].items(), key=lambda par: par[1]["total_s"], reverse=True)[:6]
+        logger_param.info(
+            f"Métricas da execução ({resumo['duracao_s']:.0f}s) exportadas em '{dir_base}'. Fases mais demoradas: "
+            + ", ".join(f"{fase} {dados['total_s']:.0f}s" for fase, dados in fases_mais_lentas)
+        )
+        logger_param.info(f"Contadores: {json.dumps(resumo['contadores'], ensure_ascii=False)}")
+
+metricas_execucao_global = MetricasExecucao()
+
+gravador_dumps_global = None
 bot_instance_global = None
-if TELEGRAM_TOKEN and TELEGRAM_CHAT_IDS_LIST:
-    try:
-        bot_instance_global = Bot(token=TELEGRAM_TOKEN)
-        logger.info(f"Instância global do Bot Telegram criada. IDs de Chat: {TELEGRAM_CHAT_IDS_LIST}")
-    except Exception as e:
-        logger.error(f"Falha ao inicializar Bot global: {e}", exc_info=True)
-else:
-    logger.warning("Token do Telegram ou Chat IDs não configurados. Notificações Telegram desabilitadas.")
+despachante_telegram_global = None
+controladores_ritmo_global = {}
+pool_proxies_global = None
+lock_pool_proxies_global = threading.Lock()
+chromedriver_path_global = None
+lock_chromedriver_global = threading.Lock()
+slots_perfil_em_uso_global = set()
+prazo_execucao_global = None
+enriquecedor_ofertas_global = None
+agregador_resumo_global = None
+
+def inicializar_ambiente_usados():
+    """
+    Efeitos colaterais da execução (diretórios de trabalho, gravador de dumps e Bot do Telegram), chamados
+    só pelo __main__: importar o módulo para usar o parser, como faz o benchmark, não cria nada no CWD.
+    """
+    global gravador_dumps_global, bot_instance_global
+    os.makedirs(HISTORY_DIR_BASE, exist_ok=True)
+    logger.info(f"Diretório de histórico '{HISTORY_DIR_BASE}' verificado/criado.")
+    os.makedirs(DEBUG_LOGS_DIR_BASE, exist_ok=True)
+    logger.info(f"Diretório de logs de debug '{DEBUG_LOGS_DIR_BASE}' verificado/criado.")
+    os.makedirs(SHARDS_DIR_BASE, exist_ok=True)
+    os.makedirs(METRICAS_DIR_BASE, exist_ok=True)
+    os.makedirs(CACHE_DRIVER_DIR_BASE, exist_ok=True)
+    gravador_dumps_global = GravadorDumps(
+        DEBUG_LOGS_DIR_BASE, MODO_DUMP_USADOS, COMPRESSAO_DUMP_USADOS, int(MAX_MB_DUMPS_USADOS * 1024 * 1024), TAXA_AMOSTRA_DUMP_USADOS
+    )
+    if TELEGRAM_TOKEN and TELEGRAM_CHAT_IDS_LIST:
+        try:
+            bot_instance_global = Bot(token=TELEGRAM_TOKEN)
+            logger.info(f"Instância global do Bot Telegram criada. IDs de Chat: {TELEGRAM_CHAT_IDS_LIST}")
+        except Exception as e:
+            logger.error(f"Falha ao inicializar Bot global: {e}", exc_info=True)
+    else:
+        logger.warning("Token do Telegram ou Chat IDs não configurados. Notificações Telegram desabilitadas.")
 
 def escape_md(text):
     escape_chars = r'([_\*\[\]\(\)~`>#+\-=|{}.!])'
     return re.sub(escape_chars, r'\\\1', str(text))
 
+def categoria_do_fluxo(nome_fluxo):
+    categoria_match = re.search(rf"{NOME_FLUXO_BASE} - (.*?) - (Menor Preço|Maior Preço|Destaque|Avaliação|Lançamento|Mais Vendido)", nome_fluxo)
+    nome_categoria = categoria_match.group(1) if categoria_match else "Geral"
+    return "Geral" if "Geral (Fallback)" in nome_categoria else nome_categoria
+
+def montar_mensagem_telegram(candidato, nome_fluxo):
+    """Mensagem MarkdownV2 de um produto qualificado (queda de preço ou novo no Quase Novo)."""
+    nome, link, asin, price = candidato["nome"], candidato["link"], candidato["asin"], candidato["preco"]
+    preco_historico_val_para_msg = candidato.get("preco_historico")
+    estatisticas_serie = candidato.get("estatisticas_serie")
+
+    nome_categoria_para_msg = categoria_do_fluxo(nome_fluxo)
+    nome_produto_com_categoria_escapado = escape_md(f"{str(nome)} ({nome_categoria_para_msg})")
+    preco_atual_formatado = f"R${price:.2f}"
+
+    mediana_str = ""
+    if estatisticas_serie and estatisticas_serie["n"]:
+        mediana_str = escape_md(f"📊 Mediana {JANELA_DESCONTO_DIAS_USADOS}d: R${estatisticas_serie['mediana']:.2f} ({estatisticas_serie['n']} obs.)") + "\n"
+    if candidato.get("preco_novo"):
+        mediana_str += escape_md(f"🆕 Novo: R${candidato['preco_novo']:.2f} ({candidato['desconto_novo']:.0f}% abaixo)") + "\n"
+    if candidato.get("condicao"):
+        mediana_str += escape_md(f"🔎 Condição: {candidato['condicao']}") + "\n"
+
+    if preco_historico_val_para_msg and preco_historico_val_para_msg > price:
+        preco_antigo_formatado = f"R${preco_historico_val_para_msg:.2f}"
+        desconto_calculado_str = ""
+        if preco_historico_val_para_msg > 0:
+            percentual_desconto = ((preco_historico_val_para_msg - price) / preco_historico_val_para_msg) * 100
+            desconto_calculado_str = f"📉 Desconto: {escape_md(f'{percentual_desconto:.1f}%')}\n"
+
+        titulo_mensagem = escape_md("↘️ PREÇO BAIXOU! ↙️")
+        return (
+            f"*{titulo_mensagem}*\n\n"
+            f"🛒 {nome_produto_com_categoria_escapado}\n"
+            f"💰 De: {escape_md(preco_antigo_formatado)}\n"
+            f"💸 Por: *{escape_md(preco_atual_formatado)}*\n"
+            f"{desconto_calculado_str}{mediana_str}\n"
+            f"🔗 [Ver produto]({link})\n\n"
+            f"🏷️ ASIN: `{escape_md(str(asin))}`\n"
+            f"🕒 {escape_md(datetime.now().strftime('%d/%m/%Y %H:%M:%S'))}"
+        )
+    titulo_mensagem = escape_md("🟡 NOVO NO QUASE NOVO! 🟡")
+    return (
+        f"*{titulo_mensagem}*\n\n"
+        f"🛒 {nome_produto_com_categoria_escapado}\n"
+        f"💰 Por: *{escape_md(preco_atual_formatado)}*\n{mediana_str}\n"
+        f"🔗 [Ver produto]({link})\n\n"
+        f"🏷️ ASIN: `{escape_md(str(asin))}`\n"
+        f"🕒 {escape_md(datetime.now().strftime('%d/%m/%Y %H:%M:%S'))}"
+    )
+
+def desconto_candidato(candidato):
+    """Melhor referência de desconto disponível: preço do novo, depois preço anterior no histórico, depois mediana."""
+    preco = candidato["preco"]
+    referencias = (
+        candidato.get("preco_novo"),
+        candidato.get("preco_historico"),
+        (candidato.get("estatisticas_serie") or {}).get("mediana"),
+    )
+    for referencia in referencias:
+        if referencia and referencia > preco:
+            return (referencia - preco) / referencia * 100, referencia
+    return 0.0, None
+
+def item_resumo(candidato, nome_fluxo):
+    desconto, referencia = desconto_candidato(candidato)
+    return {"nome": str(candidato["nome"]), "asin": candidato["asin"], "preco": candidato["preco"],
+            "referencia": referencia, "desconto": round(desconto, 1), "categoria": categoria_do_fluxo(nome_fluxo)}
+
+def formatar_item_resumo(posicao, item):
+    nome = item["nome"] if len(item["nome"]) <= 80 else item["nome"][:77] + "..."
+    linha = f"{posicao}\\. *" + escape_md(f"R${item['preco']:.2f}") + "*"
+    if item["referencia"]:
+        linha += " ~" + escape_md(f"R${item['referencia']:.2f}") + "~ " + escape_md(f"(-{item['desconto']:.0f}%)")
+    return linha + f"\n[{escape_md(nome)}]({link_produto(item['asin'])})"
+
+def montar_mensagens_resumo(grupo, itens, limite=TELEGRAM_LIMITE_CARACTERES):
+    """Itens ordenados por desconto e empacotados em mensagens MarkdownV2 de até `limite` caracteres."""
+    ordenados = sorted(itens, key=lambda item: item["desconto"], reverse=True)
+    titulo = escape_md(f"🧾 Resumo Quase Novo - {grupo}")
+    # Reserva para o cabeçalho mais longo ("(parte N)" ou "(N ofertas)").
+    reserva_cabecalho = len(f"*{titulo}* ") + len(escape_md(f"({len(ordenados)} ofertas)")) + 12
+    blocos, atual, tamanho_atual = [], [], 0
+    for posicao, item in enumerate(ordenados, 1):
+        linha = formatar_item_resumo(posicao, item)
+        if atual and reserva_cabecalho + tamanho_atual + 2 + len(linha) > limite:
+            blocos.append(atual)
+            atual, tamanho_atual = [], 0
+        tamanho_atual += len(linha) + (2 if atual else 0)
+        atual.append(linha)
+    if atual:
+        blocos.append(atual)
+    if len(blocos) == 1:
+        return [f"*{titulo}* " + escape_md(f"({len(ordenados)} ofertas)") + "\n\n" + "\n\n".join(blocos[0])]
+    return [f"*{titulo}* " + escape_md(f"(parte {indice}/{len(blocos)})") + "\n\n" + "\n\n".join(bloco) for indice, bloco in enumerate(blocos, 1)]
+
+
+class AgregadorResumo:
+    """
+    Acumula as ofertas por chat e grupo (a categoria, ou um grupo único no agrupamento por janela) e as entrega
+    ao despachante como mensagens de resumo a cada `janela_minutos` e no fim da execução.
+    """
+
+    def __init__(self, despachante, agrupamento=AGRUPAMENTO_RESUMO_USADOS, janela_minutos=JANELA_RESUMO_MINUTOS_USADOS):
+        self.despachante = despachante
+        self.agrupamento = agrupamento
+        self.janela_s = janela_minutos * 60
+        self.grupos = {}
+        self.ultima_descarga = time.monotonic()
+
+    def adicionar(self, chat_id, item):
+        grupo = item["categoria"] if self.agrupamento == "categoria" else "Todas as categorias"
+        self.grupos.setdefault((str(chat_id), grupo), []).append(item)
+
+    def descarregar_se_vencido(self):
+        if time.monotonic() - self.ultima_descarga >= self.janela_s:
+            self.descarregar()
+
+    def descarregar(self):
+        self.ultima_descarga = time.monotonic()
+        if not self.grupos:
+            return
+        total_itens = total_mensagens = 0
+        for (chat_id, grupo), itens in sorted(self.grupos.items()):
+            for mensagem in montar_mensagens_resumo(grupo, itens):
+                self.despachante.enfileirar(chat_id, mensagem, ParseMode.MARKDOWN_V2)
+                total_mensagens += 1
+            total_itens += len(itens)
+        self.grupos = {}
+        metricas_execucao_global.incrementar("itens_resumo", total_itens)
+        metricas_execucao_global.incrementar("mensagens_resumo", total_mensagens)
+        logger.info(f"Resumo de notificações: {total_itens} ofertas em {total_mensagens} mensagens.")
+
+def iniciar_prazo_execucao():
+    global prazo_execucao_global
+    if PRAZO_MINUTOS_USADOS > 0:
+        prazo_execucao_global = time.monotonic() + PRAZO_MINUTOS_USADOS * 60
+
+def segundos_ate_prazo():
+    """Segundos até o prazo final da execução (None sem prazo). Inclui a margem reservada ao encerramento."""
+    return None if prazo_execucao_global is None else prazo_execucao_global - time.monotonic()
+
+def limitar_ao_prazo(segundos, minimo=1.0):
+    """Reduz um timeout ou espera ao tempo que resta antes da margem de encerramento (sem prazo, não muda nada)."""
+    restante = segundos_ate_prazo()
+    if restante is None:
+        return segundos
+    return max(minimo, min(segundos, restante - MARGEM_ENCERRAMENTO_SEGUNDOS_USADOS))
+
+def solicitar_encerramento(motivo):
+    """Antecipa o prazo para agora: workers e fluxos param antes da próxima página e o encerramento normal grava tudo."""
+    global prazo_execucao_global
+    logger.warning(f"{motivo}: encerrando de forma ordenada (histórico, série e filas serão gravados).")
+    prazo_execucao_global = time.monotonic()
+
+def prazo_esgotado():
+    """True quando não há mais tempo para começar uma página: resta só a margem de encerramento."""
+    restante = segundos_ate_prazo()
+    return restante is not None and restante <= MARGEM_ENCERRAMENTO_SEGUNDOS_USADOS
+
 def apagar_historico_usados():
-    """Apaga o arquivo de histórico de produtos usados."""
-    history_path = os.path.join(HISTORY_DIR_BASE, HISTORY_FILENAME_USADOS_GERAL)
-    try:
-        if os.path.exists(history_path):
-            os.remove(history_path)
-            logger.info(f"Arquivo de histórico '{history_path}' apagado com sucesso.")
-        else:
-            logger.info(f"Arquivo de histórico '{history_path}' não encontrado. Nada a apagar.")
-    except Exception as e:
-        logger.error(f"Erro ao tentar apagar o arquivo de histórico '{history_path}': {e}", exc_info=True)
+    """Apaga os arquivos de histórico de produtos usados (JSON e SQLite)."""
+    db_path = os.path.join(HISTORY_DIR_BASE, HISTORY_DB_FILENAME_USADOS_GERAL)
+    history_paths = [os.path.join(HISTORY_DIR_BASE, HISTORY_FILENAME_USADOS_GERAL), db_path, f"{db_path}-wal", f"{db_path}-shm"]
+    for history_path in history_paths:
+        try:
+            if os.path.exists(history_path):
+                os.remove(history_path)
+                logger.info(f"Arquivo de histórico '{history_path}' apagado com sucesso.")
+            else:
+                logger.info(f"Arquivo de histórico '{history_path}' não encontrado. Nada a apagar.")
+        except Exception as e:
+            logger.error(f"Erro ao tentar apagar o arquivo de histórico '{history_path}': {e}", exc_info=True)
 
 async def extract_category_links(driver, page_url, logger_param):
     logger_param.info(f"Extraindo links de categoria de: {page_url}")
@@ -198,203 +1175,480 @@ async def extract_category_links(driver, page_url, logger_param):
     return category_links
 
 
-async def process_used_products_geral_async(driver, base_url, nome_fluxo, history, logger, max_paginas=MAX_PAGINAS_POR_FLUXO):
-    logger.info(f"--- Iniciando processamento para: {nome_fluxo} --- URL base: {base_url} ---")
-    total_produtos_usados_qualificados_nesta_execucao_fluxo = 0 
-    pagina_atual = 1
-    max_tentativas_pagina = 3
-    consecutive_empty_pages = 0
-    max_consecutive_empty_pages = 3
+class ControladorRitmo:
+    """
+    Controle AIMD do intervalo entre requisições de um proxy/driver: cada página carregada sem
+    problemas reduz o atraso em um passo fixo; CAPTCHA, página de erro, WebDriverException ou recusa no HTTP
+    multiplicam o atraso. As esperas usam jitter de ±25% em torno do atraso atual.
+    """
 
-    logger.info(f"Máximo de páginas para este fluxo '{nome_fluxo}': {max_paginas}")
+    def __init__(self, nome):
+        self.nome = nome
+        self.atraso = RITMO_ATRASO_INICIAL
+        self.bloqueios = 0
 
-    while pagina_atual <= max_paginas:
-        url_pagina = get_url_for_page_worker(base_url, pagina_atual, logger)
-        logger.info(f"[{nome_fluxo}] Carregando Página: {pagina_atual}/{max_paginas}, URL: {url_pagina}")
+    @property
+    def paginas_por_minuto(self):
+        return 60 / self.atraso
 
-        page_processed_successfully = False
-        for tentativa in range(1, max_tentativas_pagina + 1):
-            logger.info(f"[{nome_fluxo}] Tentativa {tentativa}/{max_tentativas_pagina} de carregar e processar URL: {url_pagina}")
-            try:
-                await asyncio.to_thread(driver.get, url_pagina)
-                await asyncio.sleep(random.uniform(3, 6))
-                await asyncio.to_thread(wait_for_page_load, driver, logger)
-                await simulate_scroll(driver, logger)
+    def sucesso(self):
+        self.atraso = max(RITMO_ATRASO_MIN, self.atraso - RITMO_PASSO_ADITIVO)
 
-                try:
-                    timestamp_page_dump = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    page_dump_filename = f"page_dump_p{pagina_atual}_fluxo_{nome_fluxo.replace(' ', '_').replace('/', '-')}_{timestamp_page_dump}.html"
-                    page_dump_path = os.path.join(DEBUG_LOGS_DIR_BASE, page_dump_filename)
-                    with open(page_dump_path, "w", encoding="utf-8") as f_html_dump:
-                        f_html_dump.write(driver.page_source)
-                    logger.info(f"HTML da página {pagina_atual} salvo em: {page_dump_path}")
-                except Exception as e_save_dump:
-                    logger.error(f"Erro ao salvar o HTML da página {pagina_atual}: {e_save_dump}")
-
-                if check_captcha_sync_worker(driver, logger):
-                    logger.error(f"[{nome_fluxo}] CAPTCHA detectado na página {pagina_atual}. Interrompendo fluxo para {nome_fluxo}.")
-                    return total_produtos_usados_qualificados_nesta_execucao_fluxo
-
-                if check_amazon_error_page_sync_worker(driver, logger):
-                    logger.error(f"[{nome_fluxo}] Página de erro da Amazon detectada na página {pagina_atual}.")
-                    if tentativa < max_tentativas_pagina:
-                        logger.info("Tentando novamente após delay...")
-                        await asyncio.sleep(random.uniform(10, 20))
-                        continue
-                    else:
-                        logger.error(f"[{nome_fluxo}] Falha ao carregar página de produtos após {max_tentativas_pagina} tentativas devido a página de erro. Interrompendo {nome_fluxo}.")
-                        return total_produtos_usados_qualificados_nesta_execucao_fluxo
-                
-                try:
-                    WebDriverWait(driver, 20).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, SELETOR_RESULTADOS_CONT))
-                    )
-                    logger.info(f"Contêiner de resultados '{SELETOR_RESULTADOS_CONT}' encontrado na página {pagina_atual}.")
-                except TimeoutException:
-                    logger.warning(f"Contêiner de resultados '{SELETOR_RESULTADOS_CONT}' não encontrado na página {pagina_atual} após timeout.")
-                    
-                items_selenium = driver.find_elements(By.CSS_SELECTOR, SELETOR_ITEM_PRODUTO_USADO)
-                logger.info(f"Página {pagina_atual}: Encontrados {len(items_selenium)} elementos com seletor Selenium '{SELETOR_ITEM_PRODUTO_USADO}'.")
+    def bloqueio(self, motivo, logger_param):
+        self.bloqueios += 1
+        self.atraso = min(RITMO_ATRASO_MAX, self.atraso * RITMO_FATOR_MULTIPLICATIVO)
+        logger_param.warning(f"Ritmo [{self.nome}]: {motivo}. Atraso aumentado para {self.atraso:.1f}s (~{self.paginas_por_minuto:.1f} páginas/min).")
 
-                if not items_selenium:
-                    logger.info(f"Página {pagina_atual} não contém produtos com o seletor principal para {nome_fluxo}. Verificando se é o fim.")
-                    next_button_disabled = False
-                    try:
-                        driver.find_element(By.CSS_SELECTOR, ".s-pagination-item.s-pagination-next.s-pagination-disabled")
-                        logger.info(f"Botão 'Próximo' está desabilitado para {nome_fluxo}. Fim da paginação.")
-                        next_button_disabled = True
-                    except NoSuchElementException:
-                        logger.debug("Botão 'Próximo' não está desabilitado ou não foi encontrado.")
-                    
-                    if next_button_disabled:
-                        return total_produtos_usados_qualificados_nesta_execucao_fluxo
-                    
-                    consecutive_empty_pages += 1
-                    if consecutive_empty_pages >= max_consecutive_empty_pages:
-                        logger.warning(f"{max_consecutive_empty_pages} páginas vazias consecutivas em {nome_fluxo}. Considerando fim da busca.")
-                        return total_produtos_usados_qualificados_nesta_execucao_fluxo
-                    logger.info(f"Página {pagina_atual} vazia em {nome_fluxo}, mas não é o fim. Tentativa {consecutive_empty_pages}/{max_consecutive_empty_pages}.")
-                    page_processed_successfully = True 
-                    break 
+    async def esperar(self, fator=1.0, fluxo=None):
+        with metricas_execucao_global.cronometrar("espera_ritmo", fluxo):
+            await asyncio.sleep(limitar_ao_prazo(self.atraso * fator * random.uniform(0.75, 1.25), minimo=0))
 
-                consecutive_empty_pages = 0 
-                produtos_processados_e_notificados_na_pagina = 0
+def obter_controlador_ritmo(driver, worker_id=0):
+    """Controlador compartilhado por proxy; sem proxy, um por worker."""
+    chave = getattr(driver, "usados_proxy_url", None) or f"sem-proxy-W{worker_id}"
+    if chave not in controladores_ritmo_global:
+        controladores_ritmo_global[chave] = ControladorRitmo(mascarar_proxy(chave))
+    return controladores_ritmo_global[chave]
 
-                for idx, item_element_selenium in enumerate(items_selenium, 1):
-                    item_logger = logging.getLogger(f"{logger.name}.Item_{pagina_atual}_{idx}")
-                    item_logger.debug(f"Processando bloco de item {idx} da página {pagina_atual}")
-                    
-                    nome, link, asin, price = None, None, None, None
-                    preco_historico_val_para_msg = None 
-                    notificar_este_produto = False
 
-                    try:
-                        try:
-                            indicador_usado_el = item_element_selenium.find_element(By.XPATH, SELETOR_INDICADOR_USADO_XPATH)
-                            item_logger.debug(f"Indicador de 'usado' encontrado via XPath: '{indicador_usado_el.text.strip() if indicador_usado_el.text else 'Indicador presente (sem texto direto no elemento XPath)'}'")
-                        except NoSuchElementException:
-                            data_asin_sel = item_element_selenium.get_attribute('data-asin')
-                            item_logger.debug(f"Item (ASIN Sel: {data_asin_sel if data_asin_sel else 'N/A'}) NÃO é uma listagem direta de 'usado' ou não tem oferta de usado clara (XPath '{SELETOR_INDICADOR_USADO_XPATH}' não encontrado). Ignorando este item.")
-                            continue
+def fingerprint_categorias(category_links):
+    conteudo = "\n".join(f"{cat['name']}\t{cat['url']}" for cat in sorted(category_links, key=lambda cat: cat['name']))
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
 
-                        item_html = item_element_selenium.get_attribute('outerHTML')
-                        item_soup = BeautifulSoup(item_html, 'html.parser')
-                        
-                        title_div = item_soup.find('div', {'data-cy': 'title-recipe'})
-                        if title_div:
-                            h2 = title_div.find('h2')
-                            span_nome_tag = h2.find('span') if h2 else None
-                            nome = span_nome_tag.get_text(strip=True) if span_nome_tag else None
-                        else:
-                            nome = None 
+def carregar_cache_categorias(cache_path):
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if not cache.get("categorias"):
+            return None
+        # Validado aqui: um 'extraido_em' ausente ou inválido descarta o cache e força nova extração.
+        datetime.fromisoformat(cache["extraido_em"])
+        return cache
+    except Exception as e:
+        logger.error(f"Erro ao ler cache de categorias '{cache_path}': {e}. Categorias serão extraídas novamente.")
+        return None
 
-                        if not nome:
-                            item_logger.debug("Nome do produto vazio (BS). Ignorando.")
-                            continue
-                        item_logger.debug(f"Nome (BS): '{nome}'")
+async def obter_categorias_usados(driver, logger_param):
+    """
+    Devolve as categorias do cache em disco enquanto estiver dentro do TTL; depois disso extrai de novo.
+    Se a extração falhar, usa a última lista boa do cache (mesmo vencida) em vez de cair para o fluxo Geral.
+    """
+    cache_path = os.path.join(HISTORY_DIR_BASE, CATEGORIAS_CACHE_FILENAME_USADOS)
+    cache = carregar_cache_categorias(cache_path)
+    if cache:
+        idade_horas = (datetime.now() - datetime.fromisoformat(cache["extraido_em"])).total_seconds() / 3600
+        if idade_horas < TTL_CATEGORIAS_HORAS_USADOS:
+            logger_param.info(f"Usando {len(cache['categorias'])} categorias do cache (idade {idade_horas:.1f}h, TTL {TTL_CATEGORIAS_HORAS_USADOS}h).")
+            return cache["categorias"]
+        logger_param.info(f"Cache de categorias vencido (idade {idade_horas:.1f}h). Extraindo novamente.")
 
-                        link_tag = item_soup.find('a', href=re.compile(r'/dp/'))
-                        if link_tag and link_tag.has_attr('href'):
-                            href_val = link_tag['href']
-                            link = f"https://www.amazon.com.br{href_val}" if href_val.startswith("/") else href_val
-                            item_logger.debug(f"Link (BS): '{link}'")
-                        else:
-                            item_logger.warning("Link principal do produto não encontrado. Ignorando item.")
-                            continue
+    logger_param.info(f"Tentando extrair categorias da URL base: {URL_GERAL_USADOS_BASE}")
+    category_links = await extract_category_links(driver, URL_GERAL_USADOS_BASE, logger_param)
+    if not category_links:
+        if cache:
+            logger_param.warning(f"Extração de categorias falhou. Usando a última lista boa do cache ({len(cache['categorias'])} categorias, extraída em {cache['extraido_em']}).")
+            return cache["categorias"]
+        return category_links
 
-                        asin_match = re.search(r'/dp/([A-Z0-9]{10})', link)
-                        if asin_match:
-                            asin = asin_match.group(1)
-                            item_logger.debug(f"ASIN (BS): '{asin}'")
-                        else:
-                            data_asin_value = item_element_selenium.get_attribute('data-asin')
-                            if data_asin_value and len(data_asin_value) == 10:
-                                asin = data_asin_value
-                                item_logger.debug(f"ASIN (BS, fallback de data-asin): '{asin}'")
-                            else:
-                                item_logger.warning(f"ASIN não encontrado no link '{link}' nem via data-asin. Ignorando item.")
-                                continue
-                        
-                        price_text_bs = None
-                        secondary_offer_div = item_soup.find('div', {'data-cy': 'secondary-offer-recipe'})
-                        if secondary_offer_div:
-                            span_price_in_secondary = secondary_offer_div.find('span', class_='a-color-base')
-                            if span_price_in_secondary:
-                                price_text_bs = span_price_in_secondary.get_text(strip=True)
-                                item_logger.debug(f"Preço (BS, via 'secondary-offer-recipe'): '{price_text_bs}'")
-                        
-                        if not price_text_bs:
-                            price_instructions_div_bs = item_soup.find('div', class_='s-price-instructions-style')
-                            if price_instructions_div_bs:
-                                price_link_tag_bs = price_instructions_div_bs.find('a', href=re.compile(r'/gp/offer-listing/'))
-                                if price_link_tag_bs:
-                                    price_span_offscreen_bs = price_link_tag_bs.find('span', class_='a-offscreen')
-                                    if price_span_offscreen_bs:
-                                        price_text_bs = price_span_offscreen_bs.get_text(strip=True)
-                                        item_logger.debug(f"Preço (BS, via 's-price-instructions-style' > 'a-offscreen'): '{price_text_bs}'")
-                        
-                        if not price_text_bs:
-                            item_logger.debug("Preço não encontrado em estruturas específicas. Usando iteração genérica de spans.")
-                            for span_tag in item_soup.find_all('span'):
-                                text = span_tag.get_text(strip=True)
-                                if text.startswith('R$'):
-                                    price_text_bs = text
-                                    item_logger.debug(f"Preço (BS, via iteração de span): '{price_text_bs}'")
-                                    break 
-
-                        if price_text_bs:
-                            match = re.search(r'R\$\s?([\d.,]+)', price_text_bs)
-                            if match:
-                                cleaned_price_str = match.group(1).replace('.', '').replace(',', '.')
-                                try:
-                                    price = float(cleaned_price_str)
-                                    item_logger.debug(f"Preço final (BS): {price}")
-                                except ValueError:
-                                    item_logger.warning(f"Erro ao converter preço '{cleaned_price_str}' para float.")
-                                    continue
-                            else:
-                                item_logger.warning(f"Formato de preço inesperado: '{price_text_bs}'. Ignorando item.")
-                                continue
-                        else:
-                            item_logger.warning(f"Preço não encontrado para ASIN {asin}. Ignorando item.")
+    fingerprint = fingerprint_categorias(category_links)
+    if cache and cache.get("fingerprint") != fingerprint:
+        logger_param.info(f"Lista de categorias mudou desde o último cache ({len(cache['categorias'])} -> {len(category_links)} categorias).")
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"extraido_em": datetime.now().isoformat(), "fingerprint": fingerprint, "categorias": category_links}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        logger_param.error(f"Erro ao salvar cache de categorias em '{cache_path}': {e}", exc_info=True)
+    return category_links
+
+
+FRASES_INDICADOR_USADO = ("oferta de produto usado", "ofertas de produtos usados", "usado como novo")
+SELETOR_PAGINACAO_PROXIMA_DESABILITADA = ".s-pagination-item.s-pagination-next.s-pagination-disabled"
+SELETOR_PAGINACAO_ITENS = ".s-pagination-item"
+SELETOR_INFO_RESULTADOS = "[data-component-type='s-result-info-bar']"
+REGEX_INFO_RESULTADOS = re.compile(r'(\d[\d.]*)\s*-\s*(\d[\d.]*)\s+de\s+(mais de\s+)?(\d[\d.]*)\s+resultado', re.IGNORECASE)
+REGEX_INFO_RESULTADOS_PAGINA_UNICA = re.compile(r'^\s*(\d[\d.]*)\s+resultados?\b', re.IGNORECASE)
+
+def parse_preco_brl(price_text):
+    """Converte um texto como 'R$ 1.234,56' em float. Retorna None se não houver preço."""
+    if not price_text:
+        return None
+    match = re.search(r'R\$\s?([\d.,]+)', price_text)
+    if not match:
+        return None
+    try:
+        return float(match.group(1).replace('.', '').replace(',', '.'))
+    except ValueError:
+        return None
+
+def _find_used_indicator_bs(item_soup):
+    # Equivalente em BeautifulSoup do SELETOR_INDICADOR_USADO_XPATH (texto do span inclui descendentes).
+    for span_tag in item_soup.find_all('span'):
+        span_text = span_tag.get_text().lower()
+        if any(frase in span_text for frase in FRASES_INDICADOR_USADO):
+            return span_tag.get_text(strip=True)
+
+    secondary_offer_div = item_soup.find('div', {'data-cy': 'secondary-offer-recipe'})
+    if secondary_offer_div:
+        for span_tag in secondary_offer_div.find_all('span'):
+            span_text = span_tag.get_text().lower()
+            if 'usado' in span_text or 'usada' in span_text:
+                return span_tag.get_text(strip=True)
+
+    for price_instructions_div in item_soup.find_all('div', class_='s-price-instructions-style'):
+        parent_span = price_instructions_div.find_parent('span')
+        if not parent_span or item_soup not in parent_span.parents:
+            continue
+        for link_tag in price_instructions_div.find_all('a'):
+            for span_tag in link_tag.find_all('span'):
+                if 'usado' in span_tag.get_text().lower():
+                    return span_tag.get_text(strip=True)
+    return None
+
+def _extract_item_fields_bs(item_soup, item_logger):
+    title_div = item_soup.find('div', {'data-cy': 'title-recipe'})
+    nome = None
+    if title_div:
+        h2 = title_div.find('h2')
+        span_nome_tag = h2.find('span') if h2 else None
+        nome = span_nome_tag.get_text(strip=True) if span_nome_tag else None
+    if not nome:
+        item_logger.debug("Nome do produto vazio (BS). Ignorando.")
+        return None
+
+    link_tag = item_soup.find('a', href=re.compile(r'/dp/'))
+    if not (link_tag and link_tag.has_attr('href')):
+        item_logger.warning(f"Link principal do produto '{nome[:60]}' não encontrado. Ignorando item.")
+        return None
+    href_val = link_tag['href']
+    link = f"https://www.amazon.com.br{href_val}" if href_val.startswith("/") else href_val
+
+    asin_match = re.search(r'/dp/([A-Z0-9]{10})', link)
+    if asin_match:
+        asin = asin_match.group(1)
+    else:
+        data_asin_value = item_soup.get('data-asin')
+        if data_asin_value and len(data_asin_value) == 10:
+            asin = data_asin_value
+            item_logger.debug(f"ASIN (BS, fallback de data-asin): '{asin}'")
+        else:
+            item_logger.warning(f"ASIN não encontrado no link '{link}' nem via data-asin. Ignorando item.")
+            return None
+
+    price_text_bs = None
+    secondary_offer_div = item_soup.find('div', {'data-cy': 'secondary-offer-recipe'})
+    if secondary_offer_div:
+        span_price_in_secondary = secondary_offer_div.find('span', class_='a-color-base')
+        if span_price_in_secondary:
+            price_text_bs = span_price_in_secondary.get_text(strip=True)
+
+    if not price_text_bs:
+        price_instructions_div_bs = item_soup.find('div', class_='s-price-instructions-style')
+        if price_instructions_div_bs:
+            price_link_tag_bs = price_instructions_div_bs.find('a', href=re.compile(r'/gp/offer-listing/'))
+            if price_link_tag_bs:
+                price_span_offscreen_bs = price_link_tag_bs.find('span', class_='a-offscreen')
+                if price_span_offscreen_bs:
+                    price_text_bs = price_span_offscreen_bs.get_text(strip=True)
+
+    if not price_text_bs:
+        for span_tag in item_soup.find_all('span'):
+            text = span_tag.get_text(strip=True)
+            if text.startswith('R$'):
+                price_text_bs = text
+                break
+
+    if not price_text_bs:
+        item_logger.warning(f"Preço não encontrado para ASIN {asin}. Ignorando item.")
+        return None
+    price = parse_preco_brl(price_text_bs)
+    if price is None:
+        item_logger.warning(f"Formato de preço inesperado: '{price_text_bs}' (ASIN {asin}). Ignorando item.")
+        return None
+
+    return {"nome": nome, "link": link, "asin": asin, "preco": price}
+
+def _extract_paginacao_bs(soup):
+    """
+    Total de páginas (maior número no widget de paginação) e total de resultados do cabeçalho
+    ("1-48 de mais de 10.000 resultados para ..."). 'resultados_sao_minimo' indica o "mais de".
+    """
+    numeros_paginas = [int(item.get_text(strip=True)) for item in soup.select(SELETOR_PAGINACAO_ITENS) if item.get_text(strip=True).isdigit()]
+    paginacao = {
+        "total_paginas": max(numeros_paginas) if numeros_paginas else None,
+        "total_resultados": None, "resultados_por_pagina": None, "resultados_sao_minimo": False,
+    }
+    info_bar = soup.select_one(SELETOR_INFO_RESULTADOS)
+    texto_info = info_bar.get_text(" ", strip=True) if info_bar else ""
+    match = REGEX_INFO_RESULTADOS.search(texto_info)
+    if match:
+        primeiro, ultimo = int(match.group(1).replace('.', '')), int(match.group(2).replace('.', ''))
+        paginacao["resultados_por_pagina"] = ultimo - primeiro + 1 if ultimo >= primeiro else None
+        paginacao["total_resultados"] = int(match.group(4).replace('.', ''))
+        paginacao["resultados_sao_minimo"] = bool(match.group(3))
+    else:
+        match = REGEX_INFO_RESULTADOS_PAGINA_UNICA.search(texto_info)
+        if match:
+            paginacao["total_resultados"] = int(match.group(1).replace('.', ''))
+            paginacao["total_paginas"] = paginacao["total_paginas"] or 1
+    return paginacao
+
+def planejar_orcamento_paginas(paginacao, pagina_atual, max_paginas):
+    """Última página que vale a pena pedir: nunca além do fim real da paginação nem de `max_paginas`."""
+    limites = [max_paginas]
+    if paginacao["total_paginas"]:
+        limites.append(paginacao["total_paginas"])
+    if paginacao["total_resultados"] is not None and paginacao["resultados_por_pagina"] and not paginacao["resultados_sao_minimo"]:
+        limites.append(-(-paginacao["total_resultados"] // paginacao["resultados_por_pagina"]))
+    return max(pagina_atual, min(limites))
+
+def interpretar_html(page_source):
+    """Snapshot parseado da página; aceita um BeautifulSoup já pronto para que cada página seja parseada uma única vez."""
+    return page_source if isinstance(page_source, BeautifulSoup) else BeautifulSoup(page_source, 'html.parser')
+
+def extract_used_items_from_html(page_source, logger_param=None):
+    """
+    Extrai, a partir de um único snapshot HTML da página de busca (str ou BeautifulSoup), todos os itens com oferta de usado.
+    Não depende do WebDriver, então também pode ser usada nos arquivos page_dump_*.html salvos.
+    Retorna um dict com 'total_blocos', 'asins' (data-asin de todos os blocos, com ou sem usado),
+    'itens' (nome, link, asin, preco, indicador_usado), 'proxima_desabilitada' e 'paginacao' (ver _extract_paginacao_bs).
+    """
+    logger_param = logger_param or logger
+    soup = interpretar_html(page_source)
+    blocos = soup.select(SELETOR_ITEM_PRODUTO_USADO)
+    itens = []
+    for idx, item_soup in enumerate(blocos, 1):
+        indicador_usado = _find_used_indicator_bs(item_soup)
+        if indicador_usado is None:
+            logger_param.debug(f"Item {idx} (ASIN: {item_soup.get('data-asin') or 'N/A'}) sem indicador de 'usado'. Ignorando.")
+            continue
+        campos = _extract_item_fields_bs(item_soup, logger_param)
+        if not campos:
+            continue
+        campos["indicador_usado"] = indicador_usado
+        itens.append(campos)
+    return {
+        "total_blocos": len(blocos),
+        "asins": [item_soup.get('data-asin') for item_soup in blocos if item_soup.get('data-asin')],
+        "itens": itens,
+        "proxima_desabilitada": soup.select_one(SELETOR_PAGINACAO_PROXIMA_DESABILITADA) is not None,
+        "paginacao": _extract_paginacao_bs(soup),
+    }
+
+
+async def process_used_products_geral_async(driver, base_url, nome_fluxo, history, logger, max_paginas=MAX_PAGINAS_POR_FLUXO, sessao_http=None, asins_vistos=None, serie_precos=None, ritmo=None,
+                                             pagina_inicial=1, ao_concluir_pagina=None):
+    logger.info(f"--- Iniciando processamento para: {nome_fluxo} --- URL base: {base_url} ---")
+    ritmo = ritmo or obter_controlador_ritmo(driver)
+    # 'concluido' só é True quando o fluxo chegou ao fim (paginação, limite ou baixo rendimento), nunca após abortar.
+    estatisticas_fluxo = {"qualificados": 0, "paginas": 0, "captcha": False, "proxy_quarentena": False, "prazo_esgotado": False, "concluido": False,
+                          "asins_novos": 0, "asins_repetidos": 0}
+    if pagina_inicial > max_paginas:
+        # O orçamento de páginas do fluxo encolheu desde a execução anterior: recomeça em vez de pular o fluxo inteiro.
+        logger.info(f"[{nome_fluxo}] Página do cursor ({pagina_inicial}) além do limite atual de {max_paginas} páginas. Recomeçando da página 1.")
+        pagina_inicial = 1
+    pagina_atual = pagina_inicial
+    if pagina_inicial > 1:
+        logger.info(f"[{nome_fluxo}] Retomando a partir da página {pagina_inicial} (cursor da execução anterior).")
+    max_tentativas_pagina = 3
+    consecutive_empty_pages = 0
+    max_consecutive_empty_pages = 3
+    paginas_sem_asin_novo = 0
+    fim_por_baixo_rendimento = False
+
+    logger.info(f"Máximo de páginas para este fluxo '{nome_fluxo}': {max_paginas}")
+    # Reduzido pela paginação lida na primeira página carregada; nunca passa de max_paginas.
+    limite_paginas = max_paginas
+    # Desligado para o resto do fluxo depois de um CAPTCHA no HTTP.
+    usar_http = sessao_http is not None
+
+    while pagina_atual <= limite_paginas:
+        if prazo_esgotado():
+            logger.warning(f"[{nome_fluxo}] Prazo da execução esgotado. Fluxo interrompido antes da página {pagina_atual} (retomado na próxima execução).")
+            estatisticas_fluxo["prazo_esgotado"] = True
+            return estatisticas_fluxo
+        url_pagina = get_url_for_page_worker(base_url, pagina_atual, logger)
+        inicio_pagina = time.perf_counter()
+        logger.info(f"[{nome_fluxo}] Carregando Página: {pagina_atual}/{limite_paginas}, URL: {url_pagina}")
+
+        page_processed_successfully = False
+        for tentativa in range(1, max_tentativas_pagina + 1):
+            if tentativa > 1 and prazo_esgotado():
+                logger.warning(f"[{nome_fluxo}] Prazo da execução esgotado. Página {pagina_atual} abandonada antes da tentativa {tentativa} (retomada na próxima execução).")
+                estatisticas_fluxo["prazo_esgotado"] = True
+                return estatisticas_fluxo
+            if tentativa > 1 and proxy_do_driver_em_quarentena(driver):
+                logger.warning(f"[{nome_fluxo}] Proxy deste driver entrou em quarentena. Interrompendo o fluxo na página {pagina_atual} para trocar de proxy.")
+                estatisticas_fluxo["proxy_quarentena"] = True
+                return estatisticas_fluxo
+            logger.info(f"[{nome_fluxo}] Tentativa {tentativa}/{max_tentativas_pagina} de carregar e processar URL: {url_pagina}")
+            if tentativa > 1:
+                metricas_execucao_global.incrementar("retentativas", fluxo=nome_fluxo)
+            try:
+                page_source = None
+                soup_pagina = None
+                if usar_http:
+                    with metricas_execucao_global.cronometrar("fetch_http", nome_fluxo):
+                        resposta_http = await asyncio.to_thread(fetch_page_http, sessao_http, url_pagina, logger, (10, limitar_ao_prazo(30)))
+                    if "page_source" in resposta_http:
+                        page_source, soup_pagina = resposta_http["page_source"], resposta_http["soup"]
+                    else:
+                        # O HTTP sai pelo mesmo proxy do driver: a recusa da Amazon vale para o ritmo e para o pool.
+                        ritmo.bloqueio(resposta_http["motivo"], logger)
+                        registrar_evento_proxy(driver, "captcha" if resposta_http["classe"] == "captcha" else "falha", logger)
+                        if resposta_http["classe"] == "captcha":
+                            metricas_execucao_global.incrementar("captchas_http", fluxo=nome_fluxo)
+                            usar_http = False
+                            logger.warning(f"[{nome_fluxo}] CAPTCHA no HTTP. Restante do fluxo segue só pelo Selenium.")
+                        logger.info(f"[{nome_fluxo}] Página {pagina_atual} não utilizável via HTTP ({resposta_http['motivo']}). Usando fallback Selenium após o atraso.")
+                        await ritmo.esperar(fluxo=nome_fluxo)
+                        if prazo_esgotado():
+                            logger.warning(f"[{nome_fluxo}] Prazo da execução esgotado antes do fallback Selenium da página {pagina_atual} (retomada na próxima execução).")
+                            estatisticas_fluxo["prazo_esgotado"] = True
+                            return estatisticas_fluxo
+
+                if page_source is None:
+                    # Com prazo, carregamento e prontidão não passam da margem de encerramento.
+                    if segundos_ate_prazo() is not None:
+                        await asyncio.to_thread(driver.set_page_load_timeout, limitar_ao_prazo(TIMEOUT_CARREGAMENTO_PAGINA_USADOS))
+                    with metricas_execucao_global.cronometrar("driver_get", nome_fluxo):
+                        await asyncio.to_thread(driver.get, url_pagina)
+                    with metricas_execucao_global.cronometrar("prontidao_resultados", nome_fluxo):
+                        estado_pagina = await asyncio.to_thread(aguardar_resultados_prontos, driver, logger, limitar_ao_prazo(TIMEOUT_PRONTIDAO_USADOS))
+                    if estado_pagina is None:
+                        with metricas_execucao_global.cronometrar("classificacao_pagina", nome_fluxo):
+                            estado_pagina = await asyncio.to_thread(classificar_pagina_driver, driver, logger)
+                    classe_pagina = estado_pagina["classe"] if estado_pagina else "desconhecida"
+
+                    if classe_pagina == "captcha":
+                        metricas_execucao_global.incrementar("captchas", fluxo=nome_fluxo)
+                        await asyncio.to_thread(gravador_dumps_global.gravar_anomalia, "captcha_usados_geral", driver, logger)
+                        logger.error(f"[{nome_fluxo}] CAPTCHA detectado na página {pagina_atual}. Interrompendo fluxo para {nome_fluxo}.")
+                        ritmo.bloqueio("CAPTCHA", logger)
+                        registrar_evento_proxy(driver, "captcha", logger)
+                        estatisticas_fluxo["captcha"] = True
+                        return estatisticas_fluxo
+
+                    if classe_pagina == "erro":
+                        metricas_execucao_global.incrementar("paginas_erro", fluxo=nome_fluxo)
+                        await asyncio.to_thread(gravador_dumps_global.gravar_anomalia, "amazon_error_page", driver, logger)
+                        logger.error(f"[{nome_fluxo}] Página de erro da Amazon detectada na página {pagina_atual} (título: '{estado_pagina['titulo']}').")
+                        ritmo.bloqueio("página de erro da Amazon", logger)
+                        registrar_evento_proxy(driver, "falha", logger)
+                        if tentativa < max_tentativas_pagina:
+                            logger.info("Tentando novamente após delay...")
+                            await ritmo.esperar(fluxo=nome_fluxo)
                             continue
+                        else:
+                            logger.error(f"[{nome_fluxo}] Falha ao carregar página de produtos após {max_tentativas_pagina} tentativas devido a página de erro. Interrompendo {nome_fluxo}.")
+                            return estatisticas_fluxo
+                    if classe_pagina == "desconhecida":
+                        logger.warning(f"Página {pagina_atual} não reconhecida (sem blocos '{SELETOR_ITEM_PRODUTO_USADO}' nem contêiner de resultados). Seguindo para o parse.")
+                
+                    with metricas_execucao_global.cronometrar("page_source", nome_fluxo):
+                        page_source = await asyncio.to_thread(getattr, driver, "page_source")
+                    medida_bytes = await asyncio.to_thread(medir_bytes_pagina, driver, logger)
+                    if medida_bytes:
+                        bytes_pagina = medida_bytes["documento"] + medida_bytes["recursos"]
+                        metricas_execucao_global.incrementar("bytes_transferidos", bytes_pagina, nome_fluxo)
+                        logger.info(f"Página {pagina_atual}: {bytes_pagina / 1024:.0f} KB transferidos ({medida_bytes['n_recursos']} recursos).")
+                    if sessao_http is not None:
+                        sincronizar_cookies_sessao_http(sessao_http, driver, logger)
 
-                        if not all([nome, asin, link, price is not None]):
-                            item_logger.warning(f"Dados incompletos para ASIN {asin if asin else 'desconhecido'} após extração BS. Ignorando.")
+                registrar_primeira_pagina_busca(driver, logger)
+                gravador_dumps_global.gravar_html(f"page_dump_p{pagina_atual}_fluxo_{nome_fluxo.replace(' ', '_').replace('/', '-')}", page_source)
+
+                with metricas_execucao_global.cronometrar("parse", nome_fluxo):
+                    resultado_parse = await asyncio.to_thread(extract_used_items_from_html, soup_pagina or page_source, logger)
+                itens_usados = resultado_parse["itens"]
+                metricas_execucao_global.incrementar("itens", resultado_parse["total_blocos"], nome_fluxo)
+                metricas_execucao_global.incrementar("itens_usados", len(itens_usados), nome_fluxo)
+
+                novo_limite = planejar_orcamento_paginas(resultado_parse["paginacao"], pagina_atual, limite_paginas)
+                if resultado_parse["total_blocos"] and resultado_parse["proxima_desabilitada"]:
+                    novo_limite = pagina_atual
+                if novo_limite < limite_paginas:
+                    paginacao = resultado_parse["paginacao"]
+                    logger.info(
+                        f"[{nome_fluxo}] Paginação: {paginacao['total_paginas'] or '?'} páginas, "
+                        f"{'mais de ' if paginacao['resultados_sao_minimo'] else ''}{paginacao['total_resultados'] if paginacao['total_resultados'] is not None else '?'} resultados. "
+                        f"Limite do fluxo reduzido de {limite_paginas} para {novo_limite} páginas."
+                    )
+                    metricas_execucao_global.incrementar("paginas_poupadas_paginacao", limite_paginas - novo_limite, nome_fluxo)
+                    limite_paginas = novo_limite
+                logger.info(
+                    f"Página {pagina_atual}: {resultado_parse['total_blocos']} blocos '{SELETOR_ITEM_PRODUTO_USADO}' no snapshot, "
+                    f"{len(itens_usados)} com oferta de usado e dados completos."
+                )
+
+                if not resultado_parse["total_blocos"]:
+                    logger.info(f"Página {pagina_atual} não contém produtos com o seletor principal para {nome_fluxo}. Verificando se é o fim.")
+                    if resultado_parse["proxima_desabilitada"]:
+                        logger.info(f"Botão 'Próximo' está desabilitado para {nome_fluxo}. Fim da paginação.")
+                        estatisticas_fluxo["concluido"] = True
+                        return estatisticas_fluxo
+                    
+                    consecutive_empty_pages += 1
+                    if consecutive_empty_pages >= max_consecutive_empty_pages:
+                        logger.warning(f"{max_consecutive_empty_pages} páginas vazias consecutivas em {nome_fluxo}. Considerando fim da busca.")
+                        estatisticas_fluxo["concluido"] = True
+                        return estatisticas_fluxo
+                    logger.info(f"Página {pagina_atual} vazia em {nome_fluxo}, mas não é o fim. Tentativa {consecutive_empty_pages}/{max_consecutive_empty_pages}.")
+                    page_processed_successfully = True 
+                    break 
+
+                consecutive_empty_pages = 0 
+                produtos_processados_e_notificados_na_pagina = 0
+                candidatos_notificacao = []
+
+                # Índice de ASINs vistos na execução, compartilhado entre fluxos: as 6 ordenações de uma
+                # categoria repetem quase os mesmos produtos, então cada ASIN só é avaliado uma vez.
+                # True = já avaliado como oferta de usado; False = visto só num bloco sem usado.
+                if asins_vistos is not None:
+                    asins_ineditos_pagina = {asin for asin in resultado_parse["asins"] + [item["asin"] for item in itens_usados] if asin not in asins_vistos}
+                    itens_ineditos = []
+                    for item_usado in itens_usados:
+                        if asins_vistos.get(item_usado["asin"]):
+                            estatisticas_fluxo["asins_repetidos"] += 1
                             continue
-                        
+                        asins_vistos[item_usado["asin"]] = True
+                        itens_ineditos.append(item_usado)
+                    for asin in resultado_parse["asins"]:
+                        asins_vistos.setdefault(asin, False)
+                    if len(itens_ineditos) < len(itens_usados):
+                        logger.info(f"Página {pagina_atual}: {len(itens_usados) - len(itens_ineditos)} ASINs já vistos nesta execução foram ignorados.")
+                    itens_usados = itens_ineditos
+                estatisticas_fluxo["asins_novos"] += len(itens_usados)
+                inicio_avaliacao = time.perf_counter()
+
+                for idx, item_usado in enumerate(itens_usados, 1):
+                    item_logger = logging.getLogger(f"{logger.name}.Item_{pagina_atual}_{idx}")
+                    item_logger.debug(f"Processando item usado {idx} da página {pagina_atual}: {item_usado['indicador_usado'][:80]}")
+                    
+                    nome, link, asin, price = item_usado["nome"], item_usado["link"], item_usado["asin"], item_usado["preco"]
+                    preco_historico_val_para_msg = None 
+                    notificar_este_produto = False
+
+                    try:
+                        estatisticas_serie = None
+                        if serie_precos is not None:
+                            estatisticas_serie = serie_precos.estatisticas(asin, JANELA_DESCONTO_DIAS_USADOS)
+                            serie_precos.registrar(asin, price)
+
                         if USAR_HISTORICO:
-                            preco_historico_info = history.get(asin)
+                            preco_historico_info = history.obter(asin)
                             if preco_historico_info:
                                 preco_historico_val = preco_historico_info.get("preco_usado")
                                 if preco_historico_val and preco_historico_val <= price:
                                     item_logger.info(f"ASIN {asin}: Preço atual (R${price:.2f}) não é menor ou é igual ao histórico (R${preco_historico_val:.2f}). Sem nova notificação.")
-                                    produto_existente = history[asin]
+                                    produto_existente = preco_historico_info
                                     produto_existente["timestamp"] = datetime.now().isoformat()
                                     if price > preco_historico_val: 
                                         produto_existente["preco_usado"] = price
-                                    history[asin] = produto_existente
-                                    save_history_geral(history)
+                                    history.registrar(asin, produto_existente)
                                     continue 
                                 else: 
                                     item_logger.info(f"ASIN {asin}: Novo preço (R${price:.2f}) melhor que histórico (R${preco_historico_val if preco_historico_val else 'N/A'}). Notificando.")
@@ -408,186 +1662,740 @@ async def process_used_products_geral_async(driver, base_url, nome_fluxo, histor
                              notificar_este_produto = True
                              item_logger.info(f"ASIN {asin}: Processando sem verificação de histórico. Notificando.")
 
+                        if notificar_este_produto and estatisticas_serie and estatisticas_serie["n"] >= MIN_OBS_SERIE_DESCONTO_USADOS:
+                            desconto_mediana = (estatisticas_serie["mediana"] - price) / estatisticas_serie["mediana"] * 100
+                            if desconto_mediana < MIN_DESCONTO_USADOS:
+                                item_logger.info(
+                                    f"ASIN {asin}: Desconto de {desconto_mediana:.1f}% sobre a mediana de {JANELA_DESCONTO_DIAS_USADOS} dias "
+                                    f"(R${estatisticas_serie['mediana']:.2f}, {estatisticas_serie['n']} obs.) abaixo do mínimo de {MIN_DESCONTO_USADOS}%. Sem notificação."
+                                )
+                                notificar_este_produto = False
+                                if USAR_HISTORICO:
+                                    history.registrar(asin, {
+                                        "nome": nome, "asin": asin, "link": link,
+                                        "preco_usado": price, "timestamp": datetime.now().isoformat(),
+                                        "fluxo": nome_fluxo
+                                    })
+
 
                         if notificar_este_produto:
+                            # Gravado no histórico só depois do enriquecimento: um candidato descartado ali
+                            # não pode ficar registrado com o preço que nunca foi notificado.
                             produto_atual_para_historico = {
                                 "nome": nome, "asin": asin, "link": link,
                                 "preco_usado": price, "timestamp": datetime.now().isoformat(),
                                 "fluxo": nome_fluxo
                             }
-                            if USAR_HISTORICO:
-                                history[asin] = produto_atual_para_historico
-                                save_history_geral(history)
-                            
-                            total_produtos_usados_qualificados_nesta_execucao_fluxo += 1
-                            produtos_processados_e_notificados_na_pagina += 1
-                            item_logger.info(f"PRODUTO QUALIFICADO PARA NOTIFICAÇÃO: '{nome}' | Preço: R${price:.2f} | ASIN: {asin}")
-
-                            if bot_instance_global and TELEGRAM_CHAT_IDS_LIST:
-                                categoria_match = re.search(rf"{NOME_FLUXO_BASE} - (.*?) - (Menor Preço|Maior Preço|Destaque|Avaliação|Lançamento|Mais Vendido)", nome_fluxo)
-                                nome_categoria_para_msg = categoria_match.group(1) if categoria_match else "Geral"
-                                if "Geral (Fallback)" in nome_categoria_para_msg:
-                                    nome_categoria_para_msg = "Geral"
-                                
-                                nome_com_categoria_nao_escapado = f"{str(nome)} ({nome_categoria_para_msg})"
-                                nome_produto_com_categoria_escapado = escape_md(nome_com_categoria_nao_escapado)
-                                
-                                preco_atual_formatado = f"R${price:.2f}"
-                                
-                                mensagem_telegram = ""
-                                
-                                if preco_historico_val_para_msg and preco_historico_val_para_msg > price:
-                                    preco_antigo_formatado = f"R${preco_historico_val_para_msg:.2f}"
-                                    desconto_calculado_str = ""
-                                    if preco_historico_val_para_msg > 0:
-                                        percentual_desconto = ((preco_historico_val_para_msg - price) / preco_historico_val_para_msg) * 100
-                                        desconto_calculado_str = f"📉 Desconto: {percentual_desconto:.1f}%\n"
-
-                                    titulo_mensagem = escape_md("↘️ PREÇO BAIXOU! ↙️")
-                                    mensagem_telegram = (
-                                        f"*{titulo_mensagem}*\n\n"
-                                        f"🛒 {nome_produto_com_categoria_escapado}\n"
-                                        f"💰 De: {escape_md(preco_antigo_formatado)}\n"
-                                        f"💸 Por: *{escape_md(preco_atual_formatado)}*\n"
-                                        f"{desconto_calculado_str}\n" 
-                                        f"🔗 [Ver produto]({link})\n\n"
-                                        f"🏷️ ASIN: `{escape_md(str(asin))}`\n"
-                                        f"🕒 {escape_md(datetime.now().strftime('%d/%m/%Y %H:%M:%S'))}"
-                                    )
-                                else: 
-                                    titulo_mensagem = escape_md("🟡 NOVO NO QUASE NOVO! 🟡")
-                                    mensagem_telegram = (
-                                        f"*{titulo_mensagem}*\n\n"
-                                        f"🛒 {nome_produto_com_categoria_escapado}\n"
-                                        f"💰 Por: *{escape_md(preco_atual_formatado)}*\n\n"
-                                        f"🔗 [Ver produto]({link})\n\n"
-                                        f"🏷️ ASIN: `{escape_md(str(asin))}`\n"
-                                        f"🕒 {escape_md(datetime.now().strftime('%d/%m/%Y %H:%M:%S'))}"
-                                    )
-
-                                for chat_id in TELEGRAM_CHAT_IDS_LIST:
-                                    await send_telegram_message_async(
-                                        bot_instance_global, chat_id, mensagem_telegram, ParseMode.MARKDOWN_V2, item_logger
-                                    )
+                            item_logger.info(f"Candidato a notificação: '{nome}' | Preço: R${price:.2f} | ASIN: {asin}")
+                            candidatos_notificacao.append({
+                                "nome": nome, "link": link, "asin": asin, "preco": price,
+                                "preco_historico": preco_historico_val_para_msg, "estatisticas_serie": estatisticas_serie,
+                                "registro_historico": produto_atual_para_historico
+                            })
                     
-                    except StaleElementReferenceException:
-                        item_logger.warning("Elemento Selenium tornou-se obsoleto. Tentando buscar itens novamente na página.")
-                        break 
                     except Exception as e_item_proc:
-                        item_logger.error(f"Erro inesperado ao processar bloco de item {idx}: {e_item_proc}", exc_info=True)
+                        item_logger.error(f"Erro inesperado ao processar item usado {idx} (ASIN {asin}): {e_item_proc}", exc_info=True)
                         continue
 
+                metricas_execucao_global.registrar_fase("avaliacao_itens", time.perf_counter() - inicio_avaliacao, nome_fluxo)
+
+                if candidatos_notificacao and enriquecedor_ofertas_global is not None:
+                    with metricas_execucao_global.cronometrar("enriquecimento_ofertas", nome_fluxo):
+                        ofertas_por_asin = await enriquecedor_ofertas_global.enriquecer([c["asin"] for c in candidatos_notificacao], logger)
+                    candidatos_notificacao = [
+                        candidato for candidato in candidatos_notificacao
+                        if avaliar_ofertas_candidato(candidato, ofertas_por_asin.get(candidato["asin"]), logger, nome_fluxo)
+                    ]
+
+                for candidato in candidatos_notificacao:
+                    registro_historico = candidato.pop("registro_historico")
+                    if USAR_HISTORICO:
+                        history.registrar(candidato["asin"], registro_historico)
+                    estatisticas_fluxo["qualificados"] += 1
+                    metricas_execucao_global.incrementar("produtos_qualificados", fluxo=nome_fluxo)
+                    produtos_processados_e_notificados_na_pagina += 1
+                    logger.info(f"PRODUTO QUALIFICADO PARA NOTIFICAÇÃO: '{candidato['nome']}' | Preço: R${candidato['preco']:.2f} | ASIN: {candidato['asin']}")
+                    if bot_instance_global and TELEGRAM_CHAT_IDS_LIST:
+                        resumo = item_resumo(candidato, nome_fluxo)
+                        imediata = MODO_NOTIFICACAO_USADOS == "individual" or resumo["desconto"] >= LIMIAR_IMEDIATO_DESCONTO_USADOS
+                        if imediata or agregador_resumo_global is None:
+                            # Sem agregador (modo shard), a oferta vai para o delta com os dados do resumo, montado no merge.
+                            mensagem_telegram = montar_mensagem_telegram(candidato, nome_fluxo)
+                            for chat_id in TELEGRAM_CHAT_IDS_LIST:
+                                despachante_telegram_global.enfileirar(
+                                    chat_id, mensagem_telegram, ParseMode.MARKDOWN_V2, asin=candidato["asin"], preco=candidato["preco"],
+                                    **({} if imediata else {"resumo": resumo})
+                                )
+                            metricas_execucao_global.incrementar("notificacoes", len(TELEGRAM_CHAT_IDS_LIST), nome_fluxo)
+                        else:
+                            for chat_id in TELEGRAM_CHAT_IDS_LIST:
+                                agregador_resumo_global.adicionar(chat_id, resumo)
+                if agregador_resumo_global is not None:
+                    agregador_resumo_global.descarregar_se_vencido()
+                if USAR_HISTORICO:
+                    with metricas_execucao_global.cronometrar("save_history_geral", nome_fluxo):
+                        save_history_geral(history)
+                if serie_precos is not None:
+                    with metricas_execucao_global.cronometrar("commit_serie_precos", nome_fluxo):
+                        serie_precos.commit()
+
                 if produtos_processados_e_notificados_na_pagina > 0:
                     logger.info(f"Página {pagina_atual}: {produtos_processados_e_notificados_na_pagina} produtos qualificados e notificados para o fluxo {nome_fluxo}.")
                 else:
                     logger.info(f"Página {pagina_atual}: Nenhum produto novo ou com preço melhorado encontrado para notificação no fluxo {nome_fluxo} (após todas as verificações).")
+
+                if MAX_PAGINAS_SEM_ASIN_NOVO and asins_vistos is not None:
+                    # Qualquer ASIN inédito nos resultados conta, com ou sem oferta de usado.
+                    if asins_ineditos_pagina:
+                        paginas_sem_asin_novo = 0
+                    else:
+                        paginas_sem_asin_novo += 1
+                        fim_por_baixo_rendimento = paginas_sem_asin_novo >= MAX_PAGINAS_SEM_ASIN_NOVO
                 
+                driver.usados_erros_webdriver_consecutivos = 0
+                ritmo.sucesso()
+                registrar_evento_proxy(driver, "pagina", logger)
+                logger.info(f"Ritmo [{ritmo.nome}]: atraso {ritmo.atraso:.1f}s (~{ritmo.paginas_por_minuto:.1f} páginas/min).")
                 page_processed_successfully = True
                 break 
 
             except WebDriverException as e_wd:
                 logger.error(f"Erro de WebDriver ao carregar página {pagina_atual} (Tentativa {tentativa}) no fluxo {nome_fluxo}: {str(e_wd)[:200]}", exc_info=False)
+                # Contado no driver, e não no fluxo: o worker reinicia a sessão quando os erros se acumulam entre fluxos.
+                driver.usados_erros_webdriver_consecutivos = getattr(driver, "usados_erros_webdriver_consecutivos", 0) + 1
+                ritmo.bloqueio("WebDriverException", logger)
+                registrar_evento_proxy(driver, "falha", logger)
                 if tentativa < max_tentativas_pagina:
-                    await asyncio.sleep(random.uniform(15, 30))
+                    await ritmo.esperar(fluxo=nome_fluxo)
                     continue
                 else:
                     logger.error(f"Falha crítica após {max_tentativas_pagina} tentativas na página {pagina_atual} (WebDriverException) no fluxo {nome_fluxo}. Interrompendo este fluxo.")
-                    return total_produtos_usados_qualificados_nesta_execucao_fluxo
+                    return estatisticas_fluxo
             except Exception as e_page:
                 logger.error(f"Erro geral ao processar página {pagina_atual} (Tentativa {tentativa}) no fluxo {nome_fluxo}: {e_page}", exc_info=True)
                 if tentativa < max_tentativas_pagina:
-                    await asyncio.sleep(random.uniform(10, 20))
+                    await ritmo.esperar(fluxo=nome_fluxo)
                     continue
                 else:
                     logger.error(f"Falha crítica após {max_tentativas_pagina} tentativas na página {pagina_atual} (Erro Geral) no fluxo {nome_fluxo}. Interrompendo este fluxo.")
-                    return total_produtos_usados_qualificados_nesta_execucao_fluxo
+                    return estatisticas_fluxo
         
         if not page_processed_successfully:
             logger.error(f"Não foi possível processar a página {pagina_atual} do fluxo {nome_fluxo} após {max_tentativas_pagina} tentativas. Abortando este fluxo.")
-            return total_produtos_usados_qualificados_nesta_execucao_fluxo
+            return estatisticas_fluxo
 
+        estatisticas_fluxo["paginas"] += 1
+        metricas_execucao_global.incrementar("paginas", fluxo=nome_fluxo)
+        metricas_execucao_global.registrar_pagina(time.perf_counter() - inicio_pagina, nome_fluxo)
+        if ao_concluir_pagina:
+            ao_concluir_pagina(pagina_atual)
+        if fim_por_baixo_rendimento:
+            logger.info(f"[{nome_fluxo}] {paginas_sem_asin_novo} páginas consecutivas sem ASIN inédito nesta execução. Encerrando fluxo na página {pagina_atual}.")
+            estatisticas_fluxo["concluido"] = True
+            return estatisticas_fluxo
         pagina_atual += 1
-        if pagina_atual <= max_paginas : 
-             await asyncio.sleep(random.uniform(5, 10)) 
+        if pagina_atual <= limite_paginas : 
+             await ritmo.esperar(fluxo=nome_fluxo) 
 
     logger.info(
-        f"--- Concluído Fluxo: {nome_fluxo}. Máximo de páginas ({max_paginas}) atingido ou fim da paginação. "
-        f"Total de produtos qualificados e notificados neste fluxo específico: {total_produtos_usados_qualificados_nesta_execucao_fluxo} ---"
+        f"--- Concluído Fluxo: {nome_fluxo}. Limite de páginas ({limite_paginas} de no máximo {max_paginas}) atingido ou fim da paginação. "
+        f"Total de produtos qualificados e notificados neste fluxo específico: {estatisticas_fluxo['qualificados']} ---"
     )
-    return total_produtos_usados_qualificados_nesta_execucao_fluxo
+    # Sem nenhuma página processada nesta chamada, o fluxo não pode ser dado como concluído no cursor.
+    estatisticas_fluxo["concluido"] = estatisticas_fluxo["paginas"] > 0
+    return estatisticas_fluxo
+
 
+ORDENACOES_USADOS = [
+    {'s_param': 'popularity-rank', 'label': 'Destaque'},
+    {'s_param': 'price-asc-rank', 'label': 'Menor Preço'},
+    {'s_param': 'price-desc-rank', 'label': 'Maior Preço'},
+    {'s_param': 'review-rank', 'label': 'Avaliação'},
+    {'s_param': 'date-desc-rank', 'label': 'Lançamento'},
+    {'s_param': 'exact-aware-popularity-rank', 'label': 'Mais Vendido'}
+]
+
+def montar_fluxos_usados(category_urls_data):
+    """Expande as categorias nas 6 ordenações. Cada fluxo é um dict com 'indice', 'nome' e 'url'."""
+    fluxos = []
+    for cat_data in category_urls_data:
+        cat_name = cat_data['name']
+        cat_url_base = cat_data['url']
+        for ordenacao in ORDENACOES_USADOS:
+            parsed_cat_url = urlparse(cat_url_base)
+            query_params_cat = parse_qs(parsed_cat_url.query)
+            query_params_cat['s'] = [ordenacao['s_param']]
+            query_params_cat.pop('page', None)
+            query_params_cat.pop('qid', None)
+            query_params_cat.pop('ref', None)
+            
+            ordered_cat_url_query = urlencode(query_params_cat, doseq=True)
+            ordered_cat_url = urlunparse(parsed_cat_url._replace(query=ordered_cat_url_query))
+            fluxos.append({'indice': len(fluxos), 'nome': f"{NOME_FLUXO_BASE} - {cat_name} - {ordenacao['label']}", 'url': ordered_cat_url, 'categoria': cat_name})
+    return fluxos
+
+def fluxos_do_shard(fluxos, indice_shard, total_shards):
+    """
+    Fluxos atribuídos a este shard: round-robin sobre os fluxos ordenados por nome, o que não depende da
+    ordem em que as categorias foram extraídas. Todo nó recebe len(fluxos) // total_shards fluxos (ou um a mais),
+    mesmo com uma única categoria, como a "Geral (Fallback)". As ordenações de uma categoria ficam em nós
+    diferentes: a deduplicação de ASINs entre elas vale só dentro de cada nó, e o merge junta os registros
+    e as notificações repetidas.
+    """
+    ordenados = sorted(fluxos, key=lambda fluxo: fluxo['nome'])
+    selecionados = sorted(ordenados[indice_shard::total_shards], key=lambda fluxo: fluxo['indice'])
+    categorias = {fluxo['categoria'] for fluxo in selecionados}
+    logger.info(f"Shard {indice_shard + 1}/{total_shards}: {len(selecionados)} de {len(fluxos)} fluxos ({len(categorias)} categorias).")
+    return selecionados
+
+class CursorCrawl:
+    """
+    Progresso do crawl persistido entre execuções: fluxos concluídos na rodada atual e a próxima
+    página de cada fluxo em andamento. O estado só vale para a mesma lista de fluxos (hash).
+    """
+
+    def __init__(self, cursor_path, fluxos, politica=POLITICA_CURSOR_USADOS):
+        self.cursor_path = cursor_path
+        self.fluxos = fluxos
+        self.politica = politica
+        self.hash_fluxos = self.calcular_hash(fluxos)
+        self.estado = self._carregar()
+
+    def _estado_novo(self, rodada=1, inicio_rotacao=0):
+        return {"hash_fluxos": self.hash_fluxos, "rodada": rodada, "inicio_rotacao": inicio_rotacao,
+                "concluidos": [], "em_andamento": {}, "atualizado_em": datetime.now().isoformat()}
+
+    @staticmethod
+    def calcular_hash(fluxos):
+        return hashlib.sha1("\n".join(fluxo['nome'] for fluxo in fluxos).encode('utf-8')).hexdigest()
+
+    def _carregar(self):
+        estado = None
+        if os.path.exists(self.cursor_path):
+            try:
+                with open(self.cursor_path, 'r', encoding='utf-8') as f:
+                    estado = json.load(f)
+            except Exception as e:
+                logger.error(f"Erro ao ler cursor do crawl '{self.cursor_path}': {e}. Começando do início.")
+        if not estado or self.politica == "inicio":
+            return self._estado_novo()
+        if estado.get("hash_fluxos") != self.hash_fluxos:
+            logger.info("Lista de categorias/fluxos mudou desde a última execução. Cursor do crawl reiniciado.")
+            return self._estado_novo(estado.get("rodada", 0) + 1)
+        if self.politica == "rotacionar":
+            inicio = (estado.get("inicio_rotacao", 0) + PASSO_ROTACAO_CURSOR_USADOS) % max(1, len(self.fluxos))
+            return self._estado_novo(estado.get("rodada", 0) + 1, inicio)
+        if len(estado["concluidos"]) >= len(self.fluxos):
+            return self._estado_novo(estado.get("rodada", 0) + 1)
+        return estado
+
+    def salvar(self):
+        self.estado["atualizado_em"] = datetime.now().isoformat()
+        tmp_path = f"{self.cursor_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.estado, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cursor_path)
+        except Exception as e:
+            logger.error(f"Erro ao salvar cursor do crawl em '{self.cursor_path}': {e}", exc_info=True)
+
+    def fluxos_pendentes(self):
+        """Fluxos ainda não concluídos na rodada, a partir do ponto de início da rotação."""
+        inicio = self.estado["inicio_rotacao"]
+        ordem = self.fluxos[inicio:] + self.fluxos[:inicio]
+        concluidos = set(self.estado["concluidos"])
+        pendentes = [fluxo for fluxo in ordem if fluxo['indice'] not in concluidos]
+        logger.info(
+            f"Cursor do crawl: rodada {self.estado['rodada']}, {len(concluidos)}/{len(self.fluxos)} fluxos já concluídos, "
+            f"{len(self.estado['em_andamento'])} em andamento, início em '{ordem[0]['nome'] if ordem else 'N/A'}'."
+        )
+        return pendentes
+
+    def pagina_inicial(self, indice_fluxo):
+        return self.estado["em_andamento"].get(str(indice_fluxo), 1)
+
+    def marcar_pagina(self, indice_fluxo, pagina_concluida):
+        self.estado["em_andamento"][str(indice_fluxo)] = pagina_concluida + 1
+        self.salvar()
+
+    def marcar_concluido(self, indice_fluxo):
+        self.estado["em_andamento"].pop(str(indice_fluxo), None)
+        if indice_fluxo not in self.estado["concluidos"]:
+            self.estado["concluidos"].append(indice_fluxo)
+        self.salvar()
+
+
+class EscalonadorFluxos:
+    """
+    Prioriza os fluxos pelo rendimento histórico por página (produtos qualificados e ASINs inéditos) com UCB1:
+    fluxos sem histórico vêm primeiro (exploração); os demais, pela recompensa média normalizada mais um bônus
+    de incerteza. O orçamento de páginas de cada fluxo é proporcional à prioridade, com um piso, e as contagens
+    antigas decaem a cada execução para acompanhar mudanças no catálogo.
+    """
+
+    def __init__(self, rendimento_path, decaimento=ESCALONADOR_DECAIMENTO_USADOS):
+        self.rendimento_path = rendimento_path
+        self.decaimento = decaimento
+        self.estatisticas = self._carregar()
+
+    def _carregar(self):
+        if not os.path.exists(self.rendimento_path):
+            return {}
+        try:
+            with open(self.rendimento_path, 'r', encoding='utf-8') as f:
+                estatisticas = json.load(f)
+        except Exception as e:
+            logger.error(f"Erro ao ler rendimento dos fluxos '{self.rendimento_path}': {e}. Escalonador começa sem histórico.")
+            return {}
+        self.decair(estatisticas=estatisticas)
+        return estatisticas
+
+    def decair(self, fracao=1.0, estatisticas=None):
+        """Aplica o decaimento de uma execução; `fracao` < 1 para fatias dela (ciclos profundos do daemon)."""
+        fator = self.decaimento ** fracao
+        for dados in (self.estatisticas if estatisticas is None else estatisticas).values():
+            dados["paginas"] *= fator
+            dados["recompensa"] *= fator
+
+    def salvar(self):
+        tmp_path = f"{self.rendimento_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.estatisticas, f, ensure_ascii=False)
+            os.replace(tmp_path, self.rendimento_path)
+        except Exception as e:
+            logger.error(f"Erro ao salvar rendimento dos fluxos em '{self.rendimento_path}': {e}", exc_info=True)
+
+    @staticmethod
+    def recompensa(estatisticas_fluxo):
+        return estatisticas_fluxo["qualificados"] + ESCALONADOR_PESO_ASIN_NOVO_USADOS * estatisticas_fluxo["asins_novos"]
+
+    def prioridades(self, fluxos):
+        """UCB1 por nome de fluxo; infinito para fluxos que nunca rodaram (ou cujo histórico decaiu a quase nada)."""
+        conhecidos = {fluxo['nome']: self.estatisticas[fluxo['nome']] for fluxo in fluxos
+                      if self.estatisticas.get(fluxo['nome'], {}).get("paginas", 0) >= 0.5}
+        medias = {nome: dados["recompensa"] / dados["paginas"] for nome, dados in conhecidos.items()}
+        maior_media = max(medias.values(), default=0) or 1
+        total_paginas = sum(dados["paginas"] for dados in conhecidos.values())
+        prioridades = {}
+        for fluxo in fluxos:
+            nome = fluxo['nome']
+            if nome not in conhecidos:
+                prioridades[nome] = float('inf')
+                continue
+            bonus = ESCALONADOR_EXPLORACAO_USADOS * math.sqrt(math.log(max(total_paginas, 2)) / conhecidos[nome]["paginas"])
+            prioridades[nome] = medias[nome] / maior_media + bonus
+        return prioridades
+
+    def planejar(self, fluxos, max_paginas):
+        """Fluxos em ordem de prioridade, cada um com 'prioridade' e 'max_paginas' (orçamento de páginas)."""
+        prioridades = self.prioridades(fluxos)
+        maior_finita = max((p for p in prioridades.values() if p != float('inf')), default=0) or 1
+        for fluxo in fluxos:
+            prioridade = prioridades[fluxo['nome']]
+            fluxo['prioridade'] = prioridade
+            if prioridade == float('inf'):
+                fluxo['max_paginas'] = max_paginas
+            else:
+                fluxo['max_paginas'] = min(max_paginas, max(ESCALONADOR_PAGINAS_MIN_USADOS, math.ceil(max_paginas * prioridade / maior_finita)))
+        planejados = sorted(fluxos, key=lambda fluxo: fluxo['prioridade'], reverse=True)
+        inexplorados = sum(1 for fluxo in planejados if fluxo['prioridade'] == float('inf'))
+        logger.info(
+            f"Escalonador: {len(planejados)} fluxos ({inexplorados} sem histórico de rendimento), "
+            f"{sum(fluxo['max_paginas'] for fluxo in planejados)} páginas no orçamento. Primeiros: "
+            + ", ".join(f"'{fluxo['nome']}' ({fluxo['max_paginas']}p)" for fluxo in planejados[:3])
+        )
+        return planejados
+
+    def fluxos_quentes(self, fluxos, quantidade):
+        """Fluxos de maior recompensa média por página; sem histórico suficiente, completa com a ordenação por lançamento."""
+        medias = {nome: dados["recompensa"] / dados["paginas"] for nome, dados in self.estatisticas.items() if dados.get("paginas", 0) >= 0.5}
+        conhecidos = sorted((fluxo for fluxo in fluxos if medias.get(fluxo['nome'], 0) > 0), key=lambda fluxo: medias[fluxo['nome']], reverse=True)
+        quentes = conhecidos[:quantidade]
+        nomes = {fluxo['nome'] for fluxo in quentes}
+        quentes += [fluxo for fluxo in fluxos if fluxo['nome'].endswith("- Lançamento") and fluxo['nome'] not in nomes][:quantidade - len(quentes)]
+        return quentes
+
+    def registrar(self, nome_fluxo, estatisticas_fluxo):
+        if not estatisticas_fluxo["paginas"]:
+            return
+        dados = self.estatisticas.setdefault(nome_fluxo, {"paginas": 0.0, "recompensa": 0.0})
+        dados["paginas"] += estatisticas_fluxo["paginas"]
+        dados["recompensa"] += self.recompensa(estatisticas_fluxo)
+        dados["atualizado_em"] = datetime.now().isoformat()
+        self.salvar()
+
+
+async def iniciar_driver_worker_async(worker_logger):
+    inicio = time.monotonic()
+    with metricas_execucao_global.cronometrar("inicio_driver"):
+        driver = await asyncio.to_thread(iniciar_driver_sync_worker, worker_logger)
+    if not driver:
+        return None, None
+    driver.usados_inicio_monotonic = inicio
+    metricas_execucao_global.incrementar("drivers_iniciados")
+    if PERSISTENCIA_SESSAO_USADOS == "cookies":
+        await asyncio.to_thread(restaurar_cookie_jar, driver, worker_logger)
+    with metricas_execucao_global.cronometrar("cookies_iniciais"):
+        await get_initial_cookies(driver, worker_logger)
+    sessao_http = criar_sessao_http(driver, worker_logger) if MODO_FETCH_USADOS == "http" else None
+    return driver, sessao_http
+
+def encerrar_driver_worker(driver, sessao_http, worker_logger):
+    if sessao_http is not None:
+        sessao_http.close()
+    if driver:
+        if PERSISTENCIA_SESSAO_USADOS == "cookies":
+            salvar_cookie_jar(driver, worker_logger)
+        worker_logger.info("Tentando fechar o driver Selenium...")
+        try:
+            driver.quit()
+            worker_logger.info("Driver Selenium fechado.")
+        except Exception as e_quit:
+            worker_logger.error(f"Erro ao fechar o driver: {e_quit}", exc_info=True)
+        if pool_proxies_global is not None:
+            pool_proxies_global.liberar(getattr(driver, "usados_proxy_url", None))
+        liberar_slot_perfil(getattr(driver, "usados_slot_perfil", None))
+
+async def worker_fluxos_usados(worker_id, fila_fluxos, history, asins_vistos, serie_precos, cursor, driver=None, sessao_http=None, escalonador=None,
+                               manter_driver=False):
+    """
+    Consome fluxos da fila com um driver próprio (proxy e User-Agent próprios).
+    Um CAPTCHA, o proxy do driver em quarentena (falhas seguidas) ou MAX_ERROS_WEBDRIVER_USADOS erros de WebDriver
+    seguidos (sessão morta) reinicia apenas o driver deste worker (o pool de proxies entrega o próximo melhor) e
+    devolve o fluxo à fila uma vez; a sessão do enriquecimento de ofertas passa a ser a do driver novo.
+    Só fluxos que chegaram ao fim são marcados como concluídos no cursor.
+    Sem cursor, cada fluxo começa na página 1 e não marca progresso (recrawl do daemon). Com manter_driver,
+    o driver não é fechado e é devolvido junto com a sessão HTTP para o próximo ciclo.
+    """
+    worker_logger = logging.getLogger(f"{logger.name}.W{worker_id}")
+    try:
+        if driver is None:
+            driver, sessao_http = await iniciar_driver_worker_async(worker_logger)
+            if not driver:
+                worker_logger.error("Falha ao iniciar o WebDriver deste worker. Worker encerrado.")
+                return None, None
+
+        while True:
+            if prazo_esgotado():
+                worker_logger.warning("Prazo da execução esgotado. Nenhum fluxo novo será iniciado por este worker.")
+                break
+            try:
+                fluxo = fila_fluxos.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+
+            worker_logger.info(f"Iniciando scraper para: {fluxo['nome']} - URL: {fluxo['url']}")
+            ritmo = obter_controlador_ritmo(driver, worker_id)
+            estatisticas_fluxo = await process_used_products_geral_async(
+                driver, fluxo['url'], fluxo['nome'], history, worker_logger, fluxo.get('max_paginas', MAX_PAGINAS_POR_FLUXO), sessao_http, asins_vistos, serie_precos, ritmo,
+                pagina_inicial=cursor.pagina_inicial(fluxo['indice']) if cursor else 1,
+                ao_concluir_pagina=(lambda pagina, indice=fluxo['indice']: cursor.marcar_pagina(indice, pagina)) if cursor else None
+            )
+            if escalonador is not None:
+                escalonador.registrar(fluxo['nome'], estatisticas_fluxo)
+            if estatisticas_fluxo["prazo_esgotado"]:
+                break
+            if cursor and estatisticas_fluxo["concluido"]:
+                cursor.marcar_concluido(fluxo['indice'])
+
+            motivo_reinicio = None
+            if estatisticas_fluxo["captcha"]:
+                motivo_reinicio = "CAPTCHA"
+            elif estatisticas_fluxo["proxy_quarentena"] or proxy_do_driver_em_quarentena(driver):
+                motivo_reinicio = "proxy em quarentena"
+                metricas_execucao_global.incrementar("reinicios_driver_quarentena")
+            elif getattr(driver, "usados_erros_webdriver_consecutivos", 0) >= MAX_ERROS_WEBDRIVER_USADOS:
+                motivo_reinicio = f"{driver.usados_erros_webdriver_consecutivos} erros de WebDriver consecutivos"
+                metricas_execucao_global.incrementar("reinicios_driver_erro")
+            if motivo_reinicio:
+                if not fluxo.get('reenfileirado'):
+                    fluxo['reenfileirado'] = True
+                    fila_fluxos.put_nowait(fluxo)
+                    worker_logger.info(f"Fluxo '{fluxo['nome']}' devolvido à fila após {motivo_reinicio}.")
+                worker_logger.warning(f"{motivo_reinicio} neste worker. Reiniciando o driver com outro proxy/User-Agent.")
+                encerrar_driver_worker(driver, sessao_http, worker_logger)
+                driver, sessao_http = await iniciar_driver_worker_async(worker_logger)
+                if not driver:
+                    worker_logger.error(f"Falha ao reiniciar o WebDriver após {motivo_reinicio}. Worker encerrado.")
+                    return None, None
+                if enriquecedor_ofertas_global is not None:
+                    # A sessão do enriquecimento pode ter vindo do driver que acabou de cair (proxy em quarentena, cookies queimados).
+                    enriquecedor_ofertas_global.renovar_sessao(criar_sessao_http(driver, worker_logger))
+
+            await ritmo.esperar()
+    except Exception as e:
+        worker_logger.error(f"Erro inesperado no worker {worker_id}: {e}", exc_info=True)
+    finally:
+        if not manter_driver:
+            encerrar_driver_worker(driver, sessao_http, worker_logger)
+            driver, sessao_http = None, None
+            worker_logger.info(f"Worker {worker_id} finalizado.")
+    return driver, sessao_http
 
 async def run_usados_geral_scraper_async():
+    global despachante_telegram_global, enriquecedor_ofertas_global, agregador_resumo_global
     logger.info(f"--- [SCRAPER INÍCIO GERAL] ---")
+    iniciar_prazo_execucao()
     driver = None
+    sessao_http = None
+    history = None
+    serie_precos = None
     try:
+        with metricas_execucao_global.cronometrar("verificacao_proxies"):
+            await asyncio.to_thread(obter_pool_proxies, logger)
         logger.info("Tentando iniciar o driver Selenium...")
-        driver = iniciar_driver_sync_worker(logger) 
+        driver, sessao_http = await iniciar_driver_worker_async(logger)
         if not driver:
             logger.error("Falha crítica ao iniciar o WebDriver. Abortando scraper.")
             return
 
         logger.info("Driver Selenium iniciado com sucesso.")
-        await get_initial_cookies(driver, logger)
         
-        history = {}
-        if USAR_HISTORICO:
-            history = load_history_geral()
+        with metricas_execucao_global.cronometrar("carregar_historico"):
+            if USAR_HISTORICO:
+                history = load_history_geral()
+            if USAR_SERIE_PRECOS:
+                serie_precos = SeriePrecosUsados(HISTORY_DIR_BASE)
+        if ENRIQUECIMENTO_OFERTAS_USADOS:
+            ofertas_cache_path = os.path.join(HISTORY_DIR_BASE, OFERTAS_CACHE_FILENAME_USADOS)
+            if MODO_EXECUCAO_USADOS == "shard":
+                ofertas_cache_path = os.path.join(SHARDS_DIR_BASE, OFERTAS_CACHE_SHARD_FILENAME_USADOS.format(indice=INDICE_SHARD_USADOS))
+            enriquecedor_ofertas_global = EnriquecedorOfertas(ofertas_cache_path, criar_sessao_http(driver, logger))
+        if MODO_EXECUCAO_USADOS == "shard":
+            # Histórico e série locais continuam guiando as decisões; o delta é o que segue para o merge.
+            delta_shard = DeltaHistoricoShard(
+                os.path.join(SHARDS_DIR_BASE, DELTA_SHARD_FILENAME_USADOS.format(indice=INDICE_SHARD_USADOS)),
+                INDICE_SHARD_USADOS, TOTAL_SHARDS_USADOS
+            )
+            if history is not None:
+                history = HistoricoComDelta(history, delta_shard)
+            if serie_precos is not None:
+                serie_precos = SeriePrecosComDelta(serie_precos, delta_shard)
+            despachante_telegram_global = delta_shard
+        elif bot_instance_global and TELEGRAM_CHAT_IDS_LIST:
+            despachante_telegram_global = DespachanteTelegram(
+                bot_instance_global, os.path.join(HISTORY_DIR_BASE, FILA_TELEGRAM_FILENAME_USADOS), logger
+            )
+            despachante_telegram_global.iniciar()
+            if MODO_NOTIFICACAO_USADOS == "resumo":
+                agregador_resumo_global = AgregadorResumo(despachante_telegram_global)
         
-        logger.info(f"Tentando extrair categorias da URL base: {URL_GERAL_USADOS_BASE}")
-        category_urls_data = await extract_category_links(driver, URL_GERAL_USADOS_BASE, logger)
+        with metricas_execucao_global.cronometrar("categorias"):
+            category_urls_data = await obter_categorias_usados(driver, logger)
 
         if not category_urls_data:
             logger.warning("Nenhuma categoria foi extraída. O scraper prosseguirá apenas com a URL geral de 'Quase Novo'.")
             category_urls_data.append({'name': 'Geral (Fallback)', 'url': URL_GERAL_USADOS_BASE})
         
-        for cat_data in category_urls_data:
-            cat_name = cat_data['name']
-            cat_url_base = cat_data['url']
-            
-            ordenacoes = [
-                {'s_param': 'popularity-rank', 'label': 'Destaque'},
-                {'s_param': 'price-asc-rank', 'label': 'Menor Preço'},
-                {'s_param': 'price-desc-rank', 'label': 'Maior Preço'},
-                {'s_param': 'review-rank', 'label': 'Avaliação'},
-                {'s_param': 'date-desc-rank', 'label': 'Lançamento'},
-                {'s_param': 'exact-aware-popularity-rank', 'label': 'Mais Vendido'}
-            ]
+        fluxos = montar_fluxos_usados(category_urls_data)
+        cursor_path = os.path.join(HISTORY_DIR_BASE, CURSOR_FILENAME_USADOS)
+        if MODO_EXECUCAO_USADOS == "shard":
+            fluxos = fluxos_do_shard(fluxos, INDICE_SHARD_USADOS, TOTAL_SHARDS_USADOS)
+            cursor_path = os.path.join(SHARDS_DIR_BASE, CURSOR_SHARD_FILENAME_USADOS.format(indice=INDICE_SHARD_USADOS))
+        cursor = CursorCrawl(cursor_path, fluxos)
+        fluxos_pendentes = cursor.fluxos_pendentes()
+        escalonador = None
+        if ESCALONADOR_USADOS == "rendimento":
+            rendimento_path = os.path.join(HISTORY_DIR_BASE, RENDIMENTO_FLUXOS_FILENAME_USADOS)
+            if MODO_EXECUCAO_USADOS == "shard":
+                rendimento_path = os.path.join(SHARDS_DIR_BASE, RENDIMENTO_FLUXOS_SHARD_FILENAME_USADOS.format(indice=INDICE_SHARD_USADOS))
+            escalonador = EscalonadorFluxos(rendimento_path)
+            fluxos_pendentes = escalonador.planejar(fluxos_pendentes, MAX_PAGINAS_POR_FLUXO)
+        fila_fluxos = asyncio.Queue()
+        for fluxo in fluxos_pendentes:
+            fila_fluxos.put_nowait(fluxo)
+        num_workers = min(NUM_DRIVERS_USADOS, fila_fluxos.qsize())
+        logger.info(f"{fila_fluxos.qsize()} fluxos enfileirados para {num_workers} worker(s).")
 
-            for ordenacao in ordenacoes:
-                parsed_cat_url = urlparse(cat_url_base)
-                query_params_cat = parse_qs(parsed_cat_url.query)
-                query_params_cat['s'] = [ordenacao['s_param']]
-                query_params_cat.pop('page', None)
-                query_params_cat.pop('qid', None)
-                query_params_cat.pop('ref', None)
-                
-                ordered_cat_url_query = urlencode(query_params_cat, doseq=True)
-                ordered_cat_url = urlunparse(parsed_cat_url._replace(query=ordered_cat_url_query))
-                
-                fluxo_nome_atual = f"{NOME_FLUXO_BASE} - {cat_name} - {ordenacao['label']}"
-                
-                logger.info(f"Iniciando scraper para: {fluxo_nome_atual} - URL: {ordered_cat_url}")
-                await process_used_products_geral_async(
-                    driver, ordered_cat_url, fluxo_nome_atual, history, logger, MAX_PAGINAS_POR_FLUXO
-                )
-                await asyncio.sleep(random.uniform(5, 10))
+        # O worker 0 reaproveita o driver já aquecido; o history é compartilhado no mesmo event loop,
+        # e cada leitura/atualização de um ASIN acontece sem await no meio, então os workers não se atropelam.
+        asins_vistos_execucao = {}
+        workers = [worker_fluxos_usados(0, fila_fluxos, history, asins_vistos_execucao, serie_precos, cursor, driver, sessao_http, escalonador)]
+        driver, sessao_http = None, None
+        workers += [worker_fluxos_usados(worker_id, fila_fluxos, history, asins_vistos_execucao, serie_precos, cursor, escalonador=escalonador) for worker_id in range(1, num_workers)]
+        await asyncio.gather(*workers)
 
-        logger.info(f"Processamento de todos os fluxos de categoria concluído. Total de ASINs no histórico final: {len(history)}.")
+        if not fila_fluxos.empty() and prazo_esgotado():
+            metricas_execucao_global.incrementar("fluxos_adiados_prazo", fila_fluxos.qsize())
+            logger.warning(f"Prazo da execução esgotado: {fila_fluxos.qsize()} fluxos ficam pendentes no cursor para a próxima execução.")
+        elif not fila_fluxos.empty():
+            logger.error(f"{fila_fluxos.qsize()} fluxos não foram processados (todos os workers encerraram).")
+        logger.info(f"Processamento de todos os fluxos de categoria concluído. ASINs distintos vistos nesta execução: {len(asins_vistos_execucao)}. Total de ASINs no histórico final: {len(history) if history is not None else 'N/A'}.")
 
     except Exception as e:
         logger.error(f"Erro catastrófico no scraper geral de usados (run_usados_geral_scraper_async): {e}", exc_info=True)
     finally:
-        if driver:
-            logger.info("Tentando fechar o driver Selenium...")
-            try:
-                driver.quit()
-                logger.info("Driver Selenium fechado.")
-            except Exception as e_quit:
-                logger.error(f"Erro ao fechar o driver: {e_quit}", exc_info=True)
+        encerrar_driver_worker(driver, sessao_http, logger)
+        if history is not None:
+            compactar_historico(history)
+            history.close()
+        if serie_precos is not None:
+            serie_precos.commit()
+        if enriquecedor_ofertas_global is not None:
+            enriquecedor_ofertas_global.fechar()
+            enriquecedor_ofertas_global = None
+        if agregador_resumo_global is not None:
+            agregador_resumo_global.descarregar()
+            agregador_resumo_global = None
+        if despachante_telegram_global is not None:
+            with metricas_execucao_global.cronometrar("drenar_telegram"):
+                if isinstance(despachante_telegram_global, DespachanteTelegram) and segundos_ate_prazo() is not None:
+                    # O que não for enviado até o prazo fica no journal e é reenviado na próxima execução.
+                    await despachante_telegram_global.encerrar(min(TELEGRAM_TIMEOUT_ENCERRAMENTO, max(5.0, segundos_ate_prazo() - 30)))
+                else:
+                    await despachante_telegram_global.encerrar()
+            despachante_telegram_global = None
+        await asyncio.to_thread(gravador_dumps_global.aguardar_pendentes)
+        if segundos_ate_prazo() is not None:
+            metricas_execucao_global.definir("segundos_restantes_prazo", round(segundos_ate_prazo(), 1))
+        metricas_execucao_global.exportar(METRICAS_DIR_BASE, logger)
         logger.info(f"--- [SCRAPER FIM GERAL] ---")
 
-# ... (demais funções auxiliares: load_proxy_list, test_proxy, get_working_proxy, iniciar_driver_sync_worker, etc. permanecem iguais) ...
+async def executar_ciclo_daemon(fluxos, drivers, history, serie_precos, cursor, escalonador=None):
+    """
+    Distribui os fluxos do ciclo entre os drivers aquecidos e devolve os drivers (reiniciados após CAPTCHA) para o próximo.
+    Só os ciclos profundos alimentam o escalonador: as páginas 1-2 dos recrawls quentes inflariam o rendimento estimado.
+    """
+    fila_fluxos = asyncio.Queue()
+    for fluxo in fluxos:
+        fila_fluxos.put_nowait(fluxo)
+    asins_vistos_ciclo = {}
+    resultados = await asyncio.gather(*(
+        worker_fluxos_usados(worker_id, fila_fluxos, history, asins_vistos_ciclo, serie_precos, cursor, driver, sessao_http, escalonador, manter_driver=True)
+        for worker_id, (driver, sessao_http) in enumerate(drivers)
+    ))
+    return [(driver, sessao_http) for driver, sessao_http in resultados if driver]
+
+async def run_usados_daemon_async():
+    """
+    Processo de longa duração: drivers, sessões e cookies ficam aquecidos entre ciclos. A cada INTERVALO_QUENTE
+    refaz as páginas 1-PAGINAS_QUENTES dos fluxos de maior rendimento (ofertas do Quase Novo somem em minutos);
+    a cada INTERVALO_PROFUNDO avança FLUXOS_POR_CICLO_PROFUNDO fluxos completos pelo cursor. SIGTERM/SIGINT
+    param antes da próxima página e seguem um encerramento enxuto, que cabe no prazo de parada do supervisor:
+    histórico e série são gravados (WAL do SQLite em checkpoint, sem compactação nem VACUUM, que ficam para
+    os ciclos profundos), depois cache de ofertas e Telegram, este com TELEGRAM_TIMEOUT_ENCERRAMENTO_DAEMON. Ao fim de cada ciclo, métricas são exportadas e zeradas e o
+    journal do Telegram é compactado.
+    """
+    global despachante_telegram_global, enriquecedor_ofertas_global, agregador_resumo_global
+    logger.info("--- [DAEMON INÍCIO] ---")
+    iniciar_prazo_execucao()
+    parar = asyncio.Event()
+
+    def ao_receber_sinal(nome_sinal):
+        solicitar_encerramento(f"Sinal {nome_sinal} recebido")
+        parar.set()
+
+    loop = asyncio.get_running_loop()
+    for sinal in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sinal, ao_receber_sinal, sinal.name)
+
+    drivers = []
+    history = None
+    serie_precos = None
+    try:
+        with metricas_execucao_global.cronometrar("verificacao_proxies"):
+            await asyncio.to_thread(obter_pool_proxies, logger)
+        with metricas_execucao_global.cronometrar("carregar_historico"):
+            if USAR_HISTORICO:
+                history = load_history_geral()
+            if USAR_SERIE_PRECOS:
+                serie_precos = SeriePrecosUsados(HISTORY_DIR_BASE)
+        if bot_instance_global and TELEGRAM_CHAT_IDS_LIST:
+            despachante_telegram_global = DespachanteTelegram(
+                bot_instance_global, os.path.join(HISTORY_DIR_BASE, FILA_TELEGRAM_FILENAME_USADOS), logger
+            )
+            despachante_telegram_global.iniciar()
+            if MODO_NOTIFICACAO_USADOS == "resumo":
+                agregador_resumo_global = AgregadorResumo(despachante_telegram_global)
+        escalonador = EscalonadorFluxos(os.path.join(HISTORY_DIR_BASE, RENDIMENTO_FLUXOS_FILENAME_USADOS))
+
+        proximo_quente = proximo_profundo = time.monotonic()
+        fluxos = []
+        cursor = None
+        while not parar.is_set() and not prazo_esgotado():
+            for worker_id in range(len(drivers), NUM_DRIVERS_USADOS):
+                driver, sessao_http = await iniciar_driver_worker_async(logging.getLogger(f"{logger.name}.W{worker_id}"))
+                if driver:
+                    drivers.append((driver, sessao_http))
+            if not drivers:
+                logger.error("Nenhum WebDriver disponível. Nova tentativa no próximo ciclo.")
+            elif ENRIQUECIMENTO_OFERTAS_USADOS and enriquecedor_ofertas_global is None:
+                enriquecedor_ofertas_global = EnriquecedorOfertas(
+                    os.path.join(HISTORY_DIR_BASE, OFERTAS_CACHE_FILENAME_USADOS), criar_sessao_http(drivers[0][0], logger)
+                )
+
+            agora = time.monotonic()
+            if drivers and (agora >= proximo_profundo or not fluxos):
+                with metricas_execucao_global.cronometrar("categorias"):
+                    category_urls_data = await obter_categorias_usados(drivers[0][0], logger)
+                if not category_urls_data:
+                    category_urls_data = [{'name': 'Geral (Fallback)', 'url': URL_GERAL_USADOS_BASE}]
+                fluxos = montar_fluxos_usados(category_urls_data)
+                # O cursor persiste entre ciclos; só é recarregado (nova rodada) quando as categorias mudam ou a rodada termina.
+                if cursor is None or cursor.hash_fluxos != CursorCrawl.calcular_hash(fluxos) or not cursor.fluxos_pendentes():
+                    cursor = CursorCrawl(os.path.join(HISTORY_DIR_BASE, CURSOR_FILENAME_USADOS), fluxos)
+                fatia = escalonador.planejar(cursor.fluxos_pendentes(), MAX_PAGINAS_POR_FLUXO)[:FLUXOS_POR_CICLO_PROFUNDO_USADOS]
+                # Uma rodada completa do cursor decai o rendimento tanto quanto uma execução em lote.
+                escalonador.decair(len(fatia) / max(1, len(fluxos)))
+                logger.info(f"Ciclo profundo: {len(fatia)} fluxos completos a partir do cursor.")
+                with metricas_execucao_global.cronometrar("ciclo_profundo"):
+                    drivers = await executar_ciclo_daemon(fatia, drivers, history, serie_precos, cursor, escalonador)
+                metricas_execucao_global.incrementar("ciclos_profundos")
+                proximo_profundo = time.monotonic() + INTERVALO_PROFUNDO_MINUTOS_USADOS * 60
+                if history is not None:
+                    compactar_historico(history)
+                if serie_precos is not None:
+                    with metricas_execucao_global.cronometrar("compactar_serie_precos"):
+                        serie_precos.compactar()
+            elif drivers and agora >= proximo_quente:
+                quentes = [dict(fluxo, max_paginas=PAGINAS_QUENTES_USADOS) for fluxo in escalonador.fluxos_quentes(fluxos, NUM_FLUXOS_QUENTES_USADOS)]
+                logger.info(f"Ciclo quente: páginas 1-{PAGINAS_QUENTES_USADOS} de {len(quentes)} fluxos.")
+                with metricas_execucao_global.cronometrar("ciclo_quente"):
+                    drivers = await executar_ciclo_daemon(quentes, drivers, history, SeriePrecosSomenteLeitura(serie_precos) if serie_precos is not None else None, None)
+                metricas_execucao_global.incrementar("ciclos_quentes")
+                proximo_quente = time.monotonic() + INTERVALO_QUENTE_MINUTOS_USADOS * 60
+
+            if agregador_resumo_global is not None:
+                agregador_resumo_global.descarregar_se_vencido()
+            if enriquecedor_ofertas_global is not None:
+                enriquecedor_ofertas_global.podar()
+            if despachante_telegram_global is not None:
+                despachante_telegram_global.compactar()
+            metricas_execucao_global.exportar(METRICAS_DIR_BASE, logger)
+            metricas_execucao_global.reiniciar()
+            espera = max(1.0, min(proximo_quente, proximo_profundo) - time.monotonic())
+            try:
+                await asyncio.wait_for(parar.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
+    except Exception as e:
+        logger.error(f"Erro catastrófico no daemon de usados (run_usados_daemon_async): {e}", exc_info=True)
+    finally:
+        for sinal in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sinal)
+        # Dados primeiro, antes de fechar os Chromes: se o supervisor matar o processo no meio, o histórico já foi gravado.
+        if history is not None:
+            history.close()
+        if serie_precos is not None:
+            serie_precos.commit()
+        for driver, sessao_http in drivers:
+            encerrar_driver_worker(driver, sessao_http, logger)
+        if enriquecedor_ofertas_global is not None:
+            enriquecedor_ofertas_global.fechar()
+            enriquecedor_ofertas_global = None
+        if agregador_resumo_global is not None:
+            agregador_resumo_global.descarregar()
+            agregador_resumo_global = None
+        if despachante_telegram_global is not None:
+            # Independente do prazo: após SIGTERM o prazo já é "agora", e o que sobrar fica no journal.
+            with metricas_execucao_global.cronometrar("drenar_telegram"):
+                await despachante_telegram_global.encerrar(TELEGRAM_TIMEOUT_ENCERRAMENTO_DAEMON)
+            despachante_telegram_global = None
+        await asyncio.to_thread(gravador_dumps_global.aguardar_pendentes)
+        metricas_execucao_global.exportar(METRICAS_DIR_BASE, logger)
+        logger.info("--- [DAEMON FIM] ---")
+
 def load_proxy_list():
     proxy_list = []
     proxy_hosts = os.getenv("PROXY_HOST", "").strip().split(',')
@@ -613,34 +2421,173 @@ def load_proxy_list():
     return proxy_list
 
 def test_proxy(proxy_url, logger_param):
-    logger_param.info(f"Testando proxy: {proxy_url}")
+    proxy_log = mascarar_proxy(proxy_url)
+    logger_param.info(f"Testando proxy: {proxy_log}")
     try:
         ua_test = UserAgent()
         headers_test = {'User-Agent': ua_test.random}
         response = requests.get("https://www.amazon.com.br", proxies={"http": proxy_url, "https": proxy_url}, timeout=10, headers=headers_test)
         if response.status_code == 200:
-            logger_param.info(f"Proxy {proxy_url} testado com sucesso: Status 200")
+            logger_param.info(f"Proxy {proxy_log} testado com sucesso: Status 200")
             return True
         else:
-            logger_param.warning(f"Proxy {proxy_url} retornou status inesperado: {response.status_code}")
+            logger_param.warning(f"Proxy {proxy_log} retornou status inesperado: {response.status_code}")
             return False
     except requests.RequestException as e:
-        logger_param.error(f"Erro ao testar proxy {proxy_url}: {e}")
+        logger_param.error(f"Erro ao testar proxy {proxy_log}: {str(e).replace(proxy_url, proxy_log)}")
         return False
 
-def get_working_proxy(proxy_list, logger_param):
-    if not proxy_list: 
-        logger_param.warning("Lista de proxies vazia. Nenhum proxy para testar.")
-        return None
-    for proxy_url in proxy_list:
-        if test_proxy(proxy_url, logger_param):
-            return proxy_url
-    logger_param.warning("Nenhum proxy funcional encontrado na lista. Prosseguindo sem proxy.")
-    return None
+def mascarar_proxy(proxy_url):
+    return re.sub(r'//[^@/]*@', '//', proxy_url)
+
+class PoolProxies:
+    """
+    Proxies de `load_proxy_list` com health check concorrente e pontuação por latência, taxa de
+    sucesso e taxa de CAPTCHA. Cada driver recebe o melhor proxy livre; CAPTCHA ou falhas seguidas
+    colocam o proxy em quarentena, e o próximo driver iniciado já recebe outro.
+    Acessado do event loop e das threads de inicialização dos drivers, por isso o lock.
+    """
+
+    FALHAS_CONSECUTIVAS_QUARENTENA = 3
+
+    def __init__(self, proxy_list):
+        self.lock = threading.Lock()
+        self.proxies = {
+            proxy_url: {
+                "ativo": False, "latencia_s": None, "verificado_em": 0.0, "quarentena_ate": 0.0, "em_uso": 0,
+                "sucessos": 0, "falhas": 0, "falhas_consecutivas": 0, "captchas": 0, "paginas": 0,
+            }
+            for proxy_url in proxy_list
+        }
+
+    def _verificar_um(self, proxy_url, logger_param):
+        inicio = time.monotonic()
+        ok = test_proxy(proxy_url, logger_param)
+        return proxy_url, ok, time.monotonic() - inicio
+
+    def verificar(self, logger_param, proxy_urls=None):
+        """Testa os proxies em paralelo (todos, ou só `proxy_urls`) e atualiza latência e disponibilidade."""
+        proxy_urls = list(self.proxies) if proxy_urls is None else proxy_urls
+        if not proxy_urls:
+            return
+        inicio = time.monotonic()
+        with ThreadPoolExecutor(max_workers=min(16, len(proxy_urls)), thread_name_prefix="proxy-check") as executor:
+            resultados = list(executor.map(lambda proxy_url: self._verificar_um(proxy_url, logger_param), proxy_urls))
+        with self.lock:
+            for proxy_url, ok, latencia in resultados:
+                estado = self.proxies[proxy_url]
+                estado["ativo"] = ok
+                estado["verificado_em"] = time.time()
+                if ok:
+                    estado["sucessos"] += 1
+                    estado["falhas_consecutivas"] = 0
+                    estado["latencia_s"] = latencia if estado["latencia_s"] is None else 0.7 * estado["latencia_s"] + 0.3 * latencia
+                else:
+                    estado["falhas"] += 1
+        ativos = sum(1 for _, ok, _ in resultados if ok)
+        metricas_execucao_global.incrementar("proxies_verificados", len(resultados))
+        logger_param.info(f"Health check de {len(resultados)} proxies em {time.monotonic() - inicio:.1f}s: {ativos} ativos.")
+
+    def pontuacao(self, proxy_url):
+        estado = self.proxies[proxy_url]
+        taxa_sucesso = (estado["sucessos"] + 1) / (estado["sucessos"] + estado["falhas"] + 2)
+        taxa_captcha = estado["captchas"] / (estado["paginas"] + estado["captchas"] + 1)
+        latencia = estado["latencia_s"] if estado["latencia_s"] is not None else 10.0
+        return taxa_sucesso * (1 - taxa_captcha) / (1 + latencia)
+
+    def _candidatos(self):
+        agora = time.time()
+        return [proxy_url for proxy_url, estado in self.proxies.items() if estado["ativo"] and estado["quarentena_ate"] <= agora]
+
+    def adquirir(self, logger_param):
+        """Melhor proxy disponível, preferindo os que não estão em uso por outro driver. None se não houver."""
+        if not self.proxies:
+            return None
+        if not self._candidatos():
+            limite = time.time() - INTERVALO_REVERIFICACAO_PROXY_MINUTOS_USADOS * 60
+            agora = time.time()
+            para_reverificar = [
+                proxy_url for proxy_url, estado in self.proxies.items()
+                if estado["quarentena_ate"] <= agora and estado["verificado_em"] <= limite
+            ]
+            if para_reverificar:
+                logger_param.info(f"Nenhum proxy disponível. Reverificando {len(para_reverificar)} proxies inativos.")
+                self.verificar(logger_param, para_reverificar)
+        with self.lock:
+            candidatos = self._candidatos()
+            if not candidatos:
+                logger_param.warning("Nenhum proxy disponível no pool (inativos ou em quarentena).")
+                return None
+            escolhido = min(candidatos, key=lambda proxy_url: (self.proxies[proxy_url]["em_uso"], -self.pontuacao(proxy_url)))
+            self.proxies[escolhido]["em_uso"] += 1
+        logger_param.info(f"Proxy escolhido do pool: {mascarar_proxy(escolhido)} (pontuação {self.pontuacao(escolhido):.3f}).")
+        return escolhido
+
+    def liberar(self, proxy_url):
+        if proxy_url not in self.proxies:
+            return
+        with self.lock:
+            self.proxies[proxy_url]["em_uso"] = max(0, self.proxies[proxy_url]["em_uso"] - 1)
+
+    def em_quarentena(self, proxy_url):
+        if proxy_url not in self.proxies:
+            return False
+        with self.lock:
+            return self.proxies[proxy_url]["quarentena_ate"] > time.time()
+
+    def registrar(self, proxy_url, evento, logger_param):
+        """
+        evento: 'pagina' (carregada sem problemas), 'captcha', 'falha' (página de erro, WebDriverException)
+        ou 'recusado' (o Chrome não conseguiu conectar pelo proxy). CAPTCHA e recusa põem o proxy em quarentena na hora.
+        """
+        if proxy_url not in self.proxies:
+            return
+        with self.lock:
+            estado = self.proxies[proxy_url]
+            if evento == "pagina":
+                estado["paginas"] += 1
+                estado["sucessos"] += 1
+                estado["falhas_consecutivas"] = 0
+                return
+            if evento == "captcha":
+                estado["captchas"] += 1
+                motivo = "CAPTCHA"
+            elif evento == "recusado":
+                estado["falhas"] += 1
+                motivo = "conexão recusada pelo proxy"
+            else:
+                estado["falhas"] += 1
+                estado["falhas_consecutivas"] += 1
+                if estado["falhas_consecutivas"] < self.FALHAS_CONSECUTIVAS_QUARENTENA:
+                    return
+                motivo = f"{estado['falhas_consecutivas']} falhas consecutivas"
+            estado["quarentena_ate"] = time.time() + QUARENTENA_PROXY_MINUTOS_USADOS * 60
+            estado["falhas_consecutivas"] = 0
+        metricas_execucao_global.incrementar("proxies_quarentena")
+        logger_param.warning(f"Proxy {mascarar_proxy(proxy_url)} em quarentena por {QUARENTENA_PROXY_MINUTOS_USADOS:.0f} min ({motivo}).")
+
+def obter_pool_proxies(logger_param):
+    """Pool global, criado (e verificado) na primeira chamada."""
+    global pool_proxies_global
+    with lock_pool_proxies_global:
+        if pool_proxies_global is None:
+            pool = PoolProxies(load_proxy_list())
+            pool.verificar(logger_param)
+            pool_proxies_global = pool
+    return pool_proxies_global
+
+def registrar_evento_proxy(driver, evento, logger_param):
+    if pool_proxies_global is not None:
+        pool_proxies_global.registrar(getattr(driver, "usados_proxy_url", None), evento, logger_param)
+
+def proxy_do_driver_em_quarentena(driver):
+    return pool_proxies_global is not None and pool_proxies_global.em_quarentena(getattr(driver, "usados_proxy_url", None))
 
 def iniciar_driver_sync_worker(current_run_logger, driver_path=None): 
     current_run_logger.info("Iniciando configuração do WebDriver...")
     chrome_options = Options()
+    # driver.get retorna no DOMContentLoaded; a prontidão é decidida por aguardar_resultados_prontos.
+    chrome_options.page_load_strategy = "eager"
     chrome_options.add_argument("--headless=new")
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
@@ -655,18 +2602,28 @@ def iniciar_driver_sync_worker(current_run_logger, driver_path=None):
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_experimental_option('useAutomationExtension', False)
+    if "imagens" in BLOQUEIO_RECURSOS_USADOS:
+        chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
     chrome_options.add_argument("--disable-extensions")
     chrome_options.add_argument("--disable-popup-blocking"); chrome_options.add_argument("--mute-audio")
     chrome_options.add_argument("--no-first-run"); chrome_options.add_argument("--disable-webgl"); chrome_options.add_argument("--disable-webrtc")
     chrome_options.add_argument("--disable-features=WebRtcHideLocalIpsWithMdns,PrivacySandboxSettings4,OptimizationHints,InterestGroupStorage")
     chrome_options.add_argument("--lang=pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7")
+
+    slot_perfil = None
+    sessao_restaurada = False
+    if PERSISTENCIA_SESSAO_USADOS == "perfil":
+        slot_perfil = adquirir_slot_perfil()
+        perfil_dir, sessao_restaurada = preparar_dir_perfil(slot_perfil)
+        chrome_options.add_argument(f"--user-data-dir={os.path.abspath(perfil_dir)}")
+        current_run_logger.info(f"Perfil persistente do Chrome: {perfil_dir} ({'reaproveitado' if sessao_restaurada else 'novo'}).")
     
-    proxies_available = load_proxy_list()
-    working_proxy_url = get_working_proxy(proxies_available, current_run_logger) if proxies_available else None
+    pool_proxies = obter_pool_proxies(current_run_logger)
+    working_proxy_url = pool_proxies.adquirir(current_run_logger)
     proxy_actually_configured = False
 
     if working_proxy_url:
-        current_run_logger.info(f"Configurando proxy para Selenium: {working_proxy_url}")
+        current_run_logger.info(f"Configurando proxy para Selenium: {mascarar_proxy(working_proxy_url)}")
         chrome_options.add_argument(f'--proxy-server={working_proxy_url}') 
         proxy_actually_configured = True
     else:
@@ -674,61 +2631,659 @@ def iniciar_driver_sync_worker(current_run_logger, driver_path=None):
     current_run_logger.info(f"Opções do Chrome: {chrome_options.arguments}")
 
     service = None; driver = None
-    page_load_timeout_val = 120
+    page_load_timeout_val = TIMEOUT_CARREGAMENTO_PAGINA_USADOS
     try:
-        path_from_manager = ChromeDriverManager().install()
-        service = Service(path_from_manager)
-        current_run_logger.info(f"ChromeDriver via Manager: {path_from_manager}")
-        
-        driver = webdriver.Chrome(service=service, options=chrome_options)
+        path_chromedriver = driver_path or resolver_chromedriver(current_run_logger)
+        service = Service(path_chromedriver)
+        try:
+            driver = webdriver.Chrome(service=service, options=chrome_options)
+        except SessionNotCreatedException as e_versao:
+            if driver_path:
+                raise
+            current_run_logger.warning(f"ChromeDriver em cache não iniciou o Chrome instalado ({str(e_versao)[:200]}). Resolvendo novamente via Manager.")
+            service = Service(resolver_chromedriver(current_run_logger, forcar=True))
+            driver = webdriver.Chrome(service=service, options=chrome_options)
         current_run_logger.info("WebDriver instanciado.")
         driver.set_page_load_timeout(page_load_timeout_val)
+        driver.set_script_timeout(TIMEOUT_PRONTIDAO_USADOS + 10)
         driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"})
+        aplicar_bloqueio_recursos(driver, current_run_logger)
+        driver.usados_user_agent = user_agent
+        driver.usados_proxy_url = working_proxy_url if proxy_actually_configured else None
+        driver.usados_slot_perfil = slot_perfil
+        driver.usados_sessao_restaurada = sessao_restaurada
         return driver
     except WebDriverException as e_wd_init:
         if ("ERR_NO_SUPPORTED_PROXIES" in str(e_wd_init) or "ERR_PROXY_CONNECTION_FAILED" in str(e_wd_init)) and proxy_actually_configured:
-            current_run_logger.error(f"Erro de proxy ({working_proxy_url}) ao iniciar WebDriver: {str(e_wd_init)}. Tentando sem proxy.")
+            pool_proxies.liberar(working_proxy_url)
+            pool_proxies.registrar(working_proxy_url, "recusado", current_run_logger)
+            proximo_proxy_url = pool_proxies.adquirir(current_run_logger)
+            current_run_logger.error(
+                f"Erro de proxy ({mascarar_proxy(working_proxy_url)}) ao iniciar WebDriver: {str(e_wd_init)}. "
+                + (f"Tentando com {mascarar_proxy(proximo_proxy_url)}." if proximo_proxy_url else "Tentando sem proxy.")
+            )
             chrome_options.arguments = [arg for arg in chrome_options.arguments if not arg.startswith('--proxy-server')]
+            if proximo_proxy_url:
+                chrome_options.add_argument(f'--proxy-server={proximo_proxy_url}')
             try:
                 driver = webdriver.Chrome(service=service, options=chrome_options) 
-                current_run_logger.info("WebDriver instanciado sem proxy após falha inicial com proxy.")
+                current_run_logger.info(f"WebDriver instanciado {'com outro proxy' if proximo_proxy_url else 'sem proxy'} após falha inicial com proxy.")
                 driver.set_page_load_timeout(page_load_timeout_val)
+                driver.set_script_timeout(TIMEOUT_PRONTIDAO_USADOS + 10)
                 driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"})
+                aplicar_bloqueio_recursos(driver, current_run_logger)
+                driver.usados_user_agent = user_agent
+                driver.usados_proxy_url = proximo_proxy_url
+                driver.usados_slot_perfil = slot_perfil
+                driver.usados_sessao_restaurada = sessao_restaurada
                 return driver
             except Exception as e_retry_no_proxy:
-                current_run_logger.error(f"Falha ao tentar iniciar WebDriver sem proxy após erro de proxy: {e_retry_no_proxy}", exc_info=True)
+                current_run_logger.error(f"Falha ao tentar iniciar WebDriver após erro de proxy: {e_retry_no_proxy}", exc_info=True)
+                pool_proxies.liberar(proximo_proxy_url)
+                liberar_slot_perfil(slot_perfil)
                 if driver: driver.quit()
                 raise
         else:
             current_run_logger.error(f"WebDriverException não relacionada a proxy configurado ao iniciar WebDriver: {e_wd_init}", exc_info=True)
+            pool_proxies.liberar(working_proxy_url)
+            liberar_slot_perfil(slot_perfil)
             if driver: driver.quit()
             raise
     except Exception as e_init:
         current_run_logger.error(f"Erro geral ao iniciar WebDriver: {e_init}", exc_info=True)
+        pool_proxies.liberar(working_proxy_url)
+        liberar_slot_perfil(slot_perfil)
         if driver: driver.quit()
         raise
 
+def aplicar_bloqueio_recursos(driver, logger_param):
+    """Bloqueia fontes, mídia e hosts de anúncio/telemetria via CDP e amplia o buffer de Resource Timing para a contagem de bytes."""
+    driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': "performance.setResourceTimingBufferSize(2000)"})
+    if not URLS_BLOQUEADAS_USADOS:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": URLS_BLOQUEADAS_USADOS})
+        logger_param.info(f"{len(URLS_BLOQUEADAS_USADOS)} padrões de URL bloqueados no driver.")
+    except WebDriverException as e:
+        logger_param.warning(f"Não foi possível aplicar Network.setBlockedURLs: {str(e)[:200]}")
+
+JS_BYTES_TRANSFERIDOS = """
+const navegacao = performance.getEntriesByType('navigation')[0];
+const recursos = performance.getEntriesByType('resource');
+return {
+    documento: navegacao ? navegacao.transferSize : 0,
+    recursos: recursos.reduce((total, r) => total + (r.transferSize || 0), 0),
+    n_recursos: recursos.length
+};
+"""
+
+def medir_bytes_pagina(driver, logger_param):
+    """
+    Bytes transferidos pela página atual segundo o Resource Timing (transferSize). Recursos de outra
+    origem sem Timing-Allow-Origin contam como 0, então o valor é um piso, mas comparável entre execuções.
+    """
+    try:
+        medida = driver.execute_script(JS_BYTES_TRANSFERIDOS)
+    except WebDriverException as e:
+        logger_param.debug(f"Não foi possível medir os bytes da página: {str(e)[:200]}")
+        return None
+    return medida
+
+def validar_chromedriver(path):
+    """Versão do chromedriver se o binário existe e executa; None caso contrário."""
+    if not path or not os.path.isfile(path) or not os.access(path, os.X_OK):
+        return None
+    try:
+        resultado = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=15)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return resultado.stdout.strip() if resultado.returncode == 0 else None
+
+def resolver_chromedriver(logger_param, forcar=False):
+    """
+    Caminho do chromedriver a partir de uma cópia local em CACHE_DRIVER_DIR_BASE (cacheada no CI).
+    O ChromeDriverManager só é consultado quando a cópia falta, expira, não executa ou quando `forcar`
+    (o Chrome instalado recusou a versão em cache).
+    """
+    global chromedriver_path_global
+    with lock_chromedriver_global:
+        if chromedriver_path_global and not forcar:
+            return chromedriver_path_global
+        meta_path = os.path.join(CACHE_DRIVER_DIR_BASE, CHROMEDRIVER_META_FILENAME_USADOS)
+        if not forcar and os.path.exists(meta_path):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                idade_horas = (time.time() - meta["resolvido_em"]) / 3600
+                versao = validar_chromedriver(meta["path"]) if idade_horas < TTL_CHROMEDRIVER_HORAS_USADOS else None
+                if versao:
+                    logger_param.info(f"ChromeDriver do cache local: {meta['path']} ({versao}, resolvido há {idade_horas:.1f}h).")
+                    chromedriver_path_global = meta["path"]
+                    return chromedriver_path_global
+            except (json.JSONDecodeError, KeyError, OSError) as e:
+                logger_param.warning(f"Metadados do chromedriver em cache ilegíveis ({e}). Resolvendo novamente.")
+
+        inicio = time.monotonic()
+        path_from_manager = ChromeDriverManager().install()
+        destino = os.path.join(CACHE_DRIVER_DIR_BASE, os.path.basename(path_from_manager))
+        try:
+            shutil.copy2(path_from_manager, f"{destino}.tmp")
+            os.chmod(f"{destino}.tmp", 0o755)
+            os.replace(f"{destino}.tmp", destino)
+        except OSError as e:
+            logger_param.warning(f"Não foi possível copiar o chromedriver para o cache ({e}). Usando o caminho do Manager.")
+            destino = path_from_manager
+        versao = validar_chromedriver(destino)
+        with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({"path": os.path.abspath(destino), "origem": path_from_manager, "versao": versao, "resolvido_em": time.time()}, f, indent=2)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        logger_param.info(f"ChromeDriver via Manager em {time.monotonic() - inicio:.1f}s: {destino} ({versao}).")
+        chromedriver_path_global = os.path.abspath(destino)
+        return chromedriver_path_global
+
+def adquirir_slot_perfil():
+    # Dois Chromes não podem abrir o mesmo user-data-dir; cada driver vivo ocupa um slot.
+    with lock_chromedriver_global:
+        slot = 0
+        while slot in slots_perfil_em_uso_global:
+            slot += 1
+        slots_perfil_em_uso_global.add(slot)
+        return slot
+
+def liberar_slot_perfil(slot):
+    with lock_chromedriver_global:
+        slots_perfil_em_uso_global.discard(slot)
+
+def preparar_dir_perfil(slot):
+    """Diretório do perfil persistente do slot e se ele já existia (sessão reaproveitada)."""
+    perfil_dir = os.path.join(CACHE_DRIVER_DIR_BASE, f"perfil_chrome_{slot}")
+    existia = os.path.isdir(os.path.join(perfil_dir, "Default"))
+    os.makedirs(perfil_dir, exist_ok=True)
+    # Locks deixados por um Chrome morto (ou por outra máquina, quando o perfil vem do cache do CI) impedem a abertura.
+    for nome_lock in ("SingletonLock", "SingletonSocket", "SingletonCookie"):
+        lock_path = os.path.join(perfil_dir, nome_lock)
+        if os.path.lexists(lock_path):
+            os.remove(lock_path)
+    return perfil_dir, existia
+
+def salvar_cookie_jar(driver, logger_param):
+    try:
+        cookies = [cookie for cookie in driver.get_cookies() if "amazon" in cookie.get("domain", "")]
+    except WebDriverException as e:
+        logger_param.warning(f"Não foi possível ler os cookies do driver para o cache: {str(e)[:200]}")
+        return
+    if not cookies:
+        return
+    jar_path = os.path.join(CACHE_DRIVER_DIR_BASE, COOKIE_JAR_FILENAME_USADOS)
+    tmp_path = f"{jar_path}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"salvo_em": time.time(), "cookies": cookies}, f, ensure_ascii=False)
+        os.replace(tmp_path, jar_path)
+    except (OSError, TypeError, ValueError) as e:
+        logger_param.error(f"Erro ao salvar o cache de cookies em '{jar_path}': {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    logger_param.info(f"{len(cookies)} cookies da Amazon salvos no cache de sessão.")
+
+def restaurar_cookie_jar(driver, logger_param):
+    """Injeta os cookies salvos via CDP (Network.setCookies) antes da primeira navegação."""
+    jar_path = os.path.join(CACHE_DRIVER_DIR_BASE, COOKIE_JAR_FILENAME_USADOS)
+    if not os.path.exists(jar_path):
+        return
+    try:
+        with open(jar_path, 'r', encoding='utf-8') as f:
+            jar = json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        logger_param.warning(f"Cache de cookies ilegível ({e}). Ignorando.")
+        return
+    idade_horas = (time.time() - jar.get("salvo_em", 0)) / 3600
+    if idade_horas > TTL_COOKIES_HORAS_USADOS:
+        logger_param.info(f"Cache de cookies expirado ({idade_horas:.1f}h). Sessão nova.")
+        return
+    agora = time.time()
+    cookies_cdp = []
+    for cookie in jar.get("cookies", []):
+        if cookie.get("expiry") and cookie["expiry"] <= agora:
+            continue
+        cookie_cdp = {
+            "name": cookie["name"], "value": cookie["value"], "domain": cookie["domain"], "path": cookie.get("path", "/"),
+            "secure": cookie.get("secure", False), "httpOnly": cookie.get("httpOnly", False),
+        }
+        if cookie.get("expiry"):
+            cookie_cdp["expires"] = cookie["expiry"]
+        if cookie.get("sameSite") in ("Strict", "Lax", "None"):
+            cookie_cdp["sameSite"] = cookie["sameSite"]
+        cookies_cdp.append(cookie_cdp)
+    if not cookies_cdp:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies_cdp})
+    except WebDriverException as e:
+        logger_param.warning(f"Falha ao restaurar cookies via CDP: {str(e)[:200]}")
+        return
+    driver.usados_sessao_restaurada = True
+    logger_param.info(f"{len(cookies_cdp)} cookies restaurados do cache de sessão (salvos há {idade_horas:.1f}h).")
+
+def registrar_primeira_pagina_busca(driver, logger_param):
+    inicio = getattr(driver, "usados_inicio_monotonic", None)
+    if inicio is None:
+        return
+    driver.usados_inicio_monotonic = None
+    duracao = time.monotonic() - inicio
+    metricas_execucao_global.registrar_fase("tempo_ate_primeira_busca", duracao)
+    logger_param.info(
+        f"Tempo até a primeira página de busca deste driver: {duracao:.1f}s "
+        f"(sessão {'restaurada' if getattr(driver, 'usados_sessao_restaurada', False) else 'nova'})."
+    )
+
 async def get_initial_cookies(driver, logger_param):
+    if getattr(driver, "usados_sessao_restaurada", False):
+        logger_param.info("Sessão restaurada do cache (cookies/perfil). Aquecimento na página inicial dispensado.")
+        return
     logger_param.info("Acessando página inicial para obter cookies...")
     try:
         await asyncio.to_thread(driver.get, "https://www.amazon.com.br")
         await asyncio.sleep(random.uniform(3, 5))
         await asyncio.to_thread(wait_for_page_load, driver, logger_param)
         logger_param.info("Cookies iniciais obtidos.")
+        if PERSISTENCIA_SESSAO_USADOS == "cookies":
+            await asyncio.to_thread(salvar_cookie_jar, driver, logger_param)
     except Exception as e:
         logger_param.error(f"Erro ao obter cookies iniciais: {e}", exc_info=True)
 
-async def simulate_scroll(driver, logger_param):
-    logger_param.debug("Simulando rolagem na página...")
+def criar_sessao_http(driver, logger_param):
+    """Cria uma requests.Session com keep-alive usando o User-Agent, o proxy e os cookies do driver."""
+    sessao = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+    sessao.mount("https://", adapter)
+    sessao.mount("http://", adapter)
+    user_agent = getattr(driver, "usados_user_agent", None) or UserAgent().random
+    sessao.headers.update({
+        "User-Agent": user_agent,
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7",
+        "Connection": "keep-alive",
+    })
+    proxy_url = getattr(driver, "usados_proxy_url", None)
+    if proxy_url:
+        sessao.proxies.update({"http": proxy_url, "https": proxy_url})
+    sincronizar_cookies_sessao_http(sessao, driver, logger_param)
+    logger_param.info(f"Sessão HTTP criada (proxy: {mascarar_proxy(proxy_url) if proxy_url else 'nenhum'}, {len(sessao.cookies)} cookies).")
+    return sessao
+
+def sincronizar_cookies_sessao_http(sessao, driver, logger_param):
+    """
+    Copia os cookies do navegador para a sessão HTTP. Network.getAllCookies enxerga o jar inteiro do Chrome,
+    inclusive cookies restaurados (CDP ou perfil) antes de qualquer navegação, quando driver.get_cookies()
+    ainda não devolve nada por não haver página da Amazon carregada.
+    """
     try:
-        await asyncio.to_thread(driver.execute_script, "window.scrollTo(0, document.body.scrollHeight*0.6);")
-        await asyncio.sleep(random.uniform(1, 2))
-        await asyncio.to_thread(driver.execute_script, "window.scrollTo(0, document.body.scrollHeight);") 
-        await asyncio.sleep(random.uniform(0.5, 1.5))
-        await asyncio.to_thread(driver.execute_script, "window.scrollTo(0, 0);") 
-        logger_param.debug("Rolagem simulada com sucesso.")
-    except Exception as e:
-        logger_param.error(f"Erro ao simular rolagem: {e}", exc_info=True)
+        try:
+            cookies = driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", [])
+        except WebDriverException:
+            cookies = driver.get_cookies()
+        for cookie in cookies:
+            if "amazon" not in cookie.get("domain", ""):
+                continue
+            sessao.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+    except WebDriverException as e:
+        logger_param.warning(f"Não foi possível copiar cookies do driver para a sessão HTTP: {str(e)[:200]}")
+
+def fetch_page_http(sessao, url, logger_param, timeout=(10, 30)):
+    """
+    Baixa a página via HTTP. Retorna um dict com a "classe" da resposta. Só "resultados" e "vazia" trazem
+    "page_source" e "soup" (o mesmo soup usado na classificação segue para a extração, sem um segundo parse);
+    "captcha", "erro" (página de erro da Amazon), "desconhecida" (bloqueio leve, interstitial) e "falha"
+    (status != 200 ou erro de rede) trazem só o "motivo" e pedem o fallback para o Selenium.
+    """
+    try:
+        inicio = time.monotonic()
+        response = sessao.get(url, timeout=timeout)
+        duracao = time.monotonic() - inicio
+    except requests.RequestException as e:
+        logger_param.warning(f"Erro HTTP ao carregar {url}: {e}")
+        return {"classe": "falha", "motivo": f"erro de rede no HTTP ({type(e).__name__})"}
+    if response.status_code != 200:
+        logger_param.warning(f"Status HTTP {response.status_code} ao carregar {url}.")
+        return {"classe": "falha", "motivo": f"status HTTP {response.status_code}"}
+    page_source = response.text
+    metricas_execucao_global.incrementar("bytes_transferidos", int(response.headers.get("Content-Length") or len(response.content)))
+    soup = interpretar_html(page_source)
+    classe_pagina = classificar_pagina_html(soup)["classe"]
+    if classe_pagina == "captcha":
+        logger_param.warning(f"CAPTCHA detectado na resposta HTTP de {url}.")
+        gravador_dumps_global.gravar_html("captcha_http", page_source, anomalia=True)
+        return {"classe": "captcha", "motivo": "CAPTCHA no HTTP"}
+    if classe_pagina == "erro":
+        logger_param.warning(f"Página de erro da Amazon na resposta HTTP de {url}.")
+        gravador_dumps_global.gravar_html("amazon_error_page_http", page_source, anomalia=True)
+        return {"classe": "erro", "motivo": "página de erro da Amazon no HTTP"}
+    if classe_pagina not in ("resultados", "vazia"):
+        # Sem resultados nem marcação de busca vazia: contar como página vazia encerraria o fluxo no cursor.
+        logger_param.warning(f"Resposta HTTP de {url} não reconhecida como página de busca (classe '{classe_pagina}').")
+        gravador_dumps_global.gravar_html("pagina_desconhecida_http", page_source, anomalia=True)
+        return {"classe": classe_pagina, "motivo": "página não reconhecida no HTTP"}
+    logger_param.info(f"Página carregada via HTTP em {duracao:.2f}s ({len(page_source)} bytes).")
+    return {"classe": classe_pagina, "page_source": page_source, "soup": soup}
+
+URL_OFERTAS_USADOS = "https://www.amazon.com.br/gp/offer-listing/{asin}/?condition=used"
+# Página de ofertas (All Offers Display): a oferta fixada costuma ser a do buy box; as demais vêm em #aod-offer.
+SELETOR_OFERTAS_AOD = "#aod-pinned-offer, #aod-offer"
+SELETOR_CONDICAO_OFERTA = "#aod-offer-heading"
+SELETORES_PRECO_NOVO_PRODUTO = [
+    "#corePrice_feature_div span.a-price span.a-offscreen",
+    "#corePriceDisplay_desktop_feature_div span.a-price span.a-offscreen",
+    "#priceblock_ourprice",
+]
+
+def extrair_ofertas_html(page_source):
+    """
+    Condição e preço de cada oferta da página de ofertas e o menor preço do item novo.
+    Retorna None quando a resposta não traz as ofertas AOD no HTML: /gp/offer-listing costuma redirecionar para
+    a página do produto, onde as ofertas são carregadas por JS, e a ausência de usadas ali não prova nada.
+    """
+    soup = interpretar_html(page_source)
+    ofertas_aod = soup.select(SELETOR_OFERTAS_AOD)
+    if not ofertas_aod:
+        return None
+    usadas, precos_novo = [], []
+    for oferta in ofertas_aod:
+        condicao_tag = oferta.select_one(SELETOR_CONDICAO_OFERTA)
+        preco_tag = oferta.select_one("span.a-price span.a-offscreen")
+        condicao = " ".join(condicao_tag.get_text(" ", strip=True).split()) if condicao_tag else ""
+        preco = parse_preco_brl(preco_tag.get_text(strip=True) if preco_tag else "")
+        if preco is None:
+            continue
+        if condicao.lower().startswith("usad"):
+            usadas.append({"condicao": condicao, "preco": preco})
+        elif condicao.lower().startswith("nov"):
+            precos_novo.append(preco)
+    if not precos_novo:
+        for seletor in SELETORES_PRECO_NOVO_PRODUTO:
+            preco_tag = soup.select_one(seletor)
+            preco = parse_preco_brl(preco_tag.get_text(strip=True)) if preco_tag else None
+            if preco is not None:
+                precos_novo.append(preco)
+                break
+    usadas.sort(key=lambda oferta: oferta["preco"])
+    return {"usadas": usadas, "preco_novo": min(precos_novo) if precos_novo else None, "aod": True}
+
+def avaliar_ofertas_candidato(candidato, ofertas, logger_param, nome_fluxo=None):
+    """
+    Aplica as ofertas enriquecidas ao candidato (condição, preço e desconto sobre o novo). Retorna False quando a
+    lista AOD presente no HTML desmente o card da busca (sem oferta usada) ou o desconto sobre o novo fica abaixo
+    do mínimo. Sem ofertas (falha, redirecionamento ou AOD carregado por JS), mantém a decisão do card da busca.
+    """
+    if ofertas is None:
+        return True
+    asin, preco = candidato["asin"], candidato["preco"]
+    if not ofertas["usadas"]:
+        if not ofertas.get("aod"):
+            # Entrada de cache anterior ao campo 'aod', possivelmente da página do produto: não serve para descartar.
+            return True
+        logger_param.info(f"ASIN {asin}: página de ofertas sem oferta usada (indicador do card da busca não confirmado). Sem notificação.")
+        metricas_execucao_global.incrementar("descartados_sem_oferta_usada", fluxo=nome_fluxo)
+        return False
+    candidato["condicao"] = ofertas["usadas"][0]["condicao"]
+    if ofertas["preco_novo"]:
+        candidato["preco_novo"] = ofertas["preco_novo"]
+        candidato["desconto_novo"] = (ofertas["preco_novo"] - preco) / ofertas["preco_novo"] * 100
+        if MIN_DESCONTO_SOBRE_NOVO_USADOS and candidato["desconto_novo"] < MIN_DESCONTO_SOBRE_NOVO_USADOS:
+            logger_param.info(
+                f"ASIN {asin}: desconto de {candidato['desconto_novo']:.1f}% sobre o novo (R${ofertas['preco_novo']:.2f}) "
+                f"abaixo do mínimo de {MIN_DESCONTO_SOBRE_NOVO_USADOS}%. Sem notificação."
+            )
+            metricas_execucao_global.incrementar("descartados_desconto_novo", fluxo=nome_fluxo)
+            return False
+    return True
+
+
+class EnriquecedorOfertas:
+    """
+    Busca a página de ofertas dos candidatos a notificação numa sessão HTTP com pool de conexões, com no máximo
+    `concorrencia` requisições simultâneas. O resultado fica num cache por ASIN com TTL, persistido entre execuções,
+    então o mesmo ASIN visto em vários fluxos ou execuções não custa outra requisição.
+    """
+
+    def __init__(self, cache_path, sessao, concorrencia=CONCORRENCIA_ENRIQUECIMENTO_USADOS, ttl_horas=TTL_OFERTAS_HORAS_USADOS):
+        self.cache_path = cache_path
+        self.sessao = sessao
+        self.ttl_s = ttl_horas * 3600
+        self.semaforo = asyncio.Semaphore(concorrencia)
+        self.cache = self._carregar()
+        self._alterado = False
+        self._buscas_em_andamento = 0
+        self._sessoes_antigas = []
+
+    def _carregar(self):
+        if not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except Exception as e:
+            logger.error(f"Erro ao ler cache de ofertas '{self.cache_path}': {e}. Começando vazio.")
+            return {}
+        corte = time.time() - self.ttl_s
+        validos = {asin: entrada for asin, entrada in cache.items() if entrada.get("obtido_em", 0) >= corte}
+        logger.info(f"Cache de ofertas: {len(validos)} ASINs válidos ({len(cache) - len(validos)} expirados descartados).")
+        return validos
+
+    def podar(self):
+        """Remove as entradas vencidas e grava o cache. O _carregar só poda na carga; o daemon chama a cada ciclo."""
+        corte = time.time() - self.ttl_s
+        expirados = [asin for asin, entrada in self.cache.items() if entrada.get("obtido_em", 0) < corte]
+        for asin in expirados:
+            del self.cache[asin]
+        if expirados:
+            self._alterado = True
+            logger.info(f"Cache de ofertas: {len(expirados)} ASINs expirados removidos, {len(self.cache)} mantidos.")
+        self.salvar()
+
+    def salvar(self):
+        if not self._alterado:
+            return
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.cache, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.cache_path)
+            self._alterado = False
+        except Exception as e:
+            logger.error(f"Erro ao salvar cache de ofertas em '{self.cache_path}': {e}", exc_info=True)
+
+    def _buscar(self, asin, logger_param, timeout=(10, 20)):
+        url = URL_OFERTAS_USADOS.format(asin=asin)
+        try:
+            response = self.sessao.get(url, timeout=timeout)
+        except requests.RequestException as e:
+            logger_param.warning(f"Erro HTTP ao buscar ofertas do ASIN {asin}: {e}")
+            return None
+        metricas_execucao_global.incrementar("bytes_transferidos", int(response.headers.get("Content-Length") or len(response.content)))
+        if response.status_code != 200:
+            logger_param.warning(f"Status HTTP {response.status_code} ao buscar ofertas do ASIN {asin}.")
+            return None
+        soup = interpretar_html(response.text)
+        if classificar_pagina_html(soup)["classe"] == "captcha":
+            logger_param.warning(f"CAPTCHA na página de ofertas do ASIN {asin}.")
+            metricas_execucao_global.incrementar("captchas_enriquecimento")
+            return None
+        ofertas = extrair_ofertas_html(soup)
+        if ofertas is None:
+            logger_param.debug(f"ASIN {asin}: resposta sem ofertas AOD no HTML ({response.url}). Mantida a decisão do card da busca.")
+            metricas_execucao_global.incrementar("enriquecimento_sem_aod")
+        return ofertas
+
+    def renovar_sessao(self, sessao):
+        """
+        Passa a usar a sessão de um driver recém-reiniciado (proxy e cookies novos). A anterior só é fechada
+        quando nenhuma busca em andamento depende mais dela.
+        """
+        self._sessoes_antigas.append(self.sessao)
+        self.sessao = sessao
+        self._fechar_sessoes_antigas()
+
+    def _fechar_sessoes_antigas(self):
+        if self._buscas_em_andamento:
+            return
+        for sessao in self._sessoes_antigas:
+            sessao.close()
+        self._sessoes_antigas.clear()
+
+    async def _obter(self, asin, logger_param):
+        async with self.semaforo:
+            self._buscas_em_andamento += 1
+            try:
+                with metricas_execucao_global.cronometrar("busca_ofertas"):
+                    ofertas = await asyncio.to_thread(self._buscar, asin, logger_param)
+            finally:
+                self._buscas_em_andamento -= 1
+                self._fechar_sessoes_antigas()
+        metricas_execucao_global.incrementar("enriquecimento_http")
+        if ofertas is not None:
+            self.cache[asin] = {**ofertas, "obtido_em": int(time.time())}
+            self._alterado = True
+        return ofertas
+
+    async def enriquecer(self, asins, logger_param):
+        """Ofertas por ASIN (None quando não foi possível obter). ASINs no cache não geram requisição."""
+        resultado, faltantes = {}, []
+        for asin in dict.fromkeys(asins):
+            entrada = self.cache.get(asin)
+            if entrada and time.time() - entrada["obtido_em"] < self.ttl_s:
+                resultado[asin] = entrada
+                metricas_execucao_global.incrementar("enriquecimento_cache")
+            else:
+                faltantes.append(asin)
+        if faltantes:
+            obtidas = await asyncio.gather(*(self._obter(asin, logger_param) for asin in faltantes))
+            resultado.update(zip(faltantes, obtidas))
+            self.salvar()
+        logger_param.info(f"Enriquecimento de ofertas: {len(resultado) - len(faltantes)} ASINs do cache, {len(faltantes)} buscados via HTTP.")
+        return resultado
+
+    def fechar(self):
+        self.salvar()
+        self.sessao.close()
+        self._fechar_sessoes_antigas()
+
+ERROR_TITLE_KEYWORDS = ["desculpe", "algo deu errado", "sorry", "problema", "serviço indisponível", "error", "não encontrada"]
+ERROR_TEXT_SNIPPETS = ["Algo deu errado", "Desculpe-nos", "Serviço Indisponível"]
+FRASES_CAPTCHA = ["Insira os caracteres", "Digite os caracteres que você vê abaixo"]
+
+# Classes: captcha, resultados (há blocos de produto), erro, vazia (contêiner sem blocos) e desconhecida.
+# Os blocos de produto vêm antes dos sinais de erro: os trechos de texto de erro também aparecem em scripts.
+FUNCAO_JS_CLASSIFICAR_PAGINA = """
+function classificarPagina(seletorItem, seletorContainer, palavrasTitulo, trechosTexto) {
+    const titulo = document.title || '';
+    const itens = document.querySelectorAll(seletorItem).length;
+    const resultado = (classe) => ({classe: classe, itens: itens, titulo: titulo.slice(0, 120)});
+    if (document.querySelector("form[action*='captcha'] img, iframe[src*='captcha']")) return resultado('captcha');
+    for (const h4 of document.querySelectorAll('h4')) {
+        if (""" + " || ".join(f"h4.textContent.includes({json.dumps(frase, ensure_ascii=False)})" for frase in FRASES_CAPTCHA) + """) return resultado('captcha');
+    }
+    if (itens > 0) return resultado('resultados');
+    const tituloMin = titulo.toLowerCase();
+    const texto = document.body ? document.body.textContent : '';
+    if (palavrasTitulo.some((palavra) => tituloMin.includes(palavra))
+        || Array.from(document.images).some((img) => /Desculpe|Sorry/.test(img.alt || ''))
+        || document.querySelector('div#g')
+        || trechosTexto.some((trecho) => texto.includes(trecho))) return resultado('erro');
+    return resultado(document.querySelector(seletorContainer) ? 'vazia' : 'desconhecida');
+}
+"""
+
+def classificar_pagina_driver(driver, current_run_logger):
+    """Classifica a página atual do driver num único execute_script. None se o driver falhar."""
+    try:
+        return driver.execute_script(
+            FUNCAO_JS_CLASSIFICAR_PAGINA + "return classificarPagina(arguments[0], arguments[1], arguments[2], arguments[3]);",
+            SELETOR_ITEM_PRODUTO_USADO, SELETOR_RESULTADOS_CONT, ERROR_TITLE_KEYWORDS, ERROR_TEXT_SNIPPETS
+        )
+    except WebDriverException as e:
+        current_run_logger.error(f"Erro ao classificar a página: {str(e)[:200]}")
+        return None
+
+def classificar_pagina_html(page_source):
+    """Mesma classificação de classificar_pagina_driver sobre um snapshot HTML (str ou BeautifulSoup)."""
+    soup = interpretar_html(page_source)
+    titulo = soup.title.get_text() if soup.title else ""
+    itens = len(soup.select(SELETOR_ITEM_PRODUTO_USADO))
+    resultado = lambda classe: {"classe": classe, "itens": itens, "titulo": titulo[:120]}
+    if soup.select_one("form[action*='captcha'] img") or soup.select_one("iframe[src*='captcha']"):
+        return resultado("captcha")
+    if any(frase in h4.get_text() for h4 in soup.find_all('h4') for frase in FRASES_CAPTCHA):
+        return resultado("captcha")
+    if itens:
+        return resultado("resultados")
+    titulo_lower = titulo.lower()
+    body = soup.body or soup
+    if (any(palavra in titulo_lower for palavra in ERROR_TITLE_KEYWORDS)
+            or any('Desculpe' in img['alt'] or 'Sorry' in img['alt'] for img in soup.find_all('img', alt=True))
+            or soup.select_one("div#g")
+            or any(trecho in body.get_text() for trecho in ERROR_TEXT_SNIPPETS)):
+        return resultado("erro")
+    return resultado("vazia" if soup.select_one(SELETOR_RESULTADOS_CONT) else "desconhecida")
+
+JS_AGUARDAR_RESULTADOS = FUNCAO_JS_CLASSIFICAR_PAGINA + """
+const seletorItem = arguments[0], timeoutMs = arguments[1];
+const argumentosClassificacao = Array.prototype.slice.call(arguments, 2, 6);
+const concluir = arguments[arguments.length - 1];
+const inicio = Date.now();
+let ultimaContagem = '', ciclosEstaveis = 0, rolou = false;
+function verificar() {
+    const itens = document.querySelectorAll(seletorItem);
+    let comPreco = 0;
+    for (const item of itens) {
+        if (item.textContent.indexOf('R$') !== -1) comPreco++;
+    }
+    const contagem = itens.length + '/' + comPreco;
+    ciclosEstaveis = contagem === ultimaContagem ? ciclosEstaveis + 1 : 0;
+    ultimaContagem = contagem;
+    const decorrido = Date.now() - inicio;
+    // Pronta quando a contagem de blocos com preço para de mudar; sem nenhum preço, só depois do load completo.
+    const estavel = (comPreco > 0 && ciclosEstaveis >= 2) || (document.readyState === 'complete' && ciclosEstaveis >= 4);
+    if (estavel && itens.length > comPreco && !rolou) {
+        // Blocos ainda sem preço são conteúdo lazy abaixo da dobra: uma rolagem e nova estabilização.
+        rolou = true;
+        ciclosEstaveis = 0;
+        window.scrollTo(0, document.body.scrollHeight);
+    } else if (estavel || decorrido >= timeoutMs) {
+        if (rolou) window.scrollTo(0, 0);
+        const estado = {motivo: estavel ? 'estavel' : 'timeout', total: itens.length, com_preco: comPreco, rolou: rolou, ms: decorrido};
+        return concluir(Object.assign(estado, classificarPagina(...argumentosClassificacao)));
+    }
+    setTimeout(verificar, 250);
+}
+verificar();
+"""
+
+def aguardar_resultados_prontos(driver, logger_param, timeout=TIMEOUT_PRONTIDAO_USADOS):
+    """
+    Espera, num único execute_async_script, até a contagem de blocos SELETOR_ITEM_PRODUTO_USADO com
+    preço ficar estável (rolando uma vez só se houver blocos lazy sem preço). Retorna o estado final,
+    já com a classificação da página (ver classificar_pagina_driver), ou None.
+    """
+    try:
+        estado = driver.execute_async_script(
+            JS_AGUARDAR_RESULTADOS, SELETOR_ITEM_PRODUTO_USADO, int(timeout * 1000),
+            SELETOR_ITEM_PRODUTO_USADO, SELETOR_RESULTADOS_CONT, ERROR_TITLE_KEYWORDS, ERROR_TEXT_SNIPPETS
+        )
+    except TimeoutException:
+        logger_param.warning(f"Timeout do script de prontidão após {timeout:.0f}s.")
+        return None
+    except WebDriverException as e:
+        logger_param.warning(f"Erro no script de prontidão da página: {str(e)[:200]}")
+        return None
+    logger_param.info(
+        f"Página pronta em {estado['ms'] / 1000:.1f}s ({estado['motivo']}, classe '{estado['classe']}'): {estado['com_preco']}/{estado['total']} blocos com preço"
+        + (", após rolagem para conteúdo lazy." if estado["rolou"] else ".")
+    )
+    return estado
 
 async def send_telegram_message_async(bot, chat_id, message, parse_mode, msg_logger):
     msg_logger.debug(f"Tentando enviar mensagem para chat_id: {chat_id}")
@@ -739,6 +3294,13 @@ async def send_telegram_message_async(bot, chat_id, message, parse_mode, msg_log
         await bot.send_message(chat_id=chat_id, text=message, parse_mode=parse_mode)
         msg_logger.info(f"[{msg_logger.name}] Notificação Telegram enviada para CHAT_ID {chat_id}.")
         return True
+    except RetryAfter:
+        raise
+    except BadRequest as e_tg:
+        msg_logger.error(f"[{msg_logger.name}] Mensagem rejeitada pelo Telegram para CHAT_ID {chat_id}: {e_tg.message}", exc_info=False)
+        return False
+    except NetworkError:
+        raise
     except TelegramError as e_tg:
         msg_logger.error(f"[{msg_logger.name}] Erro Telegram ao enviar para CHAT_ID {chat_id}: {e_tg.message}", exc_info=False) 
         return False
@@ -746,31 +3308,909 @@ async def send_telegram_message_async(bot, chat_id, message, parse_mode, msg_log
         msg_logger.error(f"[{msg_logger.name}] Erro inesperado ao enviar msg para CHAT_ID {chat_id}: {e_msg}", exc_info=True)
         return False
 
-def load_history_geral():
-    history_path = os.path.join(HISTORY_DIR_BASE, HISTORY_FILENAME_USADOS_GERAL)
-    logger.info(f"Carregando histórico de: {history_path}")
-    if os.path.exists(history_path):
+class BaldeTokens:
+    """Token bucket simples: `taxa` tokens por segundo, até `capacidade` acumulados."""
+
+    def __init__(self, taxa, capacidade):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.tokens = capacidade
+        self.ultimo = time.monotonic()
+        self.bloqueado_ate = 0.0
+
+    async def consumir(self):
+        while True:
+            agora = time.monotonic()
+            if agora < self.bloqueado_ate:
+                await asyncio.sleep(self.bloqueado_ate - agora)
+                continue
+            self.tokens = min(self.capacidade, self.tokens + (agora - self.ultimo) * self.taxa)
+            self.ultimo = agora
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.taxa)
+
+    def bloquear(self, segundos):
+        self.bloqueado_ate = max(self.bloqueado_ate, time.monotonic() + segundos)
+        self.tokens = 0
+
+
+class DespachanteTelegram:
+    """
+    Fila de notificações drenada em segundo plano, com uma task e um token bucket por chat.
+    Cada mensagem é registrada num journal (enq/ack) antes de ir para a fila, então o que não
+    for enviado até o fim da execução (timeout, crash) é reenviado na próxima.
+    """
+
+    def __init__(self, bot, fila_path, logger_param):
+        self.bot = bot
+        self.fila_path = fila_path
+        self.logger = logger_param
+        self.filas = {}
+        self.tasks = {}
+        self.baldes = {}
+        self.balde_global = BaldeTokens(TELEGRAM_MSGS_POR_SEGUNDO_GLOBAL, TELEGRAM_MSGS_POR_SEGUNDO_GLOBAL)
+        self.pendentes = {}
+        self.enviadas = 0
+        self.descartadas = 0
+        self._journal = None
+
+    def _carregar_pendentes(self):
+        if not os.path.exists(self.fila_path):
+            return
+        with open(self.fila_path, 'r', encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except json.JSONDecodeError:
+                    continue  # última linha truncada por um crash
+                if registro.get("op") == "enq":
+                    self.pendentes[registro["id"]] = registro["msg"]
+                elif registro.get("op") == "ack":
+                    self.pendentes.pop(registro["id"], None)
+
+    def _compactar_journal(self):
+        tmp_path = f"{self.fila_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for msg_id, msg in self.pendentes.items():
+                f.write(json.dumps({"op": "enq", "id": msg_id, "msg": msg}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.fila_path)
+
+    def _registrar(self, registro):
+        self._journal.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        self._journal.flush()
+
+    def iniciar(self):
+        self._carregar_pendentes()
+        self._compactar_journal()
+        self._journal = open(self.fila_path, 'a', encoding='utf-8')
+        if self.pendentes:
+            self.logger.info(f"{len(self.pendentes)} notificações pendentes da execução anterior serão reenviadas.")
+        for msg_id, msg in list(self.pendentes.items()):
+            self._colocar_na_fila(msg_id, msg)
+
+    def compactar(self):
+        """Reescreve o journal só com as pendentes. Processos longos (daemon) chamam a cada ciclo; sem await, não concorre com os envios."""
+        self._journal.close()
+        try:
+            self._compactar_journal()
+        except OSError as e:
+            self.logger.error(f"Erro ao compactar o journal do Telegram '{self.fila_path}': {e}")
+        self._journal = open(self.fila_path, 'a', encoding='utf-8')
+
+    def enfileirar(self, chat_id, texto, parse_mode=ParseMode.MARKDOWN_V2, asin=None, preco=None):
+        msg_id = uuid.uuid4().hex
+        msg = {"chat_id": str(chat_id), "texto": texto, "parse_mode": parse_mode, "asin": asin, "preco": preco, "criado_em": datetime.now().isoformat()}
+        self.pendentes[msg_id] = msg
+        self._registrar({"op": "enq", "id": msg_id, "msg": msg})
+        self._colocar_na_fila(msg_id, msg)
+
+    def _colocar_na_fila(self, msg_id, msg):
+        chat_id = msg["chat_id"]
+        if chat_id not in self.filas:
+            self.filas[chat_id] = asyncio.Queue()
+            self.baldes[chat_id] = BaldeTokens(TELEGRAM_MSGS_POR_SEGUNDO_CHAT, TELEGRAM_RAJADA_CHAT)
+            self.tasks[chat_id] = asyncio.create_task(self._drenar_chat(chat_id))
+        self.filas[chat_id].put_nowait(msg_id)
+
+    def _confirmar(self, msg_id):
+        self.pendentes.pop(msg_id, None)
+        self._registrar({"op": "ack", "id": msg_id})
+
+    async def _drenar_chat(self, chat_id):
+        fila = self.filas[chat_id]
+        balde_chat = self.baldes[chat_id]
+        while True:
+            msg_id = await fila.get()
+            try:
+                await self._enviar_com_retentativas(msg_id, balde_chat)
+            except Exception as e:
+                self.logger.error(f"Erro inesperado no despacho para CHAT_ID {chat_id}: {e}", exc_info=True)
+            finally:
+                fila.task_done()
+
+    async def _enviar_com_retentativas(self, msg_id, balde_chat):
+        msg = self.pendentes.get(msg_id)
+        if msg is None:
+            return
+        tentativa = 0
+        while tentativa < TELEGRAM_MAX_TENTATIVAS:
+            with metricas_execucao_global.cronometrar("telegram_limite_taxa"):
+                await balde_chat.consumir()
+                await self.balde_global.consumir()
+            try:
+                with metricas_execucao_global.cronometrar("telegram_envio"):
+                    enviada = await send_telegram_message_async(self.bot, msg["chat_id"], msg["texto"], msg["parse_mode"], self.logger)
+                if enviada:
+                    self.enviadas += 1
+                    metricas_execucao_global.incrementar("telegram_enviadas")
+                else:
+                    self.descartadas += 1
+                    metricas_execucao_global.incrementar("telegram_rejeitadas")
+                self._confirmar(msg_id)
+                return
+            except RetryAfter as e_retry:
+                # Conta como tentativa: um chat sob flood control contínuo não prende a task para sempre.
+                tentativa += 1
+                metricas_execucao_global.incrementar("telegram_flood_limit")
+                espera = e_retry.retry_after.total_seconds() if hasattr(e_retry.retry_after, "total_seconds") else float(e_retry.retry_after)
+                self.logger.warning(f"Flood limit do Telegram para CHAT_ID {msg['chat_id']}. Aguardando {espera:.0f}s (retry_after). Tentativa {tentativa}/{TELEGRAM_MAX_TENTATIVAS}.")
+                balde_chat.bloquear(espera)
+                self.balde_global.bloquear(espera)
+            except TimedOut:
+                # Timeout de leitura costuma significar mensagem entregue sem resposta: reenviar duplicaria o alerta.
+                metricas_execucao_global.incrementar("telegram_timeout_sem_confirmacao")
+                self.logger.warning(f"Timeout ao enviar a mensagem {msg_id} para CHAT_ID {msg['chat_id']}. Provavelmente entregue; não será reenviada.")
+                self._confirmar(msg_id)
+                return
+            except NetworkError as e_net:
+                tentativa += 1
+                metricas_execucao_global.incrementar("telegram_retentativas")
+                espera = min(60, 2 ** tentativa) + random.uniform(0, 1)
+                self.logger.warning(f"Erro de rede no Telegram ({e_net.message}). Tentativa {tentativa}/{TELEGRAM_MAX_TENTATIVAS}, nova tentativa em {espera:.1f}s.")
+                await asyncio.sleep(espera)
+        self.logger.error(f"Mensagem {msg_id} para CHAT_ID {msg['chat_id']} não enviada após {TELEGRAM_MAX_TENTATIVAS} tentativas. Mantida na fila para a próxima execução.")
+
+    async def encerrar(self, timeout=TELEGRAM_TIMEOUT_ENCERRAMENTO):
+        """Espera a fila esvaziar (até `timeout`), cancela as tasks e compacta o journal."""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(fila.join() for fila in self.filas.values())), timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Timeout de {timeout:.0f}s ao drenar a fila do Telegram. {len(self.pendentes)} mensagens ficam para a próxima execução.")
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        if self._journal:
+            self._journal.close()
+        self._compactar_journal()
+        self.logger.info(f"Despachante Telegram encerrado: {self.enviadas} enviadas, {self.descartadas} rejeitadas, {len(self.pendentes)} pendentes.")
+
+
+URL_PRODUTO_USADOS = "https://www.amazon.com.br/dp/{asin}"
+# Campos que não são gravados no histórico: o ASIN já é a chave e o link canônico sai dele.
+CAMPOS_DERIVAVEIS_HISTORICO = ("asin", "link")
+
+def link_produto(asin):
+    return URL_PRODUTO_USADOS.format(asin=asin)
+
+def timestamp_para_epoch(timestamp):
+    try:
+        return int(datetime.fromisoformat(timestamp).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+class RegistroHistorico:
+    """
+    Registro compacto de um ASIN em memória: visto_em em epoch e nome do fluxo internado (poucos fluxos distintos).
+    Sem timestamp legível, visto_em fica None em memória e no arquivo, como o NULL do backend SQLite.
+    """
+
+    __slots__ = ("nome", "preco_usado", "visto_em", "fluxo")
+
+    def __init__(self, nome, preco_usado, visto_em, fluxo):
+        self.nome = nome
+        self.preco_usado = preco_usado
+        self.visto_em = visto_em
+        self.fluxo = fluxo
+
+    @classmethod
+    def de_dict(cls, registro):
+        visto_em = timestamp_para_epoch(registro.get("timestamp"))
+        fluxo = registro.get("fluxo")
+        return cls(registro.get("nome"), registro.get("preco_usado"), visto_em, sys.intern(fluxo) if fluxo else fluxo)
+
+    def timestamp(self):
+        return datetime.fromtimestamp(self.visto_em).isoformat() if self.visto_em is not None else None
+
+    def para_dict(self, asin):
+        return {"nome": self.nome, "asin": asin, "link": link_produto(asin), "preco_usado": self.preco_usado,
+                "timestamp": self.timestamp(), "fluxo": self.fluxo}
+
+    def para_json(self):
+        return {"nome": self.nome, "preco_usado": self.preco_usado, "timestamp": self.timestamp(), "fluxo": self.fluxo}
+
+
+class HistoricoJSON:
+    """
+    Histórico mantido em memória (RegistroHistorico por ASIN) e gravado no JSON de forma atômica somente em commit().
+    O arquivo não guarda campos deriváveis (ASIN e link) nem indentação.
+    """
+
+    def __init__(self, history_path):
+        self.history_path = history_path
+        self.dados = self._carregar()
+        self._alterado = False
+
+    def _carregar(self):
+        if not os.path.exists(self.history_path):
+            logger.info("Arquivo de histórico não encontrado. Iniciando histórico vazio.")
+            return {}
         try:
-            with open(history_path, 'r', encoding='utf-8') as f:
-                history_data = json.load(f)
-            logger.info(f"Histórico carregado: {len(history_data)} ASINs.")
-            return history_data
+            with open(self.history_path, 'r', encoding='utf-8') as f:
+                return {asin: RegistroHistorico.de_dict(registro) for asin, registro in json.load(f).items()}
         except Exception as e:
-            logger.error(f"Erro ao carregar/decodificar histórico de '{history_path}': {e}. Retornando vazio.", exc_info=True)
+            corrompido_path = f"{self.history_path}.corrompido_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            logger.error(f"Erro ao carregar/decodificar histórico de '{self.history_path}': {e}. Arquivo movido para '{corrompido_path}'.", exc_info=True)
+            os.replace(self.history_path, corrompido_path)
             return {}
+
+    def obter(self, asin):
+        registro = self.dados.get(asin)
+        return registro.para_dict(asin) if registro is not None else None
+
+    def registrar(self, asin, registro):
+        self.dados[asin] = RegistroHistorico.de_dict(registro)
+        self._alterado = True
+
+    def itens(self):
+        for asin, registro in self.dados.items():
+            yield asin, registro.para_dict(asin)
+
+    def commit(self):
+        if not self._alterado:
+            return
+        tmp_path = f"{self.history_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({asin: registro.para_json() for asin, registro in self.dados.items()}, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.history_path)
+        self._alterado = False
+
+    def compactar(self, ttl_dias=TTL_HISTORICO_DIAS_USADOS, max_asins=MAX_ASINS_HISTORICO_USADOS):
+        """
+        Remove ASINs fora do TTL e, acima do limite, os vistos há mais tempo; regrava o arquivo no formato compacto.
+        Um registro sem timestamp conta como o mais antigo: expira no TTL e sai primeiro no limite.
+        """
+        removidos_ttl = removidos_limite = 0
+        if ttl_dias > 0:
+            corte = time.time() - ttl_dias * 86400
+            expirados = [asin for asin, registro in self.dados.items() if registro.visto_em is None or registro.visto_em < corte]
+            for asin in expirados:
+                del self.dados[asin]
+            removidos_ttl = len(expirados)
+        if max_asins and len(self.dados) > max_asins:
+            excedentes = heapq.nsmallest(len(self.dados) - max_asins, self.dados.items(), key=lambda par: par[1].visto_em if par[1].visto_em is not None else float('-inf'))
+            for asin, _ in excedentes:
+                del self.dados[asin]
+            removidos_limite = len(excedentes)
+        self._alterado = True
+        self.commit()
+        return removidos_ttl, removidos_limite
+
+    def tamanho_bytes(self):
+        return os.path.getsize(self.history_path) if os.path.exists(self.history_path) else 0
+
+    def close(self):
+        save_history_geral(self)
+
+    def __len__(self):
+        return len(self.dados)
+
+    def __contains__(self, asin):
+        return asin in self.dados
+
+
+class HistoricoSQLite:
+    """Histórico em SQLite (WAL) com uma linha por ASIN. As escritas ficam na transação aberta até commit()."""
+
+    COLUNAS = ("nome", "link", "preco_usado", "timestamp", "fluxo")
+
+    def __init__(self, db_path, json_legado_path=None):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS historico ("
+            "asin TEXT PRIMARY KEY, nome TEXT, link TEXT, preco_usado REAL, timestamp TEXT, fluxo TEXT)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT)")
+        self.conn.commit()
+        if json_legado_path:
+            self.importar_json(json_legado_path)
+
+    def importar_json(self, json_path):
+        """Importa uma única vez o histórico JSON legado (price_history_USADOS_GERAL.json)."""
+        if self.conn.execute("SELECT 1 FROM meta WHERE chave = 'json_importado'").fetchone():
+            return
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                dados_json = json.load(f)
+        except Exception as e:
+            logger.error(f"Erro ao ler histórico JSON legado '{json_path}' para importação: {e}", exc_info=True)
+            return
+        with self.conn:
+            for asin, registro in dados_json.items():
+                self._upsert(asin, registro)
+            self.conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('json_importado', ?)", (datetime.now().isoformat(),))
+        logger.info(f"Histórico JSON legado importado para SQLite: {len(dados_json)} ASINs de '{json_path}'.")
+
+    def _upsert(self, asin, registro):
+        # O link não é gravado (coluna mantida por compatibilidade): é derivado do ASIN na leitura.
+        self.conn.execute(
+            "INSERT OR REPLACE INTO historico (asin, nome, link, preco_usado, timestamp, fluxo) VALUES (?, ?, NULL, ?, ?, ?)",
+            (asin, *(registro.get(coluna) for coluna in self.COLUNAS if coluna != "link"))
+        )
+
+    def obter(self, asin):
+        row = self.conn.execute(
+            "SELECT nome, link, preco_usado, timestamp, fluxo FROM historico WHERE asin = ?", (asin,)
+        ).fetchone()
+        if row is None:
+            return None
+        registro = dict(zip(self.COLUNAS, row))
+        registro["asin"] = asin
+        registro["link"] = link_produto(asin)
+        return registro
+
+    def registrar(self, asin, registro):
+        self._upsert(asin, registro)
+
+    def itens(self):
+        for asin, *valores in self.conn.execute("SELECT asin, nome, link, preco_usado, timestamp, fluxo FROM historico"):
+            registro = dict(zip(self.COLUNAS, valores))
+            registro["asin"] = asin
+            registro["link"] = link_produto(asin)
+            yield asin, registro
+
+    def commit(self):
+        self.conn.commit()
+
+    def compactar(self, ttl_dias=TTL_HISTORICO_DIAS_USADOS, max_asins=MAX_ASINS_HISTORICO_USADOS):
+        """
+        Mesma retenção do backend JSON, onde um registro sem timestamp conta como o mais antigo: expira no TTL
+        e sai primeiro no limite. Limpa links legados e faz VACUUM quando algo foi removido.
+        """
+        removidos_ttl = removidos_limite = 0
+        with self.conn:
+            if ttl_dias > 0:
+                corte = datetime.fromtimestamp(time.time() - ttl_dias * 86400).isoformat()
+                removidos_ttl = self.conn.execute("DELETE FROM historico WHERE timestamp IS NULL OR timestamp < ?", (corte,)).rowcount
+            excedente = len(self) - max_asins if max_asins else 0
+            if excedente > 0:
+                removidos_limite = self.conn.execute(
+                    "DELETE FROM historico WHERE asin IN (SELECT asin FROM historico ORDER BY timestamp IS NOT NULL, timestamp ASC LIMIT ?)", (excedente,)
+                ).rowcount
+            links_limpos = self.conn.execute("UPDATE historico SET link = NULL WHERE link IS NOT NULL").rowcount
+        if removidos_ttl or removidos_limite or links_limpos:
+            self.conn.execute("VACUUM")
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removidos_ttl, removidos_limite
+
+    def tamanho_bytes(self):
+        return sum(os.path.getsize(path) for path in (self.db_path, f"{self.db_path}-wal") if os.path.exists(path))
+
+    def close(self):
+        save_history_geral(self)
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM historico").fetchone()[0]
+
+    def __contains__(self, asin):
+        return self.conn.execute("SELECT 1 FROM historico WHERE asin = ?", (asin,)).fetchone() is not None
+
+
+class SeriePrecosUsados:
+    """
+    Série append-only de observações de preço (asin_id, epoch, centavos) em colunas array('I').
+    O arquivo binário só recebe appends; na carga, observações fora da janela ou além do limite por ASIN
+    são descartadas e o arquivo é compactado quando o descarte é grande, mantendo a memória limitada.
+    """
+
+    def __init__(self, dir_base, janela_dias=JANELA_SERIE_DIAS_USADOS, max_obs_por_asin=MAX_OBS_POR_ASIN_SERIE_USADOS):
+        self.dados_path = os.path.join(dir_base, SERIE_PRECOS_FILENAME_USADOS)
+        self.asins_path = os.path.join(dir_base, SERIE_ASINS_FILENAME_USADOS)
+        self.janela_dias = janela_dias
+        self.max_obs_por_asin = max_obs_por_asin
+        self.asins = []
+        self.asin_ids = {}
+        self.col_asin_id = array('I')
+        self.col_epoch = array('I')
+        self.col_centavos = array('I')
+        self.indice = {}
+        self._novos_asins = []
+        self._pendentes = array('I')
+        self._carregar()
+
+    def _carregar(self):
+        inicio = time.monotonic()
+        if os.path.exists(self.asins_path):
+            with open(self.asins_path, 'r', encoding='utf-8') as f:
+                self.asins = [linha.strip() for linha in f if linha.strip()]
+            self.asin_ids = {asin: asin_id for asin_id, asin in enumerate(self.asins)}
+        registros = array('I')
+        if os.path.exists(self.dados_path):
+            with open(self.dados_path, 'rb') as f:
+                dados = f.read()
+            registros.frombytes(dados[:len(dados) - len(dados) % 12])
+            if sys.byteorder != 'little':
+                registros.byteswap()
+
+        total_lido = len(registros) // 3
+        corte = int(time.time()) - self.janela_dias * 86400
+        por_asin = {}
+        for pos in range(0, len(registros), 3):
+            asin_id, epoch = registros[pos], registros[pos + 1]
+            if epoch < corte or asin_id >= len(self.asins):
+                continue
+            por_asin.setdefault(asin_id, []).append(pos)
+        mantidos = sum(min(len(posicoes), self.max_obs_por_asin) for posicoes in por_asin.values())
+        descartados = total_lido - mantidos
+        compactar = descartados > total_lido // 4 or len(por_asin) < len(self.asins) // 2
+
+        if compactar:
+            # Renumera os ASINs para que os que saíram da janela também deixem o dicionário.
+            asins_antigos = self.asins
+            self.asins = [asins_antigos[asin_id] for asin_id in por_asin]
+            self.asin_ids = {asin: asin_id for asin_id, asin in enumerate(self.asins)}
+        for novo_id, (asin_id, posicoes) in enumerate(por_asin.items()):
+            for pos in posicoes[-self.max_obs_por_asin:]:
+                self._anexar(novo_id if compactar else asin_id, registros[pos + 1], registros[pos + 2])
+        if compactar and (total_lido or asins_antigos):
+            self._compactar()
+        logger.info(
+            f"Série de preços carregada: {len(self.col_epoch)} observações de {len(self.indice)} ASINs "
+            f"({descartados} descartadas pela janela de {self.janela_dias} dias/limite por ASIN) em {time.monotonic() - inicio:.2f}s."
+        )
+
+    def compactar(self):
+        """
+        Reconstrói as colunas só com as observações que o índice ainda referencia e que estão dentro da janela,
+        renumera os ASINs e regrava os arquivos. O _anexar só poda o índice; processos longos (daemon) chamam
+        a cada ciclo profundo para que colunas e arquivo não cresçam sem limite. Devolve as observações descartadas.
+        """
+        corte = int(time.time()) - self.janela_dias * 86400
+        asins_antigos, indice_antigo = self.asins, self.indice
+        col_epoch, col_centavos = self.col_epoch, self.col_centavos
+        total_antes = len(col_epoch)
+        self.asins, self.asin_ids, self.indice = [], {}, {}
+        self.col_asin_id, self.col_epoch, self.col_centavos = array('I'), array('I'), array('I')
+        for asin_id, posicoes in indice_antigo.items():
+            validas = [pos for pos in posicoes if col_epoch[pos] >= corte]
+            if not validas:
+                continue
+            novo_id = self.asin_ids[asins_antigos[asin_id]] = len(self.asins)
+            self.asins.append(asins_antigos[asin_id])
+            for pos in validas:
+                self._anexar(novo_id, col_epoch[pos], col_centavos[pos])
+        # As pendentes já estão nas colunas e vão no arquivo reescrito.
+        self._novos_asins = []
+        self._pendentes = array('I')
+        self._compactar()
+        return total_antes - len(self.col_epoch)
+
+    def _compactar(self):
+        registros = array('I')
+        for asin_id, epoch, centavos in zip(self.col_asin_id, self.col_epoch, self.col_centavos):
+            registros.extend((asin_id, epoch, centavos))
+        if sys.byteorder != 'little':
+            registros.byteswap()
+        for path, conteudo, modo in (
+            (self.asins_path, "".join(f"{asin}\n" for asin in self.asins), 'w'),
+            (self.dados_path, registros.tobytes(), 'wb'),
+        ):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, modo, **({'encoding': 'utf-8'} if modo == 'w' else {})) as f:
+                f.write(conteudo)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        logger.info(f"Série de preços compactada: {len(self.col_epoch)} observações de {len(self.asins)} ASINs.")
+
+    def _anexar(self, asin_id, epoch, centavos):
+        posicoes = self.indice.get(asin_id)
+        if posicoes is None:
+            posicoes = self.indice[asin_id] = array('I')
+        posicoes.append(len(self.col_epoch))
+        if len(posicoes) > self.max_obs_por_asin:
+            del posicoes[0]
+        self.col_asin_id.append(asin_id)
+        self.col_epoch.append(epoch)
+        self.col_centavos.append(centavos)
+
+    def registrar(self, asin, preco, epoch=None):
+        asin_id = self.asin_ids.get(asin)
+        if asin_id is None:
+            asin_id = self.asin_ids[asin] = len(self.asins)
+            self.asins.append(asin)
+            self._novos_asins.append(asin)
+        epoch = int(epoch if epoch is not None else time.time())
+        centavos = int(round(preco * 100))
+        self._anexar(asin_id, epoch, centavos)
+        self._pendentes.extend((asin_id, epoch, centavos))
+
+    def estatisticas(self, asin, dias):
+        """Mínimo e mediana (em reais) das observações do ASIN nos últimos `dias`. None se não houver."""
+        asin_id = self.asin_ids.get(asin)
+        posicoes = self.indice.get(asin_id) if asin_id is not None else None
+        if not posicoes:
+            return None
+        corte = int(time.time()) - dias * 86400
+        centavos = [self.col_centavos[pos] for pos in posicoes if self.col_epoch[pos] >= corte]
+        if not centavos:
+            return None
+        return {"min": min(centavos) / 100, "mediana": statistics.median(centavos) / 100, "n": len(centavos)}
+
+    def commit(self):
+        if self._novos_asins:
+            with open(self.asins_path, 'a', encoding='utf-8') as f:
+                f.write("".join(f"{asin}\n" for asin in self._novos_asins))
+            self._novos_asins = []
+        if self._pendentes:
+            if sys.byteorder != 'little':
+                self._pendentes.byteswap()
+            with open(self.dados_path, 'ab') as f:
+                f.write(self._pendentes.tobytes())
+            self._pendentes = array('I')
+
+    def __len__(self):
+        return len(self.col_epoch)
+
+
+class DeltaHistoricoShard:
+    """
+    O que um shard produziu nesta execução: registros de histórico, observações de preço e notificações
+    adiadas. Gravado de forma atômica em history_files_usados/shards/ e consumido pelo merge
+    (MODO_EXECUCAO_USADOS=merge). Um delta ainda não mesclado é carregado e acumulado.
+    """
+
+    def __init__(self, delta_path, indice_shard, total_shards):
+        self.delta_path = delta_path
+        self.indice_shard = indice_shard
+        self.total_shards = total_shards
+        self.registros = {}
+        self.observacoes = []
+        self.notificacoes = []
+        self._alterado = False
+        self._carregar()
+
+    def _carregar(self):
+        if not os.path.exists(self.delta_path):
+            return
+        try:
+            with open(self.delta_path, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+        except Exception as e:
+            logger.error(f"Erro ao ler delta do shard '{self.delta_path}': {e}. Começando um delta novo.")
+            return
+        self.registros = dados.get("registros", {})
+        self.observacoes = dados.get("observacoes", [])
+        self.notificacoes = dados.get("notificacoes", [])
+        logger.info(
+            f"Delta não mesclado de execução anterior encontrado em '{self.delta_path}': {len(self.registros)} ASINs, "
+            f"{len(self.notificacoes)} notificações. Os novos registros serão acumulados nele."
+        )
+
+    def registrar(self, asin, registro):
+        self.registros[asin] = {campo: valor for campo, valor in registro.items() if campo not in CAMPOS_DERIVAVEIS_HISTORICO}
+        self._alterado = True
+
+    def observar(self, asin, preco, epoch=None):
+        self.observacoes.append([asin, int(epoch if epoch is not None else time.time()), preco])
+        self._alterado = True
+
+    def enfileirar(self, chat_id, texto, parse_mode=ParseMode.MARKDOWN_V2, asin=None, preco=None, resumo=None):
+        """
+        Mesma assinatura do DespachanteTelegram: a notificação fica no delta até o merge deduplicar os shards.
+        `resumo` traz os dados da oferta quando ela deve entrar no resumo montado pelo merge.
+        """
+        self.notificacoes.append({
+            "chat_id": str(chat_id), "texto": texto, "parse_mode": parse_mode, "asin": asin, "preco": preco, "resumo": resumo,
+            "criado_em": datetime.now().isoformat(), "shard": self.indice_shard
+        })
+        self._alterado = True
+
+    async def encerrar(self):
+        self.commit()
+        logger.info(f"Delta do shard {self.indice_shard + 1}/{self.total_shards}: {len(self.notificacoes)} notificações adiadas para o merge.")
+
+    def commit(self):
+        if not self._alterado:
+            return
+        tmp_path = f"{self.delta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "shard": self.indice_shard, "total_shards": self.total_shards, "atualizado_em": datetime.now().isoformat(),
+                "registros": self.registros, "observacoes": self.observacoes, "notificacoes": self.notificacoes
+            }, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.delta_path)
+        self._alterado = False
+
+
+class HistoricoComDelta:
+    """Histórico usado por um shard: lê do histórico local e repete cada registro no delta do shard."""
+
+    def __init__(self, history, delta):
+        self.history = history
+        self.delta = delta
+
+    def obter(self, asin):
+        return self.history.obter(asin)
+
+    def registrar(self, asin, registro):
+        self.history.registrar(asin, registro)
+        self.delta.registrar(asin, registro)
+
+    def itens(self):
+        return self.history.itens()
+
+    def commit(self):
+        self.history.commit()
+        self.delta.commit()
+
+    def compactar(self, *args, **kwargs):
+        return self.history.compactar(*args, **kwargs)
+
+    def tamanho_bytes(self):
+        return self.history.tamanho_bytes()
+
+    def close(self):
+        self.history.close()
+        self.delta.commit()
+
+    def __len__(self):
+        return len(self.history)
+
+    def __contains__(self, asin):
+        return asin in self.history
+
+
+class SeriePrecosComDelta:
+    """Série de preços usada por um shard: as observações também vão para o delta do shard."""
+
+    def __init__(self, serie_precos, delta):
+        self.serie_precos = serie_precos
+        self.delta = delta
+
+    def registrar(self, asin, preco, epoch=None):
+        epoch = int(epoch if epoch is not None else time.time())
+        self.serie_precos.registrar(asin, preco, epoch)
+        self.delta.observar(asin, preco, epoch)
+
+    def estatisticas(self, asin, dias):
+        return self.serie_precos.estatisticas(asin, dias)
+
+    def commit(self):
+        self.serie_precos.commit()
+        self.delta.commit()
+
+    def __len__(self):
+        return len(self.serie_precos)
+
+
+class SeriePrecosSomenteLeitura:
+    """
+    Série de preços dos ciclos quentes do daemon: consulta mínimo/mediana, mas não registra observações.
+    Os mesmos ASINs voltam a cada INTERVALO_QUENTE minutos e encheriam o limite por ASIN, distorcendo a mediana.
+    """
+
+    def __init__(self, serie_precos):
+        self.serie_precos = serie_precos
+
+    def registrar(self, asin, preco, epoch=None):
+        pass
+
+    def estatisticas(self, asin, dias):
+        return self.serie_precos.estatisticas(asin, dias)
+
+    def commit(self):
+        pass
+
+    def __len__(self):
+        return len(self.serie_precos)
+
+
+def mesclar_registro_historico(atual, novo):
+    """
+    Regra do merge entre shards: o menor preço vence e o timestamp fica o mais recente dos dois.
+    Sem timestamp legível conta como o mais antigo; sem preço conta como o maior.
+    """
+    if atual is None:
+        return dict(novo)
+    preco_atual = atual.get("preco_usado") if atual.get("preco_usado") is not None else float('inf')
+    preco_novo = novo.get("preco_usado") if novo.get("preco_usado") is not None else float('inf')
+    epoch_atual = timestamp_para_epoch(atual.get("timestamp"))
+    epoch_novo = timestamp_para_epoch(novo.get("timestamp"))
+    novo_mais_recente = epoch_novo is not None and (epoch_atual is None or epoch_novo > epoch_atual)
+    if preco_novo < preco_atual or (preco_novo == preco_atual and novo_mais_recente):
+        vencedor = dict(novo)
     else:
-        logger.info("Arquivo de histórico não encontrado. Retornando histórico vazio.")
-        return {}
+        vencedor = dict(atual)
+    vencedor["timestamp"] = novo.get("timestamp") if novo_mais_recente else atual.get("timestamp")
+    return vencedor
 
-def save_history_geral(history):
+def deduplicar_notificacoes_shards(notificacoes):
+    """Uma notificação por (chat, ASIN) entre todos os shards: fica a de menor preço (a mais recente no empate)."""
+    escolhidas = {}
+    sem_asin = []
+    for notificacao in notificacoes:
+        if not notificacao.get("asin"):
+            sem_asin.append(notificacao)
+            continue
+        chave = (notificacao["chat_id"], notificacao["asin"])
+        atual = escolhidas.get(chave)
+        preco = notificacao.get("preco") if notificacao.get("preco") is not None else float('inf')
+        if atual is None:
+            escolhidas[chave] = notificacao
+            continue
+        preco_atual = atual.get("preco") if atual.get("preco") is not None else float('inf')
+        if preco < preco_atual or (preco == preco_atual and notificacao.get("criado_em", "") > atual.get("criado_em", "")):
+            escolhidas[chave] = notificacao
+    return sorted(escolhidas.values(), key=lambda n: n.get("criado_em", "")) + sem_asin
+
+def listar_deltas_shards():
+    padrao = re.compile(r'^' + re.escape(DELTA_SHARD_FILENAME_USADOS).replace(r'\{indice\}', r'\d+') + r'$')
+    return [os.path.join(SHARDS_DIR_BASE, nome) for nome in sorted(os.listdir(SHARDS_DIR_BASE)) if padrao.match(nome)]
+
+async def executar_merge_shards_async():
+    """
+    Combina os deltas dos shards no histórico (menor preço vence, timestamp mais recente), anexa as
+    observações à série de preços e envia as notificações deduplicadas entre shards.
+    O despachante do Telegram sobe sempre que há Bot, para reenviar o que sobrou no journal de execuções anteriores.
+    Os deltas só são apagados depois do commit do histórico e do journal do Telegram.
+    """
+    global despachante_telegram_global
+    logger.info("--- [MERGE DOS SHARDS INÍCIO] ---")
+    history = None
+    serie_precos = None
+    try:
+        if bot_instance_global:
+            despachante_telegram_global = DespachanteTelegram(
+                bot_instance_global, os.path.join(HISTORY_DIR_BASE, FILA_TELEGRAM_FILENAME_USADOS), logger
+            )
+            despachante_telegram_global.iniciar()
+        deltas_paths = listar_deltas_shards()
+        if not deltas_paths:
+            logger.warning(f"Nenhum delta de shard encontrado em '{SHARDS_DIR_BASE}'. Nada a mesclar.")
+            return
+
+        registros, observacoes, notificacoes, deltas_lidos = {}, [], [], []
+        with metricas_execucao_global.cronometrar("leitura_deltas"):
+            for delta_path in deltas_paths:
+                try:
+                    with open(delta_path, 'r', encoding='utf-8') as f:
+                        delta = json.load(f)
+                except Exception as e:
+                    logger.error(f"Erro ao ler delta '{delta_path}': {e}. Delta ignorado e mantido para inspeção.", exc_info=True)
+                    continue
+                for asin, registro in delta.get("registros", {}).items():
+                    registros[asin] = mesclar_registro_historico(registros.get(asin), registro)
+                observacoes.extend(delta.get("observacoes", []))
+                notificacoes.extend(delta.get("notificacoes", []))
+                deltas_lidos.append(delta_path)
+                logger.info(
+                    f"Delta '{os.path.basename(delta_path)}': {len(delta.get('registros', {}))} ASINs, "
+                    f"{len(delta.get('observacoes', []))} observações, {len(delta.get('notificacoes', []))} notificações."
+                )
+
+        with metricas_execucao_global.cronometrar("mesclar_historico"):
+            if USAR_HISTORICO:
+                history = load_history_geral()
+                for asin, registro in registros.items():
+                    history.registrar(asin, registro)
+                save_history_geral(history)
+            if USAR_SERIE_PRECOS and observacoes:
+                serie_precos = SeriePrecosUsados(HISTORY_DIR_BASE)
+                for asin, epoch, preco in sorted(observacoes, key=lambda obs: obs[1]):
+                    serie_precos.registrar(asin, preco, epoch)
+                serie_precos.commit()
+
+        notificacoes_unicas = deduplicar_notificacoes_shards(notificacoes)
+        metricas_execucao_global.incrementar("shards_mesclados", len(deltas_lidos))
+        metricas_execucao_global.incrementar("asins_mesclados", len(registros))
+        metricas_execucao_global.incrementar("notificacoes_duplicadas_shards", len(notificacoes) - len(notificacoes_unicas))
+        logger.info(
+            f"Merge: {len(deltas_lidos)} deltas, {len(registros)} ASINs distintos, {len(observacoes)} observações de preço, "
+            f"{len(notificacoes_unicas)} notificações ({len(notificacoes) - len(notificacoes_unicas)} duplicadas entre shards descartadas)."
+        )
+
+        if notificacoes_unicas and despachante_telegram_global is not None:
+            agregador = AgregadorResumo(despachante_telegram_global) if MODO_NOTIFICACAO_USADOS == "resumo" else None
+            individuais = 0
+            for notificacao in notificacoes_unicas:
+                if agregador is not None and notificacao.get("resumo"):
+                    agregador.adicionar(notificacao["chat_id"], notificacao["resumo"])
+                    continue
+                despachante_telegram_global.enfileirar(
+                    notificacao["chat_id"], notificacao["texto"], notificacao.get("parse_mode", ParseMode.MARKDOWN_V2),
+                    asin=notificacao.get("asin"), preco=notificacao.get("preco")
+                )
+                individuais += 1
+            if agregador is not None:
+                agregador.descarregar()
+            metricas_execucao_global.incrementar("notificacoes", individuais)
+        elif notificacoes_unicas:
+            logger.warning(f"Bot do Telegram não configurado no merge. {len(notificacoes_unicas)} notificações descartadas.")
+
+        for delta_path in deltas_lidos:
+            os.remove(delta_path)
+        logger.info(f"Histórico final após o merge: {len(history) if history is not None else 'N/A'} ASINs.")
+    except Exception as e:
+        logger.error(f"Erro no merge dos shards (executar_merge_shards_async): {e}", exc_info=True)
+    finally:
+        if history is not None:
+            compactar_historico(history)
+            history.close()
+        if despachante_telegram_global is not None:
+            with metricas_execucao_global.cronometrar("drenar_telegram"):
+                await despachante_telegram_global.encerrar()
+            despachante_telegram_global = None
+        metricas_execucao_global.exportar(METRICAS_DIR_BASE, logger)
+        logger.info("--- [MERGE DOS SHARDS FIM] ---")
+
+
+def load_history_geral():
+    inicio = time.perf_counter()
     history_path = os.path.join(HISTORY_DIR_BASE, HISTORY_FILENAME_USADOS_GERAL)
-    logger.info(f"Salvando histórico ({len(history)} ASINs) em: {history_path}")
+    if BACKEND_HISTORICO_USADOS == "sqlite":
+        db_path = os.path.join(HISTORY_DIR_BASE, HISTORY_DB_FILENAME_USADOS_GERAL)
+        logger.info(f"Carregando histórico de: {db_path}")
+        history = HistoricoSQLite(db_path, json_legado_path=history_path)
+    else:
+        logger.info(f"Carregando histórico de: {history_path}")
+        history = HistoricoJSON(history_path)
+    tamanho = history.tamanho_bytes()
+    metricas_execucao_global.definir("historico_asins_carregados", len(history))
+    metricas_execucao_global.definir("historico_bytes_carregados", tamanho)
+    logger.info(f"Histórico carregado: {len(history)} ASINs, {tamanho / 1024:.0f} KB em {time.perf_counter() - inicio:.2f}s.")
+    return history
+
+def compactar_historico(history):
+    """Retenção (TTL e limite de ASINs) e compactação do histórico no fim da execução, com tamanho e tempo antes/depois."""
+    inicio = time.perf_counter()
+    asins_antes, bytes_antes = len(history), history.tamanho_bytes()
+    try:
+        removidos_ttl, removidos_limite = history.compactar()
+    except Exception as e:
+        logger.error(f"Erro ao compactar histórico ({BACKEND_HISTORICO_USADOS}): {e}", exc_info=True)
+        return
+    duracao = time.perf_counter() - inicio
+    asins_depois, bytes_depois = len(history), history.tamanho_bytes()
+    metricas_execucao_global.registrar_fase("compactar_historico", duracao)
+    metricas_execucao_global.incrementar("historico_removidos_ttl", removidos_ttl)
+    metricas_execucao_global.incrementar("historico_removidos_limite", removidos_limite)
+    metricas_execucao_global.definir("historico_asins", asins_depois)
+    metricas_execucao_global.definir("historico_bytes", bytes_depois)
+    logger.info(
+        f"Histórico compactado em {duracao:.2f}s: {asins_antes} -> {asins_depois} ASINs ({removidos_ttl} fora do TTL, "
+        f"{removidos_limite} acima do limite), {bytes_antes / 1024:.0f} KB -> {bytes_depois / 1024:.0f} KB."
+    )
+
+def save_history_geral(history):
+    logger.debug(f"Gravando histórico ({BACKEND_HISTORICO_USADOS}).")
     try:
-        with open(history_path, 'w', encoding='utf-8') as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
-        logger.info("Histórico salvo com sucesso.")
+        history.commit()
     except Exception as e:
-        logger.error(f"Erro ao salvar histórico em '{history_path}': {e}", exc_info=True)
+        logger.error(f"Erro ao salvar histórico ({BACKEND_HISTORICO_USADOS}): {e}", exc_info=True)
 
 def get_url_for_page_worker(base_url, page_number, current_run_logger):
     current_run_logger.debug(f"Gerando URL para página {page_number} a partir de base: {base_url}")
@@ -786,92 +4226,6 @@ def get_url_for_page_worker(base_url, page_number, current_run_logger):
     current_run_logger.debug(f"URL da página gerada: {final_url}")
     return final_url
 
-def check_captcha_sync_worker(driver, current_run_logger):
-    current_run_logger.debug("Verificando a presença de CAPTCHA.")
-    try:
-        WebDriverWait(driver, 3).until(EC.any_of( 
-            EC.presence_of_element_located((By.CSS_SELECTOR, "form[action*='captcha'] img")),
-            EC.presence_of_element_located((By.XPATH, "//h4[contains(text(), 'Insira os caracteres')]")),
-            EC.presence_of_element_located((By.XPATH, "//h4[contains(text(), 'Digite os caracteres que você vê abaixo')]")),
-            EC.presence_of_element_located((By.CSS_SELECTOR, "iframe[src*='captcha']"))
-        ))
-        current_run_logger.warning(f"CAPTCHA detectado! URL: {driver.current_url}")
-        timestamp_captcha = datetime.now().strftime('%Y%m%d_%H%M%S')
-        screenshot_path = os.path.join(DEBUG_LOGS_DIR_BASE, f"captcha_usados_geral_{timestamp_captcha}.png")
-        html_path = os.path.join(DEBUG_LOGS_DIR_BASE, f"captcha_usados_geral_{timestamp_captcha}.html")
-        try:
-            driver.save_screenshot(screenshot_path)
-            current_run_logger.info(f"Screenshot do CAPTCHA salvo em: {screenshot_path}")
-            with open(html_path, "w", encoding="utf-8") as f_html:
-                f_html.write(driver.page_source)
-            current_run_logger.info(f"HTML do CAPTCHA salvo em: {html_path}")
-        except Exception as e_save_captcha:
-            current_run_logger.error(f"Erro ao salvar debug do CAPTCHA: {e_save_captcha}")
-        return True
-    except (TimeoutException, NoSuchElementException):
-        current_run_logger.debug("Nenhum CAPTCHA detectado (ou timeout curto).")
-        return False
-    except Exception as e_check_captcha:
-        current_run_logger.error(f"Erro inesperado ao verificar CAPTCHA: {e_check_captcha}", exc_info=True)
-        return False
-
-def check_amazon_error_page_sync_worker(driver, current_run_logger):
-    current_run_logger.debug("Verificando se é página de erro da Amazon.")
-    error_page_detected = False
-    page_title_lower = ""
-    try:
-        page_title_lower = driver.title.lower()
-        error_title_keywords = ["desculpe", "algo deu errado", "sorry", "problema", "serviço indisponível", "error", "não encontrada"]
-        if any(keyword in page_title_lower for keyword in error_title_keywords):
-            current_run_logger.warning(f"Página de erro detectada pelo título: {driver.title}")
-            error_page_detected = True
-        
-        error_selectors_check = [
-            (By.XPATH, "//img[contains(@alt, 'Desculpe') or contains(@alt, 'Sorry')]"), 
-            (By.XPATH, "//*[contains(text(), 'Algo deu errado')]"),
-            (By.XPATH, "//*[contains(text(), 'Desculpe-nos')]"),
-            (By.XPATH, "//*[contains(text(), 'Serviço Indisponível')]"),
-            (By.CSS_SELECTOR, "div#g"), 
-        ]
-        if not error_page_detected: 
-            for by, selector in error_selectors_check:
-                try:
-                    element = driver.find_element(by, selector)
-                    current_run_logger.warning(f"Página de erro detectada por elemento: {selector} | Texto (se houver): {element.text[:100] if element.text else 'N/A'}")
-                    error_page_detected = True
-                    break 
-                except NoSuchElementException:
-                    continue
-                except StaleElementReferenceException:
-                     current_run_logger.warning(f"Elemento {selector} ficou obsoleto ao checar página de erro.")
-                     continue
-        
-        if not error_page_detected:
-            try:
-                driver.find_element(By.CSS_SELECTOR, SELETOR_RESULTADOS_CONT) 
-                current_run_logger.debug("Contêiner de resultados encontrado. Aparentemente não é página de erro.")
-            except NoSuchElementException:
-                current_run_logger.warning(f"Contêiner de resultados '{SELETOR_RESULTADOS_CONT}' NÃO encontrado. Pode ser página de resultados vazia ou erro sutil.")
-        
-        return error_page_detected
-
-    except Exception as e:
-        current_run_logger.error(f"Erro ao verificar página de erro da Amazon: {e}", exc_info=True)
-        return True 
-    finally:
-        if error_page_detected and driver.current_url:
-            timestamp_error = datetime.now().strftime('%Y%m%d_%H%M%S')
-            screenshot_path = os.path.join(DEBUG_LOGS_DIR_BASE, f"amazon_error_page_{timestamp_error}.png")
-            html_path = os.path.join(DEBUG_LOGS_DIR_BASE, f"amazon_error_page_{timestamp_error}.html")
-            try:
-                driver.save_screenshot(screenshot_path)
-                current_run_logger.info(f"Screenshot da página de erro salvo em: {screenshot_path}")
-                with open(html_path, "w", encoding="utf-8") as f_html_err: 
-                    f_html_err.write(driver.page_source)
-                current_run_logger.info(f"HTML da página de erro salvo em: {html_path}")
-            except Exception as e_save_err: 
-                current_run_logger.error(f"Erro ao salvar debug da página de erro: {e_save_err}")
-
 def wait_for_page_load(driver, logger_param, timeout=60):
     logger_param.debug(f"Aguardando carregamento completo da página (timeout={timeout}s)...")
     try:
@@ -885,6 +4239,7 @@ def wait_for_page_load(driver, logger_param, timeout=60):
         logger_param.error(f"Erro ao esperar carregamento da página: {e}", exc_info=True)
 
 if __name__ == "__main__":
+    inicializar_ambiente_usados()
     if os.getenv("APAGAR_HISTORICO_USADOS", "false").lower() == "true":
         logger.info("Variável APAGAR_HISTORICO_USADOS definida como true. Apagando histórico...")
         apagar_historico_usados()
@@ -897,4 +4252,9 @@ if __name__ == "__main__":
         except ValueError:
             logger.warning(f"Valor inválido para MAX_PAGINAS_USADOS_POR_FLUXO no __main__: '{current_max_pages_env}'. Usando o valor padrão: {MAX_PAGINAS_POR_FLUXO}")
     
-    asyncio.run(run_usados_geral_scraper_async())
+    if MODO_EXECUCAO_USADOS == "merge":
+        asyncio.run(executar_merge_shards_async())
+    elif MODO_EXECUCAO_USADOS == "daemon":
+        asyncio.run(run_usados_daemon_async())
+    else:
+        asyncio.run(run_usados_geral_scraper_async())